@@ -3,13 +3,16 @@ from app.config.env_loader import env_loader
 
 from app.config.app_config import AppConfig
 from app.utils.log import LogManager, LogBroker
-from app.utils.database import get_redis
 
 
 app_config = AppConfig()
 log_broker = LogBroker()
 logger = LogManager.GetLogger(log_name='app')
 LogManager.set_queue_handler(logger, log_broker)
-redis_client = get_redis()
+# 配置文件中指定了日志级别时使用该级别（例如 INFO 时跳过调试日志的格式化）
+if app_config.logging and app_config.logging.get("level"):
+    logger.setLevel(app_config.logging["level"])
 
+# 异步Redis客户端代理，连接池在应用 lifespan 中创建和关闭
+from app.utils.database import redis_client
 
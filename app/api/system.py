@@ -1,7 +1,73 @@
+"""
+system.py
+存放系统相关接口，如缓存统计等
+"""
 
+from typing import Literal
 
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 
-from fastapi import APIRouter
+from app import app_config
+
+from app.schemas.response import ResponseModel
+from app.utils.token_blacklist import token_blacklist
+from app.utils.user import verified_jwt_cache, require_admin
+from app.utils.profile_cache import profile_cache
+from app.utils.rate_limit import rate_limiter
+from app.utils.database_replica import read_router
+from app.utils.metrics import REGISTRY
+from app.utils.profiler import sampling_profiler
+from app.utils.health import health_checker
 
 api_system = APIRouter()
 
+
+@api_system.get("/health/live", description="存活检查：进程与事件循环正常响应即返回 200")
+async def health_live():
+    return ResponseModel.success("存活", health_checker.live())
+
+
+@api_system.get("/health/ready", description="就绪检查：并发检查 PostgreSQL、Redis 与短信服务，启动中、关闭中或依赖不可用时返回 503")
+async def health_ready():
+    result = await health_checker.ready()
+    if not result["ready"]:
+        return JSONResponse(status_code=503, content=ResponseModel.fail("未就绪", result).model_dump())
+    return ResponseModel.success("就绪", result)
+
+
+@api_system.get("/cache/stats", description="查看进程内缓存的命中统计（当前 worker）")
+async def cache_stats():
+    return ResponseModel.success("获取缓存统计成功", {
+        "token_blacklist": token_blacklist.stats(),
+        "verified_jwt": verified_jwt_cache.stats(),
+        "user_profile": profile_cache.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "read_replica": read_router.stats(),
+    })
+
+
+@api_system.get("/metrics", description="Prometheus 指标（当前 worker）", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@api_system.get("/profile", description="对当前 worker 的事件循环线程采样分析，返回折叠栈或 SVG 火焰图（需要管理员密钥）")
+async def profile(
+        seconds: float = Query(10, gt=0),
+        interval_ms: float = Query(None, ge=1, le=1000, description="采样间隔（毫秒），默认使用配置"),
+        format: Literal["collapsed", "svg"] = "collapsed",
+        include_idle: bool = Query(False, description="是否包含事件循环空闲等待的采样"),
+        _: bool = Depends(require_admin),
+):
+    config = app_config["profiling"]
+    if seconds > config["max_seconds"]:
+        raise HTTPException(status_code=400, detail=f"采样时间不能超过 {config['max_seconds']} 秒")
+    if sampling_profiler.busy:
+        raise HTTPException(status_code=409, detail="已有采样分析正在进行")
+    interval = (interval_ms or config["sample_interval_ms"]) / 1000
+    result = await sampling_profiler.profile(seconds, interval, include_idle)
+    headers = {"X-Profile-Samples": str(result.sample_count), "X-Profile-Duration": f"{result.duration:.3f}"}
+    if format == "svg":
+        return Response(result.flamegraph(), media_type="image/svg+xml", headers=headers)
+    return PlainTextResponse(result.collapsed(), headers=headers)
@@ -4,19 +4,27 @@ user.py
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from tortoise.exceptions import IntegrityError
 from tortoise.expressions import Q
 from datetime import datetime
+from typing import Optional
+import asyncio
 import uuid
+import json
 from datetime import datetime
 
 from app.config.constant import *
 from app import redis_client, app_config, logger
 from app.models.user import User, UserProfile, UserVip
 from app.schemas.response import ResponseModel
-from app.schemas.user import UserRegister, UserLogin, UserReset, UserProfileUpdateRequest, UserProfileUpdateRequest
-from app.utils.user import create_jwt, get_current_user, get_code, check_code, generate_account, md5, get_current_user_from_request, get_token_from_request, decode_jwt, get_user_from_token, get_user_from_request_without_blacklist
+from app.schemas.user import UserRegister, UserLogin, UserReset, UserProfileUpdateRequest, UserBulkRegister
+from app.utils.user import create_jwt, get_current_user, get_code, check_code, generate_account, md5, get_current_user_from_request, get_token_from_request, decode_jwt, get_user_from_token, get_user_from_request_without_blacklist, require_admin
 from app.utils.database_postgres import UserRepository
+from app.utils.token_blacklist import token_blacklist
+from app.utils.password import password_hasher
+from app.utils.profile_cache import profile_cache
+from app.utils.rate_limit import rate_limiter
 
 
 async def get_user_by_phone(phone: str) -> User:
@@ -51,6 +59,9 @@ def clear_auth_cookie(response: Response):
 
 api_user = APIRouter()
 
+# 批量失效token的写入任务（持有引用，避免任务在完成前被回收）
+_revocation_tasks = set()
+
 
 
 #------------------------------
@@ -58,7 +69,8 @@ api_user = APIRouter()
 #------------------------------
 
 @api_user.get("/register/verification-code/send",description="发送注册验证码，必填手机号")
-async def register_verification_code_get(phone : str):
+async def register_verification_code_get(phone : str, request: Request):
+    await rate_limiter.check("sms_code", request, phone=phone)
     REDIS_USER_REGISTER_CODE = app_config.redis_config["user_register_code"]
     await get_code(phone, REDIS_USER_REGISTER_CODE)
     return ResponseModel.success("注册账号验证码发送成功")
@@ -84,8 +96,8 @@ async def register_by_verification_code(user_register: UserRegister, response: R
     if verification_code:
         await check_code(verification_code, phone, REDIS_USER_REGISTER_CODE)
     
-    # 使用新的数据库操作方法
-    user = await UserRepository.get_user_by_phone(phone)
+    # 只需要判断用户是否存在并签发 token，不加载其他列和关联
+    user = await UserRepository.get_user_by_phone(phone, fields=("user_id",), relations=())
 
     if user:
         token = create_jwt(user)
@@ -97,10 +109,10 @@ async def register_by_verification_code(user_register: UserRegister, response: R
         
         # 处理邀请码逻辑
         if invitation_code:
-            inviting_user = await User.filter(invitation_code=invitation_code).first()
+            inviting_user = await User.filter(invitation_code=invitation_code).only("user_id").first()
             if inviting_user:
-                # 更新邀请者积分
-                await UserRepository.update_user_points(str(inviting_user.user_id), add_points)
+                # 邀请者积分写入积分流水，由后台任务汇总，避免热门邀请码的用户行锁竞争
+                await UserRepository.append_points_entries([(str(inviting_user.user_id), add_points, "invite")])
                 new_user_points += add_points
         
         # 创建新用户
@@ -109,7 +121,7 @@ async def register_by_verification_code(user_register: UserRegister, response: R
                 "account": phone,
                 "phone": phone,
                 "username": username,
-                "password": md5(password),
+                "password": await password_hasher.hash(password),
                 "points": new_user_points,
                 "invitation_code": str(uuid.uuid4())[:8]  # 生成邀请码
             }
@@ -135,40 +147,86 @@ async def register_by_password(user_register: UserRegister, response: Response):
 
     if not username:
         username = "用户" + str(phone)
-    user = await User.filter(phone = phone).first()
+    user = await UserRepository.get_user_by_phone(phone, fields=("user_id",), relations=())
     if user:
         token = create_jwt(user)
         set_auth_cookie(response, token)  # 设置cookie
         return ResponseModel.success("用户已存在，已登录", {"current_user" : get_user_from_token(token), "token" : token})
     else:
         # 用户不存在，创建新用户并直接登录,两者邀请加积分
-        inviting_user = await User.filter(invitation_code=invitation_code).first()
+        # 未填写邀请码时不查询（invitation_code=None 会匹配到没有邀请码的用户）
+        inviting_user = None
+        if invitation_code:
+            inviting_user = await User.filter(invitation_code=invitation_code).only("user_id").first()
         if inviting_user:
-            inviting_user_old_points = inviting_user.points
-            inviting_user.points=add_points + inviting_user_old_points
-            await inviting_user.save()
+            # 邀请者积分写入积分流水，由后台任务汇总，避免热门邀请码的用户行锁竞争
+            await UserRepository.append_points_entries([(str(inviting_user.user_id), add_points, "invite")])
         new_user_points = add_points+init_points
         # 新建用户
         try:
-            newUser = await User.create(
-                account = phone,
-                phone = phone,
-                username = username,
-                password = md5(password),
-                points = new_user_points
-            )
+            newUser = await UserRepository.create_user({
+                "account": phone,
+                "phone": phone,
+                "username": username,
+                "password": await password_hasher.hash(password),
+                "points": new_user_points,
+            })
             token = create_jwt(newUser)
             set_auth_cookie(response, token)  # 设置cookie
             return ResponseModel.success("注册用户成功", {"current_user" : get_user_from_token(token), "token" : token})
         except IntegrityError:
             raise HTTPException(status_code=500, detail="用户创建失败，请稍后重试")
         
+@api_user.post("/register/bulk", description="批量注册用户（管理接口，需要请求头 X-Admin-Key），已存在的手机号会被跳过")
+async def register_bulk(user_bulk_register: UserBulkRegister, _: bool = Depends(require_admin)):
+    users = user_bulk_register.users
+    if not users:
+        raise HTTPException(status_code=400, detail="请提供要注册的用户列表")
+    
+    bulk_config = app_config["bulk_registration"]
+    if len(users) > bulk_config["max_batch_size"]:
+        raise HTTPException(status_code=413, detail=f"单次最多注册 {bulk_config['max_batch_size']} 个用户")
+    
+    # 密码哈希在单独的批量哈希线程池中计算，不影响同时进行的登录
+    hashed_passwords = await password_hasher.hash_many(user.password for user in users)
+    users_data = [
+        {
+            "account": user.phone,
+            "phone": user.phone,
+            "username": user.username or "用户" + user.phone,
+            "password": hashed_password,
+            "points": user.points,
+        }
+        for user, hashed_password in zip(users, hashed_passwords)
+    ]
+    try:
+        # 邀请码由 bulk_create_users 生成，保证不与已有用户重复
+        created_ids, skipped_phones = await UserRepository.bulk_create_users(
+            users_data, chunk_size=bulk_config["chunk_size"])
+    except IntegrityError as e:
+        # 手机号以外的唯一键冲突（例如账户名已被其他用户使用），出错的一批及之后的用户均未创建
+        logger.error(f"批量注册用户失败: {e}")
+        raise HTTPException(status_code=409, detail="部分用户的账户名与已有用户冲突，请检查后重试")
+    except Exception as e:
+        logger.error(f"批量注册用户失败: {e}")
+        raise HTTPException(status_code=500, detail="批量注册失败，请稍后重试")
+    
+    logger.info(f"批量注册完成: 创建 {len(created_ids)} 个用户，跳过 {len(skipped_phones)} 个")
+    return ResponseModel.success(f"成功注册 {len(created_ids)} 个用户", {
+        "created_count": len(created_ids),
+        "skipped_count": len(skipped_phones),
+        "skipped_phones": skipped_phones,
+        "user_ids": created_ids
+    })
+
+
 #------------------------------
 #用户登录部分,有两种登录方式，一种是手机号+密码，一种是手机号+验证码
 #------------------------------
 
 @api_user.get("/login/verification-code/send",description="发送登录验证码")
-async def login_verification_code_get(phone : str):
+async def login_verification_code_get(phone : str, request: Request):
+    await rate_limiter.check("sms_code", request, phone=phone)
     REDIS_USER_LOGIN_CODE = app_config.redis_config["user_login_code"]
     await get_code(phone, REDIS_USER_LOGIN_CODE)
     return ResponseModel.success("登录账号验证码发送成功")
@@ -177,13 +235,13 @@ async def login_verification_code_get(phone : str):
 @api_user.post("/login/verification-code-way",description="通过验证码的方式进行用户登录，此时必须输入验证码和电话，密码是null")
 async def login_by_verification_code(user_login: UserLogin, response: Response):
     phone = user_login.phone
-    code = user_login.code
+    code = user_login.verification_code
     if code==None:
         raise HTTPException(status_code=400, detail="请输入验证码")
     REDIS_USER_LOGIN_CODE = app_config.redis_config["user_login_code"]
     await check_code(code, phone, REDIS_USER_LOGIN_CODE)
 
-    user = await User.filter(phone = phone).first()
+    user = await UserRepository.get_user_by_phone(phone, fields=("user_id",), relations=())
     if user:
         token = create_jwt(user)
         set_auth_cookie(response, token)  # 设置cookie
@@ -193,15 +251,20 @@ async def login_by_verification_code(user_login: UserLogin, response: Response):
 
 
 @api_user.post("/login/password-way",description="通过密码的方式进行用户登录，此时必须输入密码和电话，验证码是null")
-async def login_by_password(user_login: UserLogin, response: Response):
+async def login_by_password(user_login: UserLogin, request: Request, response: Response):
     phone = user_login.phone
     password = user_login.password
     if password==None:
         raise HTTPException(status_code=400, detail="请输入密码")
+    await rate_limiter.check("login_password", request, phone=phone)
     
-    user = await User.filter(phone = phone).first()
+    user = await UserRepository.get_user_by_phone(phone, fields=("user_id", "password"), relations=())
     if user:
-        if user.password == md5(password):
+        matched, needs_rehash = await password_hasher.verify(password, user.password)
+        if matched:
+            if needs_rehash:
+                # 旧的 md5 或代价参数过时的哈希，登录成功后透明地升级
+                await UserRepository.update_user(str(user.user_id), {"password": await password_hasher.hash(password)})
             token = create_jwt(user)
             set_auth_cookie(response, token)  # 设置cookie
             return ResponseModel.success("登录成功", {"current_user" : get_user_from_token(token), "token" : token})
@@ -217,7 +280,7 @@ async def logout(request: Request, response: Response):
     token = get_token_from_request(request)
     if token:
         try:
-            redis_client.set(token, 'expired', ex=60*60*24)
+            await token_blacklist.revoke(token, ex=60*60*24)
         except Exception as e:
             logger.warning(f"Redis操作失败，但退出登录继续: {e}")
     clear_auth_cookie(response)  # 清除cookie
@@ -250,7 +313,7 @@ async def invalidate_cookie(request: Request, response: Response, target_token:
         decode_jwt(token_to_invalidate)
         
         # 将token加入黑名单
-        redis_client.set(token_to_invalidate, 'expired', ex=60*60*24*30)  # 30天过期
+        await token_blacklist.revoke(token_to_invalidate, ex=60*60*24*30)  # 30天过期
         
         # 如果失效的是当前请求的token，也要清除cookie
         if token_to_invalidate == current_token:
@@ -269,13 +332,14 @@ async def invalidate_cookie(request: Request, response: Response, target_token:
         raise HTTPException(status_code=500, detail="服务器内部错误")
 
 
-@api_user.post("/invalidate-multiple-cookies", description="批量使多个cookie失效")
-async def invalidate_multiple_cookies(request: Request, response: Response, target_tokens: list[str]):
+@api_user.post("/invalidate-multiple-cookies", description="批量使多个cookie失效，stream=true 时以 NDJSON 流式返回每批处理进度")
+async def invalidate_multiple_cookies(request: Request, response: Response, target_tokens: list[str], stream: bool = False):
     """
     批量使多个cookie失效的接口
     
     参数说明:
-    - target_tokens: 要失效的token列表
+    - target_tokens: 要失效的token列表，数量上限由 token_revocation.max_batch_size 配置
+    - stream: 可选，为 true 时返回 application/x-ndjson，每处理完一批输出一行进度，最后一行为汇总结果
     
     使用场景:
     1. 安全事件后批量清理
@@ -284,53 +348,138 @@ async def invalidate_multiple_cookies(request: Request, response: Response, targ
     if not target_tokens:
         raise HTTPException(status_code=400, detail="请提供要失效的token列表")
     
+    revocation_config = app_config["token_revocation"]
+    max_batch_size = revocation_config["max_batch_size"]
+    chunk_size = revocation_config["pipeline_chunk_size"]
+    if len(target_tokens) > max_batch_size:
+        raise HTTPException(status_code=413, detail=f"单次最多失效 {max_batch_size} 个token")
+    
     current_token = get_token_from_request(request)
-    invalidated_count = 0
     failed_tokens = []
-    current_token_invalidated = False
+    valid_tokens = []
     
-    for token in target_tokens:
+    # 先统一校验token格式，再批量写入Redis
+    for token in dict.fromkeys(target_tokens):
         try:
-            # 验证token格式是否正确
             decode_jwt(token)
-            
-            # 将token加入黑名单
-            redis_client.set(token, 'expired', ex=60*60*24*30)  # 30天过期
-            invalidated_count += 1
-            
-            # 检查是否包含当前请求的token
-            if token == current_token:
-                current_token_invalidated = True
-                
+            valid_tokens.append(token)
         except HTTPException:
             # token格式无效，记录但继续处理其他token
             failed_tokens.append(token[:20] + "...")
-        except Exception as e:
-            logger.error(f"处理token时发生错误: {e}")
-            failed_tokens.append(token[:20] + "...")
     
-    # 如果当前token也被失效了，清除cookie
-    if current_token_invalidated:
-        clear_auth_cookie(response)
+    current_token_included = current_token is not None and current_token in valid_tokens
+    if current_token_included:
+        # 当前token放在第一批：流式响应在发送响应头前等待这一批写入成功，再决定是否清除cookie
+        valid_tokens.remove(current_token)
+        valid_tokens.insert(0, current_token)
+    state = {"current_token_invalidated": False}
+    chunks = [valid_tokens[i:i + chunk_size] for i in range(0, len(valid_tokens), chunk_size)]
+    progress_queue: asyncio.Queue = asyncio.Queue()
+    first_chunk_done = asyncio.Event()
     
-    result_message = f"成功失效 {invalidated_count} 个cookie"
-    if failed_tokens:
-        result_message += f"，{len(failed_tokens)} 个token处理失败"
+    async def revoke_chunks() -> int:
+        """逐批通过pipeline写入黑名单，每批完成后把进度放入队列（结束时放入 None），返回成功失效的数量"""
+        invalidated_count = 0
+        try:
+            for index, chunk in enumerate(chunks):
+                try:
+                    await token_blacklist.revoke_many(chunk, ex=60*60*24*30)  # 30天过期
+                    invalidated_count += len(chunk)
+                    if current_token_included and current_token in chunk:
+                        state["current_token_invalidated"] = True
+                    error = None
+                except Exception as e:
+                    logger.error(f"批量写入token黑名单时发生错误: {e}")
+                    failed_tokens.extend(token[:20] + "..." for token in chunk)
+                    error = "Redis写入失败"
+                first_chunk_done.set()
+                progress_queue.put_nowait({
+                    "chunk": index + 1,
+                    "chunks": len(chunks),
+                    "chunk_size": len(chunk),
+                    "invalidated_count": invalidated_count,
+                    "error": error,
+                })
+        finally:
+            first_chunk_done.set()
+            progress_queue.put_nowait(None)
+        return invalidated_count
     
-    logger.info(f"批量失效操作完成: {result_message}")
+    # 写入黑名单在独立的任务中进行，不受响应影响：客户端断开（流式输出被中止）后剩余批次仍会写完
+    revocation = asyncio.create_task(revoke_chunks())
+    _revocation_tasks.add(revocation)
+    revocation.add_done_callback(_revocation_tasks.discard)
     
-    return ResponseModel.success(result_message, {
-        "invalidated_count": invalidated_count,
-        "failed_count": len(failed_tokens),
-        "failed_tokens": failed_tokens,
-        "current_token_invalidated": current_token_invalidated
-    })
+    def summary(invalidated_count: int) -> dict:
+        return {
+            "invalidated_count": invalidated_count,
+            "failed_count": len(failed_tokens),
+            "failed_tokens": failed_tokens,
+            "current_token_invalidated": state["current_token_invalidated"]
+        }
+    
+    def result_message(invalidated_count: int) -> str:
+        message = f"成功失效 {invalidated_count} 个cookie"
+        if failed_tokens:
+            message += f"，{len(failed_tokens)} 个token处理失败"
+        logger.info(f"批量失效操作完成: {message}")
+        return message
+    
+    if stream:
+        async def ndjson_progress():
+            """只输出写入任务的进度，中止输出不会影响写入"""
+            invalidated_count = 0
+            while (progress := await progress_queue.get()) is not None:
+                invalidated_count = progress["invalidated_count"]
+                yield json.dumps(progress, ensure_ascii=False) + "\n"
+            yield json.dumps({
+                "done": True,
+                "message": result_message(invalidated_count),
+                **summary(invalidated_count)
+            }, ensure_ascii=False) + "\n"
+        
+        # 流式响应的响应头在开始输出前发送，等包含当前token的第一批写入成功后再决定是否清除cookie
+        if current_token_included:
+            await asyncio.shield(first_chunk_done.wait())
+        streaming_response = StreamingResponse(ndjson_progress(), media_type="application/x-ndjson")
+        if state["current_token_invalidated"]:
+            clear_auth_cookie(streaming_response)
+        return streaming_response
+    
+    invalidated_count = await asyncio.shield(revocation)
+    
+    # 如果当前token也被失效了，清除cookie
+    data = summary(invalidated_count)
+    if data["current_token_invalidated"]:
+        clear_auth_cookie(response)
+    
+    return ResponseModel.success(result_message(invalidated_count), data)
 
 
 #------------------------------
 #用户信息获取部分
 #------------------------------
 
+async def load_user_profile(user_id: str) -> Optional[dict]:
+    """从数据库加载并序列化用户基础信息"""
+    user = await UserRepository.get_user_by_id(user_id, relations=())
+    if not user:
+        return None
+    return {
+        "user_id": str(user.user_id),
+        "account": user.account,
+        "username": user.username,
+        "phone": user.phone,
+        "points": await UserRepository.get_user_points_balance(user_id),  # 包含尚未汇总的积分流水
+        "invitation_code": user.invitation_code,
+        "is_active": user.is_active,
+        "is_verified": user.is_verified,
+        "created_at": str(user.created_at),
+        "updated_at": str(user.updated_at),
+        "last_login": str(user.last_login) if user.last_login else None
+    }
+
+
 @api_user.get("/profile", description="获取当前用户个人信息（使用cookie认证）")
 async def get_user_profile(request: Request):
     """
@@ -346,26 +495,11 @@ async def get_user_profile(request: Request):
         current_user = await get_user_from_request_without_blacklist(request)
         user_id = current_user.get('user_id')
         
-        # 查询用户基础信息
-        user = await User.get_or_none(user_id=user_id)
-        if not user:
+        # 优先读取缓存，未命中时查询数据库
+        user_data = await profile_cache.get(user_id, load_user_profile)
+        if not user_data:
             raise HTTPException(status_code=404, detail="用户不存在")
         
-        # 构建响应数据
-        user_data = {
-            "user_id": str(user.user_id),
-            "account": user.account,
-            "username": user.username,
-            "phone": user.phone,
-            "points": user.points,
-            "invitation_code": user.invitation_code,
-            "is_active": user.is_active,
-            "is_verified": user.is_verified,
-            "created_at": str(user.created_at),
-            "updated_at": str(user.updated_at),
-            "last_login": str(user.last_login) if user.last_login else None
-        }
-        
         return ResponseModel.success("获取用户信息成功", user_data)
         
     except HTTPException:
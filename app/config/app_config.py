@@ -1,19 +1,69 @@
 import os
 import json
-from typing import Dict
+from types import MappingProxyType
+from typing import Any, Callable, Dict
 import logging
 
 from .constant import APP_CONFIG_PATH,DEFAULT_VALUE_MAP
-from .default import DEFAULT_CONFIG, get_postgres_config, get_redis_config, get_jwt_config, get_verification_code_config, get_cookie_config
+from .default import DEFAULT_CONFIG, get_postgres_config, get_redis_config, get_jwt_config, get_verification_code_config, get_cookie_config, get_admin_config, get_server_config
+from .env_loader import env_loader
 
 
 logger = logging.getLogger("app")
+
+# 从环境变量构建的敏感配置，启动时计算一次并冻结为只读快照
+ENV_CONFIG_GETTERS = {
+    'postgres_config': get_postgres_config,
+    'redis_config': get_redis_config,
+    'jwt_config': get_jwt_config,
+    'verification_code_config': get_verification_code_config,
+    'cookie_config': get_cookie_config,
+    'admin_config': get_admin_config,
+    'server_config': get_server_config,
+}
+
+
+def freeze(value: Any) -> Any:
+    '''递归地将 dict 转换为只读的 MappingProxyType，list 转换为 tuple'''
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def merge_in_place(target: dict, source: dict):
+    '''用 source 原地更新 target：两边都是 dict 的配置块递归更新，保留原对象，其余值直接替换，source 中没有的键删除'''
+    for key in [key for key in target if key not in source]:
+        del target[key]
+    for key, value in source.items():
+        current = target.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            merge_in_place(current, value)
+        else:
+            target[key] = value
+
+
+def thaw(value: Any) -> Any:
+    '''freeze 的逆操作，返回可修改的深拷贝（例如传给会修改或深拷贝配置的第三方库）'''
+    if isinstance(value, (dict, MappingProxyType)):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
 class AppConfig(dict):
     '''从配置文件中加载的配置，支持直接通过点号操作符访问根配置项。
     
     - 初始化时会将传入的 default_config 与配置文件进行比对，如果配置文件中缺少配置项则会自动插入默认值并进行一次写入操作。会递归检查配置项。
     - 如果配置文件路径对应的文件不存在，则会自动创建并写入默认配置。
     - 如果传入了 schema，将会通过 schema 解析出 default_config，此时传入的 default_config 会被忽略。
+    - 环境变量中的敏感配置（postgres_config、cookie_config 等）在初始化时构建为只读快照并保存为实例属性，
+      读取时只需一次属性查找。调用 reload() 会重新加载 .env 与配置文件，并一次性替换整个快照。
+    - 配置文件中的配置块（app_config["statistics"] 等）是普通 dict，reload() 时原地更新，
+      导入时保存了配置块引用、使用时再读取其中的值的模块可以读到新值；
+      把配置值复制到对象属性中的模块通过 add_reload_listener 注册回调，在 reload() 后重新应用可以热加载的配置。
     '''
     def __init__(
         self,
@@ -26,9 +76,18 @@ class AppConfig(dict):
         object.__setattr__(self, 'config_path', config_path)
         object.__setattr__(self, 'default_config', default_config)
         object.__setattr__(self, 'schema', schema)
+        object.__setattr__(self, '_reload_listeners', [])
 
         if schema:
             default_config = self._config_schema_to_default_config(schema)
+            object.__setattr__(self, 'default_config', default_config)
+        self.update(self._load_config_file())
+        self._build_snapshot()
+
+    def _load_config_file(self) -> dict:
+        '''读取配置文件并补全缺失的配置项'''
+        config_path = self.config_path
+        default_config = self.default_config
         if not self.check_exist():
             '''不存在时将default默认配置文件载入配置文件'''
             # 确保目录存在
@@ -44,11 +103,40 @@ class AppConfig(dict):
             conf = json.loads(conf_str)
         # 检查配置完整性，并插入
         has_new = self.check_config_integrity(default_config, conf)
-        self.update(conf)
         if has_new:
-            self.save_config()
-            
-        self.update(conf)
+            with open(config_path, "w", encoding="utf-8-sig") as f:
+                json.dump(conf, f, indent=2, ensure_ascii=False)
+        return conf
+
+    def _build_snapshot(self):
+        '''构建环境变量配置的只读快照
+
+        快照直接写入实例 __dict__，普通属性查找即可命中，不会再进入 __getattr__。
+        dict.update 是一次原子操作，读取方不会看到新旧配置混合的中间状态。
+        '''
+        snapshot = {name: freeze(getter()) for name, getter in ENV_CONFIG_GETTERS.items()}
+        self.__dict__.update(snapshot)
+
+    def add_reload_listener(self, listener: Callable[[], Any]):
+        '''注册 reload() 完成后调用的回调，用于把新的配置值应用到已创建的对象上'''
+        self._reload_listeners.append(listener)
+
+    def reload(self):
+        '''重新加载 .env 与配置文件，原地更新配置块并原子地替换环境变量快照，然后调用已注册的回调
+
+        注意：在导入时就读取并缓存了配置值、且没有注册回调的配置（例如 JWT 密钥、连接池与线程池大小）需要重启进程。
+        '''
+        env_loader.load_env()
+        conf = self._load_config_file()
+        # 中间没有 await，对协程而言更新是原子的
+        merge_in_place(self, conf)
+        self._build_snapshot()
+        for listener in self._reload_listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"应用新配置失败: {e}")
+        logger.info("配置已重新加载")
         
     def _config_schema_to_default_config(self, schema: dict) -> dict:
         '''将 Schema 转换成 Config'''
@@ -102,19 +190,7 @@ class AppConfig(dict):
         with open(self.config_path, "w", encoding="utf-8-sig") as f:
             json.dump(self, f, indent=2, ensure_ascii=False)
     def __getattr__(self, item):
-        # 对于敏感配置，始终从环境变量动态获取
-        if item == 'postgres_config':
-            return get_postgres_config()
-        elif item == 'redis_config':
-            return get_redis_config()
-        elif item == 'jwt_config':
-            return get_jwt_config()
-        elif item == 'verification_code_config':
-            return get_verification_code_config()
-        elif item == 'cookie_config':
-            return get_cookie_config()
-        
-        # 其他配置从JSON文件读取
+        # 敏感配置的快照是实例属性，不会进入这里；其他配置从JSON文件读取
         try:
             return self[item]
         except KeyError:
@@ -0,0 +1,80 @@
+"""
+配置热加载
+收到 SIGHUP 信号，或检测到 data/config.json、.env 的修改时间变化时，调用 AppConfig.reload() 重新加载配置
+"""
+import asyncio
+import os
+import signal
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("app")
+
+
+class ConfigWatcher:
+    """配置文件监视器
+
+    - interval 为轮询文件修改时间的间隔（秒），为 0 时只响应 SIGHUP 信号。
+    - 需要在事件循环中通过 start()/stop() 启动和停止（例如在应用 lifespan 中）。
+    """
+
+    def __init__(self, app_config, paths: List[str], interval: float = 5.0):
+        self.app_config = app_config
+        self.paths = [str(path) for path in paths]
+        self.interval = interval
+        self._mtimes: Dict[str, Optional[float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._signal_installed = False
+
+    def _snapshot_mtimes(self) -> Dict[str, Optional[float]]:
+        mtimes = {}
+        for path in self.paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def reload(self, reason: str):
+        """重新加载配置，失败时保留旧配置"""
+        try:
+            self.app_config.reload()
+            logger.info(f"配置重新加载完成（触发原因：{reason}）")
+        except Exception as e:
+            logger.error(f"配置重新加载失败，继续使用旧配置: {e}")
+        finally:
+            self._mtimes = self._snapshot_mtimes()
+
+    async def start(self):
+        """注册 SIGHUP 信号处理并启动文件轮询任务"""
+        self._mtimes = self._snapshot_mtimes()
+        loop = asyncio.get_running_loop()
+        if hasattr(signal, "SIGHUP"):
+            try:
+                loop.add_signal_handler(signal.SIGHUP, self.reload, "SIGHUP")
+                self._signal_installed = True
+            except (NotImplementedError, RuntimeError, ValueError) as e:
+                logger.warning(f"无法注册 SIGHUP 配置重载信号: {e}")
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        """停止轮询任务并移除信号处理"""
+        if self._signal_installed:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+            self._signal_installed = False
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            mtimes = self._snapshot_mtimes()
+            changed = [path for path, mtime in mtimes.items() if mtime != self._mtimes.get(path)]
+            if changed:
+                self.reload("文件变更: " + ", ".join(changed))
@@ -14,4 +14,12 @@ DEFAULT_VALUE_MAP = {
 
 REDIS_USER_REGISTER_CODE = 'user:register:code:'
 REDIS_USER_LOGIN_CODE = 'user:login:code:'
-REDIS_USER_RESET_CODE = 'user:reset:code:'
\ No newline at end of file
+REDIS_USER_RESET_CODE = 'user:reset:code:'
+# 每个手机号一个哈希，字段为 {用途}、{用途}:exp、{用途}:fails，用途由上面三个前缀区分
+REDIS_USER_CODE = 'user:code:'
+
+REDIS_TOKEN_REVOKED_CHANNEL = 'user:token:revoked'
+REDIS_USER_PROFILE_VERSION = 'user:profile:version:'
+REDIS_USER_STATISTICS = 'user:statistics'
+REDIS_RATE_LIMIT = 'rate_limit:'
+REDIS_REPLICA_PIN = 'replica:pin:'
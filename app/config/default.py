@@ -5,21 +5,94 @@ from .constant import *
 from .env_loader import env_loader
 
 
-def get_postgres_config():
-    """动态获取PostgreSQL配置，始终从环境变量读取"""
+# 生产模式启动器（main.py --prod）在启动 worker 前设置，值为 worker 数；不要在 .env 中配置
+POOL_WORKERS_ENV = "APP_POOL_WORKERS"
+
+
+def get_worker_count() -> int:
+    """worker 进程数（APP_WORKERS），生产模式启动时使用"""
+    return max(1, env_loader.get_env_int("APP_WORKERS", 1))
+
+
+def per_worker(total: int, minimum: int = 1) -> int:
+    """把整个服务的连接数上限平分到每个 worker 进程
+
+    只在生产模式启动器启动的 worker 中平分，开发服务器、migration.py 等单进程入口使用完整的上限
+    """
+    return max(minimum, total // max(1, env_loader.get_env_int(POOL_WORKERS_ENV, 1)))
+
+
+def parse_settings(value: str) -> dict:
+    """解析 name=value,name=value 格式的配置，例如 statement_timeout=5000,application_name=user-service"""
+    settings = {}
+    for item in value.split(","):
+        if item.strip():
+            name, _, setting = item.partition("=")
+            settings[name.strip()] = setting.strip()
+    return settings
+
+
+def get_server_config():
+    """动态获取应用启动配置（生产模式的 uvicorn 参数、是否在启动时建表），始终从环境变量读取"""
     return {
-        "connections": {
-            "default": {
-                "engine": "tortoise.backends.asyncpg",
-                "credentials": {
-                    "host": env_loader.get_env("POSTGRES_HOST", "localhost"),
-                    "port": env_loader.get_env_int("POSTGRES_PORT", 5432),
-                    "user": env_loader.get_env("POSTGRES_USER", "postgres"),
-                    "password": env_loader.get_env("POSTGRES_PASSWORD", ""),
-                    "database": env_loader.get_env("POSTGRES_DATABASE", ""),
-                },
+        "host": env_loader.get_env("APP_HOST", "0.0.0.0"),
+        "port": env_loader.get_env_int("APP_PORT", 8000),
+        "workers": get_worker_count(),
+        "limit_max_requests": env_loader.get_env_int("APP_LIMIT_MAX_REQUESTS", 0),  # 每个 worker 处理多少请求后重启，0 表示不重启
+        "limit_max_requests_jitter": env_loader.get_env_int("APP_LIMIT_MAX_REQUESTS_JITTER", 0),  # 随机增加的请求数，避免 worker 同时重启
+        "graceful_timeout": env_loader.get_env_int("APP_GRACEFUL_TIMEOUT", 30),  # 收到 SIGTERM 后等待进行中请求完成的秒数
+        "keep_alive": env_loader.get_env_int("APP_KEEP_ALIVE", 5),
+        # 启动时生成表结构，仅用于开发环境；生产环境使用 python migration.py init 建表
+        "generate_schemas": env_loader.get_env_bool("DB_GENERATE_SCHEMAS", False),
+    }
+
+
+def get_postgres_config():
+    """动态获取PostgreSQL配置，始终从环境变量读取
+
+    配置了 POSTGRES_REPLICA_HOST 时增加只读副本连接 replica（其余参数与主库相同），用于 UserRepository 的只读查询
+    """
+    # 0 表示不预先建立连接；大于 0 时每个 worker 至少预先建立 1 个
+    min_connections = env_loader.get_env_int("POSTGRES_MIN_CONNECTIONS", 1)
+    credentials = {
+        "host": env_loader.get_env("POSTGRES_HOST", "localhost"),
+        "port": env_loader.get_env_int("POSTGRES_PORT", 5432),
+        "user": env_loader.get_env("POSTGRES_USER", "postgres"),
+        "password": env_loader.get_env("POSTGRES_PASSWORD", ""),
+        "database": env_loader.get_env("POSTGRES_DATABASE", ""),
+        # 整个服务（所有 worker）的连接数上限，按 worker 数平分
+        "minsize": min(per_worker(min_connections, minimum=min(min_connections, 1)),
+                       per_worker(env_loader.get_env_int("POSTGRES_MAX_CONNECTIONS", 20))),
+        "maxsize": per_worker(env_loader.get_env_int("POSTGRES_MAX_CONNECTIONS", 20)),
+        "max_queries": env_loader.get_env_int("POSTGRES_MAX_QUERIES", 50000),  # 单个连接执行多少次查询后重建
+        "max_inactive_connection_lifetime": env_loader.get_env_float("POSTGRES_MAX_INACTIVE_CONNECTION_LIFETIME", 300.0),
+        # 预编译语句缓存，经过 PgBouncer 事务池模式时必须设为 0
+        "statement_cache_size": env_loader.get_env_int("POSTGRES_STATEMENT_CACHE_SIZE", 100),
+        "max_cached_statement_lifetime": env_loader.get_env_int("POSTGRES_MAX_CACHED_STATEMENT_LIFETIME", 300),
+        "command_timeout": env_loader.get_env_float("POSTGRES_COMMAND_TIMEOUT", 0.0) or None,  # 0 表示不限制
+        "timeout": env_loader.get_env_float("POSTGRES_CONNECT_TIMEOUT", 60.0),
+        "server_settings": parse_settings(env_loader.get_env("POSTGRES_SERVER_SETTINGS", "")),
+    }
+    connections = {
+        # tortoise.backends.asyncpg 的客户端，另外统计获取连接的耗时
+        "default": {"engine": "app.utils.database_pool", "credentials": credentials},
+    }
+    replica_host = env_loader.get_env("POSTGRES_REPLICA_HOST", "")
+    if replica_host:
+        replica_max = per_worker(env_loader.get_env_int("POSTGRES_REPLICA_MAX_CONNECTIONS",
+                                                        env_loader.get_env_int("POSTGRES_MAX_CONNECTIONS", 20)))
+        connections["replica"] = {
+            "engine": "app.utils.database_pool",
+            "credentials": {
+                **credentials,
+                "host": replica_host,
+                "port": env_loader.get_env_int("POSTGRES_REPLICA_PORT", credentials["port"]),
+                "minsize": min(credentials["minsize"], replica_max),
+                "maxsize": replica_max,
             },
-        }, 
+        }
+    return {
+        "connections": connections,
         "apps": {
             "models": {
                 "models": [
@@ -40,6 +113,13 @@ def get_redis_config():
         "password": env_loader.get_env("REDIS_PASSWORD", ""),
         "db": env_loader.get_env_int("REDIS_DB", 0),
         "port": env_loader.get_env_int("REDIS_PORT", 6379),
+        # 连接池配置
+        # 所有 worker 合计，按 worker 数平分；令牌黑名单的 pub/sub 订阅始终占用其中一个连接，每个 worker 至少 2 个
+        "max_connections": per_worker(env_loader.get_env_int("REDIS_MAX_CONNECTIONS", 50), minimum=2),
+        "pool_timeout": env_loader.get_env_float("REDIS_POOL_TIMEOUT", 5.0),  # 连接池耗尽时等待空闲连接的秒数
+        "socket_timeout": env_loader.get_env_float("REDIS_SOCKET_TIMEOUT", 2.0),
+        "socket_connect_timeout": env_loader.get_env_float("REDIS_SOCKET_CONNECT_TIMEOUT", 2.0),
+        "health_check_interval": env_loader.get_env_int("REDIS_HEALTH_CHECK_INTERVAL", 30),
         "user_register_code": REDIS_USER_REGISTER_CODE,
         "user_login_code": REDIS_USER_LOGIN_CODE,
         "user_reset_code": REDIS_USER_RESET_CODE
@@ -53,6 +133,13 @@ def get_jwt_config():
     }
 
 
+def get_admin_config():
+    """动态获取管理接口配置，始终从环境变量读取"""
+    return {
+        "admin_api_key": env_loader.get_env("ADMIN_API_KEY", ""),  # 为空时管理接口不可用
+    }
+
+
 def get_cookie_config():
     """动态获取Cookie配置，始终从环境变量读取"""
     return {
@@ -72,6 +159,7 @@ def get_verification_code_config():
         "alibaba_cloud_accesskey_id": env_loader.get_env("ALIBABA_CLOUD_ACCESSKEY_ID", ""),
         "alibaba_cloud_accesskey_secret": env_loader.get_env("ALIBABA_CLOUD_ACCESSKEY_SECRET", ""),
         "sign_name": env_loader.get_env("ALIBABA_CLOUD_SIGN_NAME", ""),
+        "provider": env_loader.get_env("SMS_PROVIDER", "aliyun"),  # aliyun, stub（本地测试/压测，不发送短信）
     }
 
 
@@ -83,5 +171,120 @@ DEFAULT_CONFIG={
             "invite_points": 1000,
         },
     },
+    # 短信验证码：有效期（秒）与最多校验失败次数，达到次数后验证码作废
+    "verification_code":{
+        "expire_seconds": 300,
+        "max_attempts": 5,
+    },
+    # 批量注册（管理接口）：单次请求的用户数上限、每条 INSERT 语句写入的用户数。
+    # 密码哈希由 password_hashing.bulk_max_workers 个线程计算，每个用户数十毫秒，上限保证一次请求在代理超时前完成
+    "bulk_registration":{
+        "max_batch_size": 200,
+        "chunk_size": 1000,
+    },
+    # 积分流水汇总：间隔秒数（0 表示不在本进程汇总）、每批流水条数、每次最多批数
+    "points_ledger":{
+        "fold_interval": 10,
+        "fold_batch_size": 5000,
+        "fold_max_batches": 20,
+    },
+    # 用户信息读穿缓存（每个 worker 的条目数上限与过期秒数）
+    "cache_settings":{
+        "enabled": True,
+        "ttl": 3600,
+        "max_size": 1000,
+    },
+    # 用户统计：聚合查询结果的缓存秒数；counter_mode 开启时改为读取由写操作维护的 Redis 计数器（counter_ttl 秒后从数据库重建）
+    "statistics":{
+        "cache_ttl": 30,
+        "counter_mode": False,
+        "counter_ttl": 86400,
+    },
+    # 进程内 token 负缓存（记录已确认未失效的 token，跳过 Redis 黑名单查询）
+    "token_cache":{
+        "enabled": True,
+        "max_size": 100000,
+        "ttl": 300,
+    },
+    # 已验证的 JWT 载荷缓存，最长缓存 max_ttl 秒（token 带 exp 时不超过 exp）
+    "jwt_cache":{
+        "enabled": True,
+        "max_size": 100000,
+        "max_ttl": 3600,
+    },
+    # 批量使token失效
+    "token_revocation":{
+        "max_batch_size": 10000,  # 单次请求最多处理的token数量
+        "pipeline_chunk_size": 500,  # 每个Redis pipeline包含的命令数量
+    },
+    # 密码哈希（scrypt），在线程池中计算；max_pending 为同时排队的上限，超出时登录/注册返回 503
+    "password_hashing":{
+        "scrypt_n": 16384,
+        "scrypt_r": 8,
+        "scrypt_p": 1,
+        "max_workers": 4,
+        "max_pending": 64,
+        "bulk_max_workers": 1,  # 批量注册使用的单独线程池，不与登录争用哈希线程
+    },
+    # 短信后台发送队列
+    "sms_dispatch":{
+        "concurrency": 4,  # 并发发送数
+        "queue_size": 1000,  # 队列容量，超出时发送验证码接口返回 503
+        "max_retries": 3,
+        "backoff_base": 0.5,  # 指数退避基数（秒）
+        "backoff_max": 10,
+        "dead_letter_path": "data/sms_dead_letter.log",
+    },
+    # 接口限流（Redis 令牌桶）：routes 中每条限额表示每 period 秒最多 limit 次，scope 为 phone / ip / global
+    "rate_limit":{
+        "enabled": True,
+        "fail_open": True,  # Redis 不可用时放行请求
+        "trust_forwarded_for": False,  # 部署在反向代理之后时按 X-Forwarded-For 识别客户端IP
+        "local_deny_max_size": 10000,  # 进程内记录的被拒绝令牌桶数量上限
+        "routes":{
+            # 所有发送验证码的接口共用
+            "sms_code": [
+                {"scope": "phone", "limit": 1, "period": 60},
+                {"scope": "phone", "limit": 10, "period": 86400},
+                {"scope": "ip", "limit": 30, "period": 3600},
+                {"scope": "global", "limit": 100, "period": 1},
+            ],
+            "login_password": [
+                {"scope": "phone", "limit": 10, "period": 300},
+                {"scope": "ip", "limit": 60, "period": 300},
+                {"scope": "global", "limit": 500, "period": 1},
+            ],
+        },
+    },
+    # Prometheus 指标：关闭后不再统计 HTTP 请求（/system/metrics 仍然可用）
+    "metrics":{
+        "enabled": True,
+    },
+    # 采样分析：/system/profile 按需采样；slow_request_threshold_ms 大于 0 时自动保存慢请求的调用栈（修改后需重启）
+    "profiling":{
+        "max_seconds": 60,  # 单次按需采样的最长时间
+        "sample_interval_ms": 5,
+        "slow_request_threshold_ms": 0,
+        "slow_request_interval_ms": 10,
+        "output_dir": "data/profiles",
+        "max_files": 100,  # 最多保留的慢请求调用栈文件数
+    },
+    # 健康检查：每项依赖检查的超时与就绪检查结果的缓存时间（秒）
+    "health":{
+        "timeout": 2,
+        "cache_ttl": 2,
+    },
+    # 读写分离（配置了 POSTGRES_REPLICA_HOST 时生效）：写操作后 read_your_writes_window 秒内该用户的读取使用主库；
+    # 每 lag_check_interval 秒检查一次副本的复制延迟，超过 max_lag 秒时所有读取回退到主库
+    "read_replica":{
+        "read_your_writes_window": 5,
+        "max_lag": 2,
+        "lag_check_interval": 1,
+        "local_pin_max_size": 100000,  # 每个 worker 在进程内记录的读己之写标记数量上限
+    },
+    # 配置热加载：轮询 data/config.json 与 .env 修改时间的间隔（秒），0 表示只响应 SIGHUP
+    "config_reload":{
+        "watch_interval": 5,
+    },
 }
 
@@ -67,6 +67,17 @@ class EnvLoader:
         except ValueError:
             return default
     
+    @staticmethod
+    def get_env_float(key: str, default: float = 0.0) -> float:
+        """获取环境变量并转换为浮点数"""
+        value = os.environ.get(key)
+        if value is None:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            return default
+    
     @staticmethod
     def get_env_bool(key: str, default: bool = False) -> bool:
         """获取环境变量并转换为布尔值"""
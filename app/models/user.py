@@ -30,6 +30,7 @@ class User(Model):
             ["phone"],
             ["account"],
             ["created_at"],
+            ["created_at", "user_id"],  # 用户列表游标分页
             ["is_active", "is_verified"]
         ]
         
@@ -103,4 +104,24 @@ class UserIdentity(Model):
         indexes = [
             ["identity_type"],
             ["is_verified"]
-        ]
\ No newline at end of file
+        ]
+
+
+class PointsLedger(Model):
+    """积分流水模型（只追加），定期汇总到 User.points"""
+    id = fields.BigIntField(pk=True)
+    user = fields.ForeignKeyField("models.User", related_name="points_ledger", on_delete=fields.CASCADE)
+    
+    delta = fields.IntField(description="积分变化")
+    reason = fields.CharField(max_length=50, description="变化原因")
+    folded = fields.BooleanField(default=False, description="是否已汇总到用户积分")
+    
+    # 时间戳
+    created_at = fields.DatetimeField(auto_now_add=True)
+    
+    class Meta:
+        table = "points_ledger"
+        indexes = [
+            ["folded", "id"],
+            ["user_id", "folded"]
+        ]
@@ -4,7 +4,7 @@ schemas/user.py
 """
 
 from pydantic import  UUID4, EmailStr, constr
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, Field, field_validator
@@ -121,6 +121,42 @@ class UserReset(BaseModel):
         return value
 
 
+class UserBulkRegisterItem(BaseModel):
+    """批量注册中的单个用户"""
+    phone: str = Field(
+        ...,
+        description="用户的手机号码，必填",
+        min_length=11,
+        max_length=11
+    )
+    password: str = Field(
+        ...,
+        description="用户的密码，必填",
+        min_length=6,
+        max_length=20
+    )
+    username: Optional[str] = Field(
+        default=None,
+        description="用户的用户名，可选"
+    )
+    points: int = Field(
+        default=0,
+        description="初始积分",
+        ge=0
+    )
+
+    @field_validator('phone')
+    def validate_phone(cls, value):
+        if not value.isdigit():
+            raise ValueError("手机号码必须为数字")
+        return value
+
+
+class UserBulkRegister(BaseModel):
+    """批量注册请求模型"""
+    users: List[UserBulkRegisterItem] = Field(..., description="要创建的用户列表，数量上限由 bulk_registration.max_batch_size 配置")
+
+
 class UserProfileResponse(BaseModel):
     """用户个人信息响应模型"""
     user_id: str = Field(..., description="用户ID")
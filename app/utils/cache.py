@@ -0,0 +1,74 @@
+"""
+进程内缓存工具
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """有容量上限的LRU缓存，可选按条目过期
+
+    - max_size: 最大条目数，超出时淘汰最久未使用的条目
+    - ttl: 默认过期秒数，None 表示不过期；set 时可以为单个条目指定过期时间
+    - 记录命中与未命中次数，便于观察缓存效果
+    - 仅在单个事件循环内使用，不做线程同步
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """获取缓存值，不存在或已过期时返回 default"""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """写入缓存，ttl 为 None 时使用默认过期时间"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """删除并返回缓存值"""
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        """清空缓存"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and (item[1] is None or item[1] > time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
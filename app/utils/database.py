@@ -1,29 +1,33 @@
-import redis
 import asyncio
 from typing import Optional
 import logging
 
 # 导入PostgreSQL相关的数据库操作
 from .database_postgres import DatabaseManager, UserRepository, DatabaseUtils
+# 导入Redis相关的数据库操作
+from .database_redis import RedisManager, redis_client, create_redis_client
 
 logger = logging.getLogger("app")
 
 
-def get_redis() -> redis.StrictRedis:
-    from app import app_config #延迟引入，避免循环引用
-    redis_config = app_config.redis_config
-    redis_host = redis_config["host"]
-    redis_password = redis_config["password"]
-    redis_db = redis_config["db"]
-    redis_port = redis_config["port"]
-    redis_conn = redis.StrictRedis(host=redis_host, port=redis_port, db=redis_db, password=redis_password, decode_responses=True)
-    return redis_conn
+def get_redis():
+    """获取异步Redis客户端（通过代理始终指向当前连接池）"""
+    return redis_client
 
-async def init_database():
+async def init_redis(client=None):
+    """初始化Redis连接池"""
+    await RedisManager.init_redis(client)
+
+async def close_redis():
+    """关闭Redis连接池"""
+    await RedisManager.close_redis()
+
+async def init_database(generate_schemas: bool = True):
     """初始化数据库连接"""
     from app import app_config
-    postgres_config = app_config.postgres_config
-    await DatabaseManager.init_db(postgres_config)
+    from app.config.app_config import thaw
+    postgres_config = thaw(app_config.postgres_config)
+    await DatabaseManager.init_db(postgres_config, generate_schemas)
 
 async def close_database():
     """关闭数据库连接"""
@@ -36,10 +40,15 @@ async def check_database_health() -> bool:
 # 导出常用的数据库操作
 __all__ = [
     'get_redis',
-    'init_database', 
+    'init_redis',
+    'close_redis',
+    'create_redis_client',
+    'init_database',
     'close_database',
     'check_database_health',
     'DatabaseManager',
     'UserRepository',
-    'DatabaseUtils'
-]
\ No newline at end of file
+    'DatabaseUtils',
+    'RedisManager',
+    'redis_client'
+]
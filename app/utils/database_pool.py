@@ -0,0 +1,109 @@
+"""
+PostgreSQL 连接池
+- InstrumentedAsyncpgClient 是 Tortoise 的 asyncpg 客户端，创建连接池后为获取连接计时；
+  在连接配置中以 "engine": "app.utils.database_pool" 使用
+- validate_pool_options 在启动时校验连接池参数，参数不合法时直接报错，避免带着错误配置运行
+- pool_stats 读取连接池当前的使用情况（使用中、空闲、等待获取连接的协程数、获取连接的耗时），
+  获取连接的耗时按连接名（主库 default、副本 replica）分别统计
+"""
+import time
+from typing import Any, Dict, List, Mapping, Optional
+
+import asyncpg
+from tortoise.backends.asyncpg.client import AsyncpgDBClient
+
+from app.utils.metrics import db_pool_acquire_duration_seconds
+
+
+_timed_pool_classes: Dict[str, type] = {}
+
+
+def timed_pool_class(connection_name: str) -> type:
+    """为获取连接计时的 asyncpg.Pool 子类，耗时计入 connection_name 标签（每个连接名一个子类）
+
+    asyncpg.Pool 使用 __slots__，不能替换实例上的方法；子类不增加字段，可以直接替换连接池实例的类
+    """
+    pool_class = _timed_pool_classes.get(connection_name)
+    if pool_class is None:
+        acquire_timer = db_pool_acquire_duration_seconds.labels(connection_name)
+
+        class TimedPool(asyncpg.Pool):
+            __slots__ = ()
+
+            async def _acquire(self, timeout):
+                start = time.perf_counter()
+                try:
+                    return await super()._acquire(timeout)
+                finally:
+                    acquire_timer.observe(time.perf_counter() - start)
+
+        pool_class = _timed_pool_classes[connection_name] = TimedPool
+    return pool_class
+
+
+class InstrumentedAsyncpgClient(AsyncpgDBClient):
+    """为获取连接计时的 asyncpg 客户端"""
+
+    async def create_pool(self, **kwargs):
+        # asyncpg 要求 command_timeout 大于 0，0 与 None 一样表示不限制
+        if not kwargs.get("command_timeout"):
+            kwargs["command_timeout"] = None
+        # 与 AsyncpgDBClient.create_pool 相同，在连接池初始化（await）之前替换为计时的子类
+        pool = asyncpg.create_pool(None, **kwargs)
+        pool.__class__ = timed_pool_class(self.connection_name)
+        return await pool
+
+
+# Tortoise 通过 engine 模块的 client_class 创建客户端
+client_class = InstrumentedAsyncpgClient
+
+
+def validate_pool_options(credentials: Mapping[str, Any]):
+    """校验连接池参数，不合法时抛出 ValueError（列出所有问题）"""
+    errors: List[str] = []
+    minsize = credentials.get("minsize", 1)
+    maxsize = credentials.get("maxsize", 5)
+    if maxsize < 1:
+        errors.append(f"最大连接数必须大于 0（当前 {maxsize}）")
+    if not 0 <= minsize <= maxsize:
+        errors.append(f"最小连接数必须在 0 到最大连接数之间（当前 {minsize}，最大 {maxsize}）")
+    if credentials.get("max_queries", 1) < 1:
+        errors.append("POSTGRES_MAX_QUERIES 必须大于 0")
+    for key, env in (("max_inactive_connection_lifetime", "POSTGRES_MAX_INACTIVE_CONNECTION_LIFETIME"),
+                     ("statement_cache_size", "POSTGRES_STATEMENT_CACHE_SIZE"),
+                     ("max_cached_statement_lifetime", "POSTGRES_MAX_CACHED_STATEMENT_LIFETIME")):
+        if credentials.get(key, 0) < 0:
+            errors.append(f"{env} 不能小于 0")
+    command_timeout = credentials.get("command_timeout")
+    if command_timeout is not None and command_timeout < 0:
+        errors.append("POSTGRES_COMMAND_TIMEOUT 不能小于 0（0 表示不限制）")
+    if credentials.get("timeout", 60) <= 0:
+        errors.append("POSTGRES_CONNECT_TIMEOUT 必须大于 0")
+    for name, value in (credentials.get("server_settings") or {}).items():
+        if not name or not isinstance(value, str) or not value:
+            errors.append(f"POSTGRES_SERVER_SETTINGS 中的 {name!r} 格式不正确，应为 name=value")
+    if errors:
+        raise ValueError("PostgreSQL 连接池配置不正确：" + "；".join(errors))
+
+
+def pool_stats(pool, connection_name: str) -> Optional[Dict[str, Any]]:
+    """连接池使用情况，pool 为 None（尚未创建）时返回 None；获取连接的耗时只统计 connection_name 的连接池"""
+    if pool is None:
+        return None
+    size = pool.get_size()
+    idle = pool.get_idle_size()
+    # asyncpg 用队列分配连接，队列上挂起的 get() 即等待获取连接的协程
+    getters = getattr(getattr(pool, "_queue", None), "_getters", ())
+    waiters = sum(1 for getter in getters if not getter.done())
+    acquire_timer = db_pool_acquire_duration_seconds.labels(connection_name)
+    acquire_count = sum(acquire_timer.counts)
+    return {
+        "in_use": size - idle,
+        "idle": idle,
+        "size": size,
+        "min": pool.get_min_size(),
+        "max": pool.get_max_size(),
+        "waiters": waiters,
+        "acquire_count": acquire_count,
+        "acquire_avg_ms": round(acquire_timer.sum / acquire_count * 1000, 3) if acquire_count else 0.0,
+    }
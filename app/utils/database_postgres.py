@@ -2,30 +2,192 @@
 PostgreSQL数据库操作工具类
 """
 import asyncio
-from typing import Optional, List, Dict, Any
-from tortoise import Tortoise
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Sequence, Tuple
+from tortoise import Tortoise, connections
+from tortoise.expressions import Q
 from tortoise.transactions import in_transaction
+from tortoise.exceptions import IntegrityError
+from tortoise import timezone
+from tortoise.utils import generate_schema_for_client
 import logging
 
 from app.models.user import User, UserProfile, UserVip, UserIdentity
+from app import app_config  # app_config 在 app/__init__ 中先于数据库模块创建
+from app.utils.cache import LRUCache
+from app.utils.profile_cache import profile_cache
+from app.utils.user_statistics import UserStatisticsCounters
+from app.utils.metrics import CallbackMetric, db_query_duration_seconds, db_query_errors_total, instrument_class
+from app.utils.database_pool import pool_stats, validate_pool_options
+from app.utils.database_replica import read_router
 
 logger = logging.getLogger("app")
 
+# 用户的全部关联数据
+USER_RELATIONS = ("profile", "vip_info", "identities")
+# 可以通过 JOIN 加载的一对一关联
+ONE_TO_ONE_RELATIONS = ("profile", "vip_info")
+
+# 用户统计：一次扫描完成全部计数（user_vip 与 users 一对一，LEFT JOIN 不会放大行数）
+USER_STATISTICS_SQL = """
+SELECT COUNT(*) AS total_users,
+       COUNT(*) FILTER (WHERE u.is_active) AS active_users,
+       COUNT(*) FILTER (WHERE u.is_verified) AS verified_users,
+       COUNT(*) FILTER (WHERE v.vip_level > 0) AS vip_users
+FROM users u
+LEFT JOIN user_vip v ON v.user_id = u.user_id
+"""
+
+# 批量创建用户：手机号已存在的用户跳过，其他唯一键冲突（账户名、邀请码）照常报错
+BULK_CREATE_USERS_SQL = """
+INSERT INTO users (user_id, phone, account, username, password, points, invitation_code,
+                   is_active, is_verified, created_at, updated_at)
+SELECT t.user_id, t.phone, t.account, t.username, t.password, t.points, t.invitation_code,
+       TRUE, FALSE, $8, $8
+FROM unnest($1::uuid[], $2::varchar[], $3::varchar[], $4::varchar[], $5::varchar[], $6::int[], $7::varchar[])
+     AS t(user_id, phone, account, username, password, points, invitation_code)
+ON CONFLICT (phone) DO NOTHING
+RETURNING user_id, phone
+"""
+
+EXISTING_INVITATION_CODES_SQL = """
+SELECT invitation_code FROM users WHERE invitation_code = ANY($1::varchar[])
+"""
+
+# 批量创建时邀请码与并发写入的用户冲突后重新生成的次数
+INVITATION_CODE_RETRIES = 3
+
+# 积分增加：批量追加流水，不存在的用户跳过；只读取用户行，不加行锁。
+# 返回每个用户写入的流水条数与写入后的余额（本语句的快照看不到自己插入的流水，因此加上本次的积分变化）
+APPEND_POINTS_CREDITS_SQL = """
+WITH entries AS (
+    INSERT INTO points_ledger (user_id, delta, reason, folded, created_at)
+    SELECT u.user_id, t.delta, t.reason, FALSE, $4
+    FROM unnest($1::uuid[], $2::int[], $3::varchar[]) AS t(user_id, delta, reason)
+    JOIN users u ON u.user_id = t.user_id
+    RETURNING user_id, delta
+), added AS (
+    SELECT user_id, SUM(delta) AS delta, COUNT(*) AS entries FROM entries GROUP BY user_id
+)
+SELECT u.user_id, added.entries, GREATEST(u.points + COALESCE((
+    SELECT SUM(l.delta) FROM points_ledger l WHERE l.user_id = u.user_id AND NOT l.folded
+), 0) + added.delta, 0)::int AS points
+FROM added
+JOIN users u ON u.user_id = added.user_id
+"""
+
+# 积分扣减与汇总：按 user_id 顺序锁定本批用户行（扣减与汇总的加锁顺序一致，避免死锁；
+# FOR NO KEY UPDATE 不阻塞其他请求追加积分流水），串行化同一用户的扣减与汇总。
+# 加锁必须是单独的语句：扣减语句的快照在加锁之后获取，才能看到等锁期间其他事务提交的扣减与汇总
+LOCK_POINTS_SQL = """
+SELECT user_id FROM users WHERE user_id = ANY($1::uuid[]) ORDER BY user_id FOR NO KEY UPDATE
+"""
+
+# 积分扣减：在加锁后的新快照中计算每个用户的余额，按顺序逐条截断扣减额（余额不低于 0），
+# 第 i 条的扣减额为 max(余额 + 前 i 条之和, 0) - max(余额 + 前 i-1 条之和, 0)；
+# 返回每个用户写入的流水条数与扣减后的余额
+APPEND_POINTS_DEBITS_SQL = """
+WITH t AS (
+    SELECT * FROM unnest($1::uuid[], $2::int[], $3::varchar[]) WITH ORDINALITY AS t(user_id, delta, reason, ord)
+), balance AS (
+    SELECT u.user_id, GREATEST(u.points + COALESCE((
+        SELECT SUM(l.delta) FROM points_ledger l WHERE l.user_id = u.user_id AND NOT l.folded
+    ), 0), 0) AS points
+    FROM users u
+    WHERE u.user_id IN (SELECT user_id FROM t)
+), running AS (
+    SELECT t.user_id, t.reason, t.ord, t.delta,
+           b.points + SUM(t.delta) OVER w AS total
+    FROM t
+    JOIN balance b ON b.user_id = t.user_id
+    WINDOW w AS (PARTITION BY t.user_id ORDER BY t.ord)
+), entries AS (
+    INSERT INTO points_ledger (user_id, delta, reason, folded, created_at)
+    SELECT user_id, (GREATEST(total, 0) - GREATEST(total - delta, 0))::int, reason, FALSE, $4
+    FROM running
+    ORDER BY ord
+)
+SELECT user_id, COUNT(*) AS entries, GREATEST(MIN(total), 0)::int AS points FROM running GROUP BY user_id
+"""
+
+# 积分流水：未汇总的积分变化计入余额
+POINTS_BALANCE_SQL = """
+SELECT GREATEST(u.points + COALESCE((
+    SELECT SUM(l.delta) FROM points_ledger l WHERE l.user_id = u.user_id AND NOT l.folded
+), 0), 0) AS points
+FROM users u
+WHERE u.user_id = $1
+"""
+
+# 积分流水汇总（在一个事务中执行）：
+# 1. FOLD_POINTS_BATCH_SQL 锁定一批未汇总的流水（跳过其他 worker 已锁定的行），标记为已汇总并按用户合并
+# 2. LOCK_POINTS_SQL 按 user_id 顺序锁定这些用户，多个 worker 同时汇总、以及与积分扣减之间不会死锁；
+#    加锁与更新分成两条语句，更新语句的快照在加锁之后获取
+# 3. APPLY_POINTS_TOTALS_SQL 把合并后的积分变化写入 User.points
+# 汇总不截断为 0：扣减在写入时已按余额截断，全部流水之和不会为负，但单批流水之和可能为负（其余流水被其他 worker 锁定），
+# 只在读取余额时截断，汇总前后余额不变
+FOLD_POINTS_BATCH_SQL = """
+WITH batch AS (
+    SELECT id FROM points_ledger
+    WHERE NOT folded
+    ORDER BY id
+    LIMIT $1
+    FOR UPDATE SKIP LOCKED
+), folded AS (
+    UPDATE points_ledger AS l SET folded = TRUE
+    FROM batch
+    WHERE l.id = batch.id
+    RETURNING l.user_id, l.delta
+)
+SELECT user_id, SUM(delta)::int AS delta FROM folded GROUP BY user_id
+"""
+
+APPLY_POINTS_TOTALS_SQL = """
+UPDATE users AS u
+SET points = u.points + totals.delta
+FROM unnest($1::uuid[], $2::int[]) AS totals(user_id, delta)
+WHERE u.user_id = totals.user_id
+RETURNING u.user_id
+"""
+
+statistics_config = app_config["statistics"]
+statistics_cache = LRUCache(max_size=1)
+statistics_counters = UserStatisticsCounters(ttl=statistics_config["counter_ttl"])
+
+
+def _reload_statistics_config():
+    # cache_ttl 与 counter_mode 在使用时读取
+    statistics_counters.ttl = statistics_config["counter_ttl"]
+
+
+app_config.add_reload_listener(_reload_statistics_config)
+
 
 class DatabaseManager:
     """数据库管理器"""
     
     @staticmethod
-    async def init_db(config: dict):
-        """初始化数据库连接"""
+    async def init_db(config: dict, generate_schemas: bool = True):
+        """初始化数据库连接，generate_schemas 为 True 时同时创建缺失的表"""
         try:
+            for connection in config["connections"].values():
+                validate_pool_options(connection["credentials"])
             await Tortoise.init(config=config)
-            await Tortoise.generate_schemas()
+            if generate_schemas:
+                await DatabaseManager.generate_schemas()
             logger.info("数据库初始化成功")
         except Exception as e:
             logger.error(f"数据库初始化失败: {e}")
             raise
     
+    @staticmethod
+    async def generate_schemas():
+        """在主库创建缺失的表（Tortoise.generate_schemas 会对所有连接执行 DDL，只读副本上会失败）"""
+        await generate_schema_for_client(connections.get("default"), safe=True)
+    
     @staticmethod
     async def close_db():
         """关闭数据库连接"""
@@ -34,45 +196,137 @@ class DatabaseManager:
 
 
 class UserRepository:
-    """用户数据访问层"""
+    """用户数据访问层（每个公开方法的耗时与异常次数记录在 db_query_* 指标中）
+    
+    配置了只读副本时，按用户ID读取、用户列表与统计查询通过 read_router 发往副本，写操作后的短时间内该用户的读取使用主库；
+    按手机号/账户名查询用于登录与注册判重，始终读取主库。
+    写操作完成后调用 _after_write，先记录读己之写标记再使缓存失效，避免缓存被从副本读到的旧数据重新填充。
+    """
+    
+    @staticmethod
+    async def _after_write(user_ids: Sequence[str]):
+        """用户数据写入后：固定后续读取到主库，并使用户信息缓存失效"""
+        await read_router.mark_written(user_ids)
+        await profile_cache.invalidate_many(user_ids)
     
     @staticmethod
     async def create_user(user_data: dict) -> User:
-        """创建用户"""
-        async with in_transaction() as conn:
-            user = await User.create(**user_data, using_db=conn)
-            # 创建用户档案
-            await UserProfile.create(user=user, using_db=conn)
-            # 创建VIP信息
-            await UserVip.create(user=user, using_db=conn)
-            return user
+        """创建用户
+        
+        用户档案与VIP信息在首次写入时才创建（见 update_user_profile、update_user_vip），
+        读取时缺失的档案/VIP信息视为默认值。
+        """
+        user = await User.create(**user_data)
+        await read_router.mark_written([user.user_id])
+        if statistics_config["counter_mode"]:
+            await statistics_counters.increment(
+                total_users=1,
+                active_users=int(user.is_active),
+                verified_users=int(user.is_verified),
+            )
+        return user
     
     @staticmethod
-    async def get_user_by_id(user_id: str) -> Optional[User]:
-        """根据ID获取用户"""
-        return await User.get_or_none(user_id=user_id).prefetch_related(
-            "profile", "vip_info", "identities"
-        )
+    async def _new_invitation_codes(conn, count: int) -> List[str]:
+        """生成 count 个互不相同、且数据库中尚不存在的邀请码"""
+        codes: List[str] = []
+        while len(codes) < count:
+            candidates = list({uuid.uuid4().hex[:8] for _ in range(count - len(codes))} - set(codes))
+            rows = await conn.execute_query_dict(EXISTING_INVITATION_CODES_SQL, [candidates])
+            existing = {row["invitation_code"] for row in rows}
+            codes.extend(code for code in candidates if code not in existing)
+        return codes
     
     @staticmethod
-    async def get_user_by_account(account: str) -> Optional[User]:
-        """根据账户名获取用户"""
-        return await User.get_or_none(account=account).prefetch_related(
-            "profile", "vip_info", "identities"
-        )
+    async def bulk_create_users(users_data: Sequence[dict], chunk_size: int = 1000) -> Tuple[List[str], List[str]]:
+        """批量创建用户（用于合作方批量开户），返回 (实际创建的用户ID, 因手机号已存在而跳过的手机号)
+        
+        每批用户通过 unnest 在一条 INSERT 语句中写入，只有手机号冲突的用户会被跳过，
+        账户名等其他唯一键冲突抛出 IntegrityError。邀请码由本方法生成，与并发创建的用户冲突时重新生成后重试。
+        users_data 中的 password 必须是已经哈希过的值；档案与VIP信息同样延迟创建。
+        """
+        conn = connections.get("default")
+        created_ids = []
+        skipped_phones = []
+        for start in range(0, len(users_data), chunk_size):
+            chunk = users_data[start:start + chunk_size]
+            for attempt in range(INVITATION_CODE_RETRIES):
+                codes = await UserRepository._new_invitation_codes(conn, len(chunk))
+                try:
+                    rows = await conn.execute_query_dict(BULK_CREATE_USERS_SQL, [
+                        [uuid.uuid4() for _ in chunk],
+                        [data.get("phone") for data in chunk],
+                        [data["account"] for data in chunk],
+                        [data["username"] for data in chunk],
+                        [data["password"] for data in chunk],
+                        [int(data.get("points", 0)) for data in chunk],
+                        codes,
+                        timezone.now(),
+                    ])
+                    break
+                except IntegrityError as e:
+                    if "invitation_code" not in str(e) or attempt == INVITATION_CODE_RETRIES - 1:
+                        raise
+                    logger.warning("批量创建用户时邀请码与新创建的用户冲突，重新生成后重试")
+            created_ids.extend(str(row["user_id"]) for row in rows)
+            # 同一批中重复的手机号只有第一个会被创建
+            inserted = {row["phone"] for row in rows}
+            for data in chunk:
+                if data.get("phone") in inserted:
+                    inserted.discard(data["phone"])
+                else:
+                    skipped_phones.append(data.get("phone"))
+        await read_router.mark_written(created_ids)
+        if created_ids and statistics_config["counter_mode"]:
+            await statistics_counters.increment(total_users=len(created_ids), active_users=len(created_ids))
+        return created_ids, skipped_phones
     
     @staticmethod
-    async def get_user_by_phone(phone: str) -> Optional[User]:
-        """根据手机号获取用户"""
-        return await User.get_or_none(phone=phone).prefetch_related(
-            "profile", "vip_info", "identities"
-        )
+    def _apply_projection(query, fields: Optional[Sequence[str]], relations: Sequence[str]):
+        """为单用户查询应用字段投影与关联加载
+        
+        - 一对一关联（profile、vip_info）通过 LEFT JOIN 与用户在同一条查询中加载，identities 单独预加载
+        - 指定 fields 时只查询这些列（总会包含 user_id），得到的对象只能读取这些字段；
+          only 与 select_related 同时使用时关联对象不会被填充，因此改为预加载
+        """
+        if fields:
+            query = query.only(*dict.fromkeys(("user_id", *fields)))
+            return query.prefetch_related(*relations) if relations else query
+        joined = [relation for relation in relations if relation in ONE_TO_ONE_RELATIONS]
+        prefetched = [relation for relation in relations if relation not in ONE_TO_ONE_RELATIONS]
+        if joined:
+            query = query.select_related(*joined)
+        if prefetched:
+            query = query.prefetch_related(*prefetched)
+        return query
+    
+    @staticmethod
+    async def get_user_by_id(user_id: str, fields: Optional[Sequence[str]] = None,
+                             relations: Sequence[str] = USER_RELATIONS) -> Optional[User]:
+        """根据ID获取用户，fields 为要查询的列（默认全部），relations 为要加载的关联"""
+        query = User.filter(user_id=user_id).using_db(await read_router.read_connection(user_id))
+        return await UserRepository._apply_projection(query, fields, relations).first()
+    
+    @staticmethod
+    async def get_user_by_account(account: str, fields: Optional[Sequence[str]] = None,
+                                  relations: Sequence[str] = USER_RELATIONS) -> Optional[User]:
+        """根据账户名获取用户，fields 为要查询的列（默认全部），relations 为要加载的关联"""
+        query = User.filter(account=account)
+        return await UserRepository._apply_projection(query, fields, relations).first()
+    
+    @staticmethod
+    async def get_user_by_phone(phone: str, fields: Optional[Sequence[str]] = None,
+                                relations: Sequence[str] = USER_RELATIONS) -> Optional[User]:
+        """根据手机号获取用户，fields 为要查询的列（默认全部），relations 为要加载的关联"""
+        query = User.filter(phone=phone)
+        return await UserRepository._apply_projection(query, fields, relations).first()
     
     @staticmethod
     async def update_user(user_id: str, update_data: dict) -> bool:
         """更新用户信息"""
         try:
             await User.filter(user_id=user_id).update(**update_data)
+            await UserRepository._after_write([user_id])
             return True
         except Exception as e:
             logger.error(f"更新用户失败: {e}")
@@ -91,6 +345,7 @@ class UserRepository:
                 await UserProfile.filter(user=user).update(**profile_data)
             else:
                 await UserProfile.create(user=user, **profile_data)
+            await UserRepository._after_write([user_id])
             return True
         except Exception as e:
             logger.error(f"更新用户档案失败: {e}")
@@ -98,13 +353,27 @@ class UserRepository:
     
     @staticmethod
     async def update_user_vip(user_id: str, vip_data: dict) -> bool:
-        """更新用户VIP信息"""
+        """更新用户VIP信息
+        
+        在事务中锁定用户行（FOR NO KEY UPDATE，不阻塞其他表引用该用户），同一用户的VIP修改串行执行，
+        读取到的旧等级与写入的新等级对应同一次修改，统计计数器中的VIP用户数不会因并发修改而偏移。
+        """
         try:
-            user = await User.get_or_none(user_id=user_id)
-            if not user:
-                return False
-            
-            await UserVip.filter(user=user).update(**vip_data)
+            track_vip = statistics_config["counter_mode"] and "vip_level" in vip_data
+            async with in_transaction("default") as conn:
+                user = await User.filter(user_id=user_id).using_db(conn).select_for_update(no_key=True).first()
+                if not user:
+                    return False
+                old_level = await UserVip.filter(user=user).using_db(conn).first().values_list("vip_level", flat=True)
+                # VIP信息延迟创建：不存在时在首次写入时创建（用户行已锁定，不会有并发创建）
+                updated = await UserVip.filter(user=user).using_db(conn).update(**vip_data)
+                if not updated:
+                    await UserVip.create(user=user, using_db=conn, **vip_data)
+            if track_vip:
+                was_vip = bool(old_level and old_level > 0)
+                is_vip = bool(vip_data["vip_level"] and vip_data["vip_level"] > 0)
+                await statistics_counters.increment(vip_users=int(is_vip) - int(was_vip))
+            await UserRepository._after_write([user_id])
             return True
         except Exception as e:
             logger.error(f"更新用户VIP信息失败: {e}")
@@ -123,6 +392,7 @@ class UserRepository:
                 identity_type=identity_type,
                 identity_value=identity_value
             )
+            await read_router.mark_written([user_id])
             return True
         except Exception as e:
             logger.error(f"添加用户身份信息失败: {e}")
@@ -140,6 +410,7 @@ class UserRepository:
                 user=user, 
                 identity_type=identity_type
             ).update(is_verified=True)
+            await read_router.mark_written([user_id])
             return True
         except Exception as e:
             logger.error(f"验证用户身份失败: {e}")
@@ -149,75 +420,269 @@ class UserRepository:
     async def delete_user(user_id: str) -> bool:
         """删除用户（软删除）"""
         try:
-            await User.filter(user_id=user_id).update(is_active=False)
+            deactivated = await User.filter(user_id=user_id, is_active=True).update(is_active=False)
+            if deactivated and statistics_config["counter_mode"]:
+                await statistics_counters.increment(active_users=-deactivated)
+            await UserRepository._after_write([user_id])
             return True
         except Exception as e:
             logger.error(f"删除用户失败: {e}")
             return False
     
+    @staticmethod
+    def encode_cursor(user: User) -> str:
+        """将用户的 (created_at, user_id) 编码为分页游标"""
+        raw = f"{user.created_at.isoformat()}|{user.user_id}"
+        return base64.urlsafe_b64encode(raw.encode("utf8")).decode("ascii")
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+        """解析分页游标，格式错误时抛出 ValueError"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf8")
+            created_at, user_id = raw.split("|", 1)
+            return datetime.fromisoformat(created_at), uuid.UUID(user_id)
+        except Exception as e:
+            raise ValueError(f"无效的分页游标: {cursor}") from e
+    
+    @staticmethod
+    async def _estimate_count(query, filtered: bool) -> Optional[int]:
+        """根据规划器统计信息估算行数，无法估算时返回 None"""
+        conn = await read_router.read_connection()
+        if not filtered:
+            rows = await conn.execute_query_dict(
+                "SELECT reltuples::bigint AS estimate FROM pg_class WHERE relname = 'users'"
+            )
+            estimate = rows[0]["estimate"] if rows else -1
+        else:
+            rows = await conn.execute_query_dict("EXPLAIN (FORMAT JSON) " + query.sql(params_inline=True))
+            plan = rows[0]["QUERY PLAN"] if rows else None
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = plan[0]["Plan"]["Plan Rows"] if plan else -1
+        # 从未 ANALYZE 过的表 reltuples 为 -1
+        return int(estimate) if estimate is not None and estimate >= 0 else None
+    
     @staticmethod
     async def get_users_by_filters(
         page: int = 1,
         page_size: int = 20,
         is_active: Optional[bool] = None,
         is_verified: Optional[bool] = None,
-        vip_level: Optional[int] = None
+        vip_level: Optional[int] = None,
+        pagination: str = "offset",
+        cursor: Optional[str] = None,
+        count: str = "exact",
+        relations: Sequence[str] = USER_RELATIONS
     ) -> Dict[str, Any]:
-        """根据条件查询用户列表"""
+        """根据条件查询用户列表
+        
+        - pagination: "offset" 按 page/page_size 分页（适合小结果集）；
+          "cursor" 按 (created_at, user_id) 倒序的游标分页，翻页代价与页码无关，下一页传入返回的 next_cursor
+        - count: "exact" 精确 COUNT(*)；"approximate" 使用规划器统计信息估算；"none" 不计算总数
+        - relations: 需要加载的关联（profile、vip_info 通过 JOIN 加载，identities 预加载），传空序列则不加载
+        
+        cursor 格式错误时抛出 ValueError（调用方应返回 400），不会当作没有更多数据返回空页。
+        """
+        # 在捕获数据库错误之前解析游标，无效游标不能与“已到末尾”混淆
+        cursor_position = UserRepository.decode_cursor(cursor) if pagination == "cursor" and cursor else None
         try:
-            query = User.all()
+            query = User.all().using_db(await read_router.read_connection())
             
             if is_active is not None:
                 query = query.filter(is_active=is_active)
             if is_verified is not None:
                 query = query.filter(is_verified=is_verified)
-            if vip_level is not None:
+            if vip_level == 0:
+                # 没有VIP信息的用户视为 0 级
+                query = query.filter(Q(vip_info__vip_level=0) | Q(vip_info__id__isnull=True))
+            elif vip_level is not None:
                 query = query.filter(vip_info__vip_level=vip_level)
+            filtered = any(value is not None for value in (is_active, is_verified, vip_level))
             
             # 计算总数
-            total = await query.count()
+            total = None
+            if count == "approximate":
+                try:
+                    total = await UserRepository._estimate_count(query, filtered)
+                except Exception as e:
+                    logger.warning(f"估算用户数量失败，改为精确计数: {e}")
+            if count == "exact" or (count == "approximate" and total is None):
+                total = await query.count()
+            
+            if pagination == "cursor":
+                if cursor_position:
+                    created_at, user_id = cursor_position
+                    query = query.filter(
+                        Q(created_at__lt=created_at) | Q(created_at=created_at, user_id__lt=user_id)
+                    )
+                query = query.order_by("-created_at", "-user_id").limit(page_size + 1)
+                query = UserRepository._apply_projection(query, None, relations)
+                users = list(await query)
+                has_more = len(users) > page_size
+                users = users[:page_size]
+                return {
+                    "users": users,
+                    "total": total,
+                    "page_size": page_size,
+                    "next_cursor": UserRepository.encode_cursor(users[-1]) if has_more else None,
+                }
             
             # 分页查询
             offset = (page - 1) * page_size
-            users = await query.offset(offset).limit(page_size).prefetch_related(
-                "profile", "vip_info", "identities"
-            )
+            query = query.offset(offset).limit(page_size)
+            query = UserRepository._apply_projection(query, None, relations)
+            users = await query
             
             return {
                 "users": users,
                 "total": total,
                 "page": page,
                 "page_size": page_size,
-                "total_pages": (total + page_size - 1) // page_size
+                "total_pages": (total + page_size - 1) // page_size if total is not None else None
             }
         except Exception as e:
             logger.error(f"查询用户列表失败: {e}")
+            if pagination == "cursor":
+                return {"users": [], "total": 0, "page_size": page_size, "next_cursor": None}
             return {"users": [], "total": 0, "page": page, "page_size": page_size, "total_pages": 0}
     
+    @staticmethod
+    async def _append_points(entries: Sequence[Tuple[str, int, str]]) -> Tuple[int, Dict[str, int]]:
+        """追加积分流水 (user_id, delta, reason)，返回 (写入的流水条数, {user_id: 写入后的余额})
+
+        积分增加与扣减各用一条 unnest 语句批量写入；扣减在同一个事务中先按 user_id 顺序锁定用户行
+        """
+        entries = [(str(uuid.UUID(str(user_id))), int(delta), reason) for user_id, delta, reason in entries]
+        credits = [entry for entry in entries if entry[1] >= 0]
+        debits = [entry for entry in entries if entry[1] < 0]
+        written = 0
+        balances: Dict[str, int] = {}
+        if credits:
+            rows = await connections.get("default").execute_query_dict(
+                APPEND_POINTS_CREDITS_SQL, UserRepository._points_entry_args(credits))
+            for row in rows:
+                written += row["entries"]
+                balances[str(row["user_id"])] = row["points"]
+        if debits:
+            async with in_transaction("default") as conn:
+                await conn.execute_query_dict(LOCK_POINTS_SQL, [list({uuid.UUID(user_id) for user_id, _, _ in debits})])
+                rows = await conn.execute_query_dict(APPEND_POINTS_DEBITS_SQL, UserRepository._points_entry_args(debits))
+            # 扣减在积分增加之后写入，其余额已包含本次的积分增加
+            for row in rows:
+                written += row["entries"]
+                balances[str(row["user_id"])] = row["points"]
+        await UserRepository._after_write(list(balances))
+        return written, balances
+    
+    @staticmethod
+    def _points_entry_args(entries: Sequence[Tuple[str, int, str]]) -> list:
+        return [
+            [uuid.UUID(user_id) for user_id, _, _ in entries],
+            [delta for _, delta, _ in entries],
+            [reason for _, _, reason in entries],
+            timezone.now(),
+        ]
+    
+    @staticmethod
+    async def adjust_user_points(user_id: str, points_change: int, reason: str = "adjust") -> Optional[int]:
+        """调整用户积分（写入积分流水，余额不低于0），返回调整后的余额，用户不存在时返回 None"""
+        _, balances = await UserRepository._append_points([(user_id, points_change, reason)])
+        return balances.get(str(uuid.UUID(str(user_id))))
+    
     @staticmethod
     async def update_user_points(user_id: str, points_change: int) -> bool:
         """更新用户积分"""
         try:
-            async with in_transaction() as conn:
-                user = await User.get_or_none(user_id=user_id, using_db=conn)
-                if not user:
-                    return False
-                
-                new_points = max(0, user.points + points_change)  # 确保积分不为负
-                await User.filter(user_id=user_id).using_db(conn).update(points=new_points)
-                return True
+            return await UserRepository.adjust_user_points(user_id, points_change) is not None
         except Exception as e:
             logger.error(f"更新用户积分失败: {e}")
             return False
     
+    @staticmethod
+    async def bulk_update_points(adjustments: Sequence[Tuple[str, int]], chunk_size: int = 5000) -> int:
+        """批量调整用户积分
+        
+        同一用户的多条调整先合并，再通过 append_points_entries 写入积分流水（余额不低于0），
+        每个分块的积分增加与扣减各用一条语句写入。
+        返回实际更新的用户数（不存在的用户不计入）。
+        """
+        totals: Dict[str, int] = {}
+        for user_id, delta in adjustments:
+            totals[str(user_id)] = totals.get(str(user_id), 0) + int(delta)
+        entries = [(user_id, delta, "bulk_adjust") for user_id, delta in totals.items() if delta]
+        updated = 0
+        for start in range(0, len(entries), chunk_size):
+            updated += await UserRepository.append_points_entries(entries[start:start + chunk_size])
+        return updated
+    
+    @staticmethod
+    async def append_points_entries(entries: Sequence[Tuple[str, int, str]]) -> int:
+        """追加积分流水 (user_id, delta, reason)，返回实际写入的流水条数（不存在的用户跳过）
+        
+        - 积分增加通过 unnest 在一条 INSERT 语句中批量写入，不锁用户行
+        - 积分扣减在一个事务中按 user_id 顺序锁定本批用户行，再用一条语句批量写入，
+          扣减额不超过当前余额，因此全部流水之和不会为负
+        流水由后台任务定期汇总到 User.points，读取余额请使用 get_user_points_balance。
+        """
+        written, _ = await UserRepository._append_points(entries)
+        return written
+    
+    @staticmethod
+    async def get_user_points_balance(user_id: str) -> Optional[int]:
+        """获取用户积分余额（User.points 加上尚未汇总的流水），用户不存在时返回 None"""
+        conn = await read_router.read_connection(user_id)
+        rows = await conn.execute_query_dict(POINTS_BALANCE_SQL, [uuid.UUID(str(user_id))])
+        return rows[0]["points"] if rows else None
+    
+    @staticmethod
+    async def fold_points_ledger(batch_size: int = 5000) -> int:
+        """将一批未汇总的积分流水合并写入 User.points，返回本批更新的用户数
+        
+        每个用户每批只更新一次，热门邀请者的大量流水只产生一次行锁。
+        汇总前后余额不变，因此不需要使用户信息缓存失效。
+        """
+        async with in_transaction("default") as conn:
+            totals = await conn.execute_query_dict(FOLD_POINTS_BATCH_SQL, [batch_size])
+            if not totals:
+                return 0
+            user_ids = [row["user_id"] for row in totals]
+            await conn.execute_query_dict(LOCK_POINTS_SQL, [user_ids])
+            rows = await conn.execute_query_dict(APPLY_POINTS_TOTALS_SQL, [user_ids, [row["delta"] for row in totals]])
+        return len(rows)
+    
+    @staticmethod
+    async def _aggregate_user_statistics(primary: bool = False) -> Dict[str, int]:
+        """一次扫描计算全部统计数据，primary 为 True 时读取主库"""
+        conn = connections.get("default") if primary else await read_router.read_connection()
+        rows = await conn.execute_query_dict(USER_STATISTICS_SQL)
+        return {key: int(value or 0) for key, value in rows[0].items()}
+    
     @staticmethod
     async def get_user_statistics() -> Dict[str, Any]:
-        """获取用户统计信息"""
+        """获取用户统计信息
+        
+        - 默认使用一次 COUNT(*) FILTER 聚合查询，结果在进程内缓存 statistics.cache_ttl 秒
+        - statistics.counter_mode 开启时读取由写操作增量维护的 Redis 计数器，计数器不存在时用聚合查询重建
+        """
         try:
-            total_users = await User.all().count()
-            active_users = await User.filter(is_active=True).count()
-            verified_users = await User.filter(is_verified=True).count()
-            vip_users = await User.filter(vip_info__vip_level__gt=0).count()
+            statistics = None
+            if statistics_config["counter_mode"]:
+                statistics = await statistics_counters.get()
+                if statistics is None:
+                    # 计数器之后由写操作增量维护，必须从主库重建，副本的延迟会一直留在计数器中
+                    statistics = await UserRepository._aggregate_user_statistics(primary=True)
+                    await statistics_counters.seed(statistics)
+            else:
+                statistics = statistics_cache.get("statistics")
+                if statistics is None:
+                    statistics = await UserRepository._aggregate_user_statistics()
+                    statistics_cache.set("statistics", statistics, ttl=statistics_config["cache_ttl"])
+            
+            total_users = statistics["total_users"]
+            active_users = statistics["active_users"]
+            verified_users = statistics["verified_users"]
+            vip_users = statistics["vip_users"]
             
             return {
                 "total_users": total_users,
@@ -239,7 +704,6 @@ class DatabaseUtils:
     async def execute_raw_sql(sql: str, params: Optional[List] = None) -> List[Dict]:
         """执行原生SQL查询"""
         try:
-            from tortoise import connections
             conn = connections.get("default")
             result = await conn.execute_query_dict(sql, params or [])
             return result
@@ -262,6 +726,15 @@ class DatabaseUtils:
             logger.error(f"备份表 {table_name} 失败: {e}")
             return False
     
+    @staticmethod
+    def pool_stats() -> Optional[Dict[str, Any]]:
+        """连接池使用情况（使用中、空闲、等待获取连接的协程数、获取连接的平均耗时等），连接池尚未创建时返回 None"""
+        try:
+            pool = getattr(connections.get("default"), "_pool", None)
+        except Exception:
+            return None
+        return pool_stats(pool, "default")
+
     @staticmethod
     async def check_connection() -> bool:
         """检查数据库连接状态"""
@@ -271,3 +744,15 @@ class DatabaseUtils:
         except Exception as e:
             logger.error(f"数据库连接检查失败: {e}")
             return False
+
+
+instrument_class(UserRepository, db_query_duration_seconds, db_query_errors_total)
+
+
+def _db_pool_samples():
+    stats = DatabaseUtils.pool_stats()
+    return [((state,), stats[state]) for state in ("in_use", "idle", "max", "waiters")] if stats else []
+
+
+CallbackMetric("db_pool_connections", "PostgreSQL 连接池连接数（in_use / idle / max）与等待获取连接的协程数（waiters）",
+               _db_pool_samples, ("state",))
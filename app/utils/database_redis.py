@@ -0,0 +1,99 @@
+"""
+Redis数据库操作工具类
+使用 redis.asyncio 连接池，避免同步调用阻塞事件循环
+"""
+from typing import Optional
+import logging
+
+from redis.asyncio import Redis, BlockingConnectionPool
+
+from app.utils.metrics import CallbackMetric, instrument_redis
+
+logger = logging.getLogger("app")
+
+
+def create_redis_client() -> Redis:
+    """根据配置创建带连接池的异步Redis客户端"""
+    from app import app_config  # 延迟引入，避免循环引用
+    redis_config = app_config.redis_config
+    pool = BlockingConnectionPool(
+        host=redis_config["host"],
+        port=redis_config["port"],
+        db=redis_config["db"],
+        password=redis_config["password"],
+        decode_responses=True,
+        max_connections=redis_config["max_connections"],
+        timeout=redis_config["pool_timeout"],
+        socket_timeout=redis_config["socket_timeout"],
+        socket_connect_timeout=redis_config["socket_connect_timeout"],
+        health_check_interval=redis_config["health_check_interval"],
+    )
+    return Redis(connection_pool=pool)
+
+
+class RedisManager:
+    """Redis连接管理器
+
+    - 应用启动时（lifespan）调用 init_redis 创建连接池，关闭时调用 close_redis 释放连接。
+    - init_redis 可以传入现成的客户端（例如 fakeredis.aioredis.FakeRedis），便于在进程内测试。
+    - 在未初始化时访问客户端会按配置自动创建，方便脚本等非 web 场景使用。
+    """
+
+    _client: Optional[Redis] = None
+
+    @classmethod
+    async def init_redis(cls, client: Optional[Redis] = None):
+        """初始化Redis客户端"""
+        if cls._client is not None:
+            await cls.close_redis()
+        cls._client = instrument_redis(client if client is not None else create_redis_client())
+        logger.info("Redis连接池初始化成功")
+
+    @classmethod
+    async def close_redis(cls):
+        """关闭Redis客户端并释放连接池"""
+        client, cls._client = cls._client, None
+        if client is not None:
+            await client.aclose()
+            logger.info("Redis连接已关闭")
+
+    @classmethod
+    def pool_stats(cls) -> Optional[dict]:
+        """连接池使用情况（in_use / idle / max），客户端未初始化时返回 None"""
+        pool = getattr(cls._client, "connection_pool", None)
+        if pool is None or not hasattr(pool, "_in_use_connections"):
+            return None
+        return {
+            "in_use": len(pool._in_use_connections),
+            "idle": len(pool._available_connections),
+            "max": pool.max_connections,
+        }
+
+    @classmethod
+    def get_client(cls) -> Redis:
+        """获取当前的Redis客户端"""
+        if cls._client is None:
+            cls._client = instrument_redis(create_redis_client())
+        return cls._client
+
+
+class RedisClientProxy:
+    """Redis客户端代理
+
+    模块级别导入的 redis_client 始终指向 RedisManager 当前持有的客户端，
+    因此客户端可以在 lifespan 中创建或替换，而调用方无需重新导入。
+    """
+
+    def __getattr__(self, item):
+        return getattr(RedisManager.get_client(), item)
+
+
+redis_client = RedisClientProxy()
+
+
+def _redis_pool_samples():
+    stats = RedisManager.pool_stats()
+    return [((state,), stats[state]) for state in ("in_use", "idle", "max")] if stats else []
+
+
+CallbackMetric("redis_pool_connections", "Redis 连接池连接数（in_use / idle / max）", _redis_pool_samples, ("state",))
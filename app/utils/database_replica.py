@@ -0,0 +1,226 @@
+"""
+PostgreSQL 读写分离
+- 配置了只读副本（连接名 replica，见 POSTGRES_REPLICA_HOST）时，UserRepository 的只读查询发往副本，写操作始终使用主库
+- 写操作后的 read_your_writes_window 秒内，该用户的读取固定在主库（读己之写）；
+  标记保存在 Redis 中（所有 worker 共享），本 worker 同时记录在进程内 LRU 中，读取时先查进程内记录
+- 后台任务每 lag_check_interval 秒查询副本的复制延迟，延迟超过 max_lag、WAL 接收进程不在复制、查询失败或超时时
+  所有读取回退到主库，恢复后自动切回
+- 读取 Redis 标记失败时按已标记处理（读主库），宁可多读主库也不返回旧数据
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from tortoise import connections
+
+from app import app_config
+from app.config.constant import REDIS_REPLICA_PIN
+from app.utils.cache import LRUCache
+from app.utils.database_pool import pool_stats
+from app.utils.database_redis import redis_client
+from app.utils.metrics import CallbackMetric
+
+logger = logging.getLogger("app")
+
+PRIMARY_CONNECTION = "default"
+REPLICA_CONNECTION = "replica"
+
+# 副本的复制状态：WAL 接收进程状态、已接收的 WAL 是否全部回放、最后回放的事务距今的秒数
+# 接收进程断开后已接收的 LSN 不再前进，回放很快追上，因此“已回放到最新”只有在接收进程处于 streaming 时才说明没有延迟
+REPLICA_LAG_SQL = """
+SELECT pg_is_in_recovery() AS in_recovery,
+       (SELECT status FROM pg_stat_wal_receiver LIMIT 1) AS receiver_status,
+       pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() AS caught_up,
+       EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) AS replay_age
+"""
+
+
+def replica_lag(row: Dict[str, Any]) -> float:
+    """根据 REPLICA_LAG_SQL 的结果计算复制延迟（秒），副本与主库断开或状态未知时抛出 RuntimeError"""
+    if not row["in_recovery"]:
+        return 0.0  # 连接的是主库（例如故障切换后副本被提升）
+    if row["receiver_status"] != "streaming":
+        raise RuntimeError(f"WAL 接收进程未在复制（状态 {row['receiver_status'] or '不存在'}）")
+    if row["caught_up"] is None:
+        raise RuntimeError("无法读取副本已接收/已回放的 WAL 位置")
+    if row["caught_up"]:
+        # 没有新写入时 pg_last_xact_replay_timestamp 不会前进，已回放到最新即没有延迟
+        return 0.0
+    if row["replay_age"] is None:
+        raise RuntimeError("副本尚未回放任何事务")
+    return float(row["replay_age"])
+
+
+class ReadReplicaRouter:
+    """只读查询路由，配置来自配置文件中的 read_replica"""
+
+    def __init__(self, window: float = 5, max_lag: float = 2, check_interval: float = 1,
+                 local_pin_max_size: int = 100000):
+        self.window = window
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._pinned = LRUCache(max_size=local_pin_max_size)
+        self._task: Optional[asyncio.Task] = None
+        # 启动时根据数据库配置决定，运行期间修改 POSTGRES_REPLICA_HOST 需要重启（副本连接由 Tortoise 在启动时创建）
+        self.enabled = False
+        self.healthy = False  # 第一次检查通过前不使用副本
+        self.lag: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.pinned_reads = 0
+        self.pin_errors = 0
+
+    async def start(self):
+        if self._task is not None or REPLICA_CONNECTION not in app_config.postgres_config["connections"]:
+            return
+        self.enabled = True
+        await self.check_lag()
+        self._task = asyncio.create_task(self._monitor())
+        logger.info("只读副本已启用" if self.healthy else "只读副本已启用，但当前不可用，读取回退到主库")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.enabled = False
+        self.healthy = False
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check_lag()
+
+    async def check_lag(self) -> bool:
+        """查询副本的复制延迟并更新可用状态"""
+        try:
+            rows = await asyncio.wait_for(
+                connections.get(REPLICA_CONNECTION).execute_query_dict(REPLICA_LAG_SQL),
+                timeout=max(self.check_interval, 1),
+            )
+            self.lag = replica_lag(rows[0])
+            self.last_error = None
+            healthy = self.lag <= self.max_lag
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.lag = None
+            self.last_error = str(e) or type(e).__name__
+            healthy = False
+        if healthy != self.healthy:
+            if healthy:
+                logger.info(f"只读副本恢复可用（复制延迟 {self.lag}s）")
+            else:
+                logger.warning(f"只读副本不可用，读取回退到主库: {self.unhealthy_reason()}")
+        self.healthy = healthy
+        return healthy
+
+    def unhealthy_reason(self) -> str:
+        if self.lag is None:
+            return self.last_error or "尚未检查复制延迟"
+        return f"复制延迟 {self.lag}s 超过 {self.max_lag}s"
+
+    @staticmethod
+    def _pin_key(user_id: str) -> str:
+        return REDIS_REPLICA_PIN + str(user_id)
+
+    async def mark_written(self, user_ids: Iterable[Any]):
+        """记录用户刚发生写操作，window 秒内该用户的读取使用主库"""
+        user_ids = [str(user_id) for user_id in user_ids]
+        if not self.enabled or not user_ids:
+            return
+        for user_id in user_ids:
+            self._pinned.set(user_id, True, ttl=self.window)
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.set(self._pin_key(user_id), 1, px=int(self.window * 1000))
+                await pipe.execute()
+        except Exception as e:
+            self.pin_errors += 1
+            logger.warning(f"记录读己之写标记失败，其他 worker 可能从副本读到旧数据: {e}")
+
+    async def is_pinned(self, user_id: Any) -> bool:
+        """用户是否在写操作后的读己之写窗口内"""
+        user_id = str(user_id)
+        if self._pinned.get(user_id):
+            return True
+        try:
+            return bool(await redis_client.exists(self._pin_key(user_id)))
+        except Exception as e:
+            self.pin_errors += 1
+            logger.warning(f"读取读己之写标记失败，改为读取主库: {e}")
+            return True
+
+    async def read_connection(self, user_id: Optional[Any] = None):
+        """只读查询使用的连接：副本可用且 user_id 不在读己之写窗口内时返回副本，否则返回主库"""
+        if not self.enabled or not self.healthy:
+            self.primary_reads += 1
+            return connections.get(PRIMARY_CONNECTION)
+        if user_id is not None and await self.is_pinned(user_id):
+            self.pinned_reads += 1
+            return connections.get(PRIMARY_CONNECTION)
+        self.replica_reads += 1
+        return connections.get(REPLICA_CONNECTION)
+
+    def pool_stats(self) -> Optional[Dict[str, Any]]:
+        """副本连接池使用情况，未配置副本或连接池尚未创建时返回 None"""
+        if not self.enabled:
+            return None
+        try:
+            pool = getattr(connections.get(REPLICA_CONNECTION), "_pool", None)
+        except Exception:
+            return None
+        return pool_stats(pool, REPLICA_CONNECTION)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "healthy": self.healthy,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+            "last_error": self.last_error,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "pinned_reads": self.pinned_reads,
+            "pin_errors": self.pin_errors,
+            "local_pin_size": len(self._pinned),
+            "pool": self.pool_stats(),
+        }
+
+
+_read_replica_config = app_config["read_replica"]
+read_router = ReadReplicaRouter(
+    window=_read_replica_config["read_your_writes_window"],
+    max_lag=_read_replica_config["max_lag"],
+    check_interval=_read_replica_config["lag_check_interval"],
+    local_pin_max_size=_read_replica_config["local_pin_max_size"],
+)
+
+
+def _reload_read_replica_config():
+    # local_pin_max_size 需要重启生效
+    read_router.window = _read_replica_config["read_your_writes_window"]
+    read_router.max_lag = _read_replica_config["max_lag"]
+    read_router.check_interval = _read_replica_config["lag_check_interval"]
+
+
+app_config.add_reload_listener(_reload_read_replica_config)
+
+
+def _replica_samples():
+    if not read_router.enabled:
+        return []
+    samples = [(("healthy",), int(read_router.healthy))]
+    if read_router.lag is not None:
+        samples.append((("lag_seconds",), read_router.lag))
+    return samples
+
+
+CallbackMetric("db_replica_status", "PostgreSQL 只读副本状态（healthy 为 1 时读取使用副本）与复制延迟（lag_seconds）",
+               _replica_samples, ("state",))
@@ -0,0 +1,177 @@
+"""
+健康检查
+- 存活检查（live）只说明进程与事件循环在响应，不访问任何依赖
+- 就绪检查（ready）并发检查 PostgreSQL、Redis 与短信服务，每项检查单独超时；
+  结果缓存 cache_ttl 秒，缓存过期时并发到达的探测共用同一次检查，频繁探测不会放大到数据库
+- 应用启动完成前与开始关闭后就绪检查直接失败，负载均衡器据此摘除实例
+- 短信服务不可用只标记为 degraded，不影响就绪（验证码会在队列中重试）；
+  只读副本不可用时读取已回退到主库，同样只标记为 degraded
+- 检查可以返回 status=degraded 表示依赖可用但状态不佳，不影响就绪：PostgreSQL 连接池已满（连接数达到上限、
+  没有空闲连接且有其他请求在等待）时取不到连接只标记为 degraded，避免高峰期实例被摘除；
+  连接池有空位却取不到连接（新建连接卡住，数据库不可达）仍为 error
+"""
+import asyncio
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from tortoise import connections
+
+from app import app_config
+from app.utils.database_postgres import DatabaseUtils
+from app.utils.database_redis import RedisManager, redis_client
+from app.utils.database_replica import read_router
+from app.utils.verification_code_platform import sms_dispatcher
+
+logger = logging.getLogger("app")
+
+APP_STARTING = "starting"
+APP_READY = "ready"
+APP_STOPPING = "stopping"
+
+
+def pool_saturated(stats: Optional[Dict[str, Any]]) -> bool:
+    """连接池是否已满：连接数达到上限、没有空闲连接，且有其他协程在等待获取连接"""
+    return bool(stats) and stats["size"] >= stats["max"] and stats["idle"] == 0 and stats["waiters"] > 0
+
+
+async def check_postgres() -> Dict[str, Any]:
+    client = connections.get("default")
+    pool = getattr(client, "_pool", None)
+    if pool is None:
+        await client.execute_query("SELECT 1")
+        return {"pool": DatabaseUtils.pool_stats()}
+    # 获取连接最多使用检查超时的一半，留出执行查询的时间
+    try:
+        conn = await pool.acquire(timeout=health_checker.timeout / 2)
+    except asyncio.TimeoutError:
+        stats = DatabaseUtils.pool_stats()
+        if pool_saturated(stats):
+            return {"status": "degraded", "error": "连接池已满，未能在限定时间内获取连接", "pool": stats}
+        # 连接池有空位时 acquire 会新建连接，超时说明数据库不可达或没有响应
+        raise RuntimeError("未能在限定时间内获取连接（连接池未满，新建连接超时）")
+    try:
+        await conn.fetchval("SELECT 1")
+    finally:
+        await pool.release(conn)
+    return {"pool": DatabaseUtils.pool_stats()}
+
+
+async def check_redis() -> Dict[str, Any]:
+    await redis_client.ping()
+    return {"pool": RedisManager.pool_stats()}
+
+
+async def check_replica() -> Dict[str, Any]:
+    # 复制延迟由 read_router 的后台任务定期检查，这里只读取结果
+    if not read_router.enabled:
+        return {"enabled": False}
+    if not read_router.healthy:
+        raise RuntimeError(f"只读副本不可用: {read_router.unhealthy_reason()}")
+    return {"enabled": True, "lag": read_router.lag, "pool": read_router.pool_stats()}
+
+
+async def check_sms() -> Dict[str, Any]:
+    if not sms_dispatcher.running:
+        raise RuntimeError("短信发送队列未运行")
+    await sms_dispatcher.provider.check()
+    return {"provider": sms_dispatcher.provider.name, "queue_depth": sms_dispatcher.queue_depth}
+
+
+class HealthChecker:
+    """健康检查器，checks 为 {名称: (检查协程函数, 是否影响就绪)}
+
+    检查协程返回的字典中可以带 status（ok / degraded），抛出异常或超时为 error，只有 error 影响就绪
+    """
+
+    def __init__(self, checks: Dict[str, tuple], timeout: float = 2.0, cache_ttl: float = 2.0):
+        self.checks = checks
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.state = APP_STARTING
+        self.started_at = time.time()
+        self._result: Optional[Dict[str, Any]] = None
+        self._expires_at = 0.0
+        self._pending: Optional[asyncio.Future] = None
+
+    def mark_ready(self):
+        self.state = APP_READY
+        logger.info("应用已就绪")
+
+    def mark_stopping(self):
+        self.state = APP_STOPPING
+
+    def live(self) -> Dict[str, Any]:
+        return {"state": self.state, "uptime": round(time.time() - self.started_at, 3)}
+
+    async def _run_check(self, check: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            details = await asyncio.wait_for(check(), timeout=self.timeout)
+            result = {"status": "ok", **(details or {})}
+        except asyncio.TimeoutError:
+            result = {"status": "error", "error": f"检查超时（{self.timeout}s）"}
+        except Exception as e:
+            result = {"status": "error", "error": str(e) or type(e).__name__}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return result
+
+    async def _check_all(self) -> Dict[str, Any]:
+        names = list(self.checks)
+        results = await asyncio.gather(*(self._run_check(self.checks[name][0]) for name in names))
+        checks = dict(zip(names, results))
+        healthy = all(checks[name]["status"] != "error" for name in names if self.checks[name][1])
+        degraded = any(result["status"] != "ok" for result in results)
+        if not healthy:
+            failed = [name for name in names if checks[name]["status"] == "error"]
+            logger.warning(f"就绪检查失败: {failed}")
+        return {
+            "status": "ok" if not degraded else ("degraded" if healthy else "error"),
+            "healthy": healthy,
+            "checked_at": time.time(),
+            "checks": checks,
+        }
+
+    async def check(self) -> Dict[str, Any]:
+        """返回依赖检查结果（带缓存）"""
+        now = time.monotonic()
+        if self._result is not None and now < self._expires_at:
+            return self._result
+        if self._pending is None:
+            self._pending = asyncio.ensure_future(self._check_all())
+            pending = self._pending
+            try:
+                self._result = await asyncio.shield(pending)
+                self._expires_at = time.monotonic() + self.cache_ttl
+            finally:
+                self._pending = None
+            return self._result
+        return await asyncio.shield(self._pending)
+
+    async def ready(self) -> Dict[str, Any]:
+        """就绪检查结果，ready 为 False 时应返回 503"""
+        if self.state != APP_READY:
+            return {"ready": False, "state": self.state}
+        result = await self.check()
+        return {"ready": result["healthy"] and self.state == APP_READY, "state": self.state, **result}
+
+
+health_config = app_config["health"]
+health_checker = HealthChecker(
+    {
+        "postgres": (check_postgres, True),
+        "redis": (check_redis, True),
+        "sms": (check_sms, False),
+        "replica": (check_replica, False),
+    },
+    timeout=health_config["timeout"],
+    cache_ttl=health_config["cache_ttl"],
+)
+
+
+def _reload_health_config():
+    health_checker.timeout = health_config["timeout"]
+    health_checker.cache_ttl = health_config["cache_ttl"]
+
+
+app_config.add_reload_listener(_reload_health_config)
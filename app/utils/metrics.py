@@ -0,0 +1,344 @@
+"""
+Prometheus 指标
+- 轻量的 Counter / Gauge / Histogram 实现，按 Prometheus 文本格式（0.0.4）输出，不依赖 prometheus_client
+- 记录指标只有字典查找与整数加法，可以在满负载下常开；每个 worker 进程单独统计，需要分别抓取
+- 队列深度、连接池使用量等状态类指标用 CallbackMetric 在抓取时读取，不在请求路径上维护
+- 本模块不引用 app 内的其他模块，可以被任何模块导入
+"""
+import functools
+import inspect
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, "Metric"] = {}
+
+    def register(self, metric: "Metric"):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标 {metric.name} 已注册")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """按 Prometheus 文本格式输出所有指标"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, names, values, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class Metric:
+    """指标基类，labels(...) 返回对应标签值的子指标（创建后缓存）"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[MetricsRegistry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if registry is not None:
+            registry.register(self)
+        if not self.labelnames:
+            self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def samples(self) -> Iterable[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """返回 (名称后缀, 标签名, 标签值, 值)"""
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield "", self.labelnames, values, child.value
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield "", self.labelnames, values, child.value
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        # bisect_left：等于上界的值计入该桶（le 语义）
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[MetricsRegistry] = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        names = self.labelnames + ("le",)
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                yield "_bucket", names, values + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, values, child.sum
+            yield "_count", self.labelnames, values, cumulative
+
+
+class CallbackMetric(Metric):
+    """抓取时调用 callback 读取的指标，callback 返回 [(标签值元组, 值), ...]，出错时忽略
+
+    计数器类型的指标名需要以 _total 结尾（与 Counter 一致）
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Iterable[Tuple[tuple, float]]],
+                 labelnames: Sequence[str] = (), metric_type: str = "gauge",
+                 registry: Optional[MetricsRegistry] = REGISTRY):
+        self.type = metric_type
+        self.callback = callback
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return None
+
+    def samples(self):
+        try:
+            results = list(self.callback())
+        except Exception:
+            return
+        for values, value in results:
+            yield "", self.labelnames, values, value
+
+
+def timed(histogram: Histogram, errors: Optional[Counter] = None, label: Optional[str] = None):
+    """协程计时装饰器，label 为标签值（默认使用函数名）"""
+
+    def decorator(func):
+        name = label or func.__name__
+        child = histogram.labels(name)
+        error_child = errors.labels(name) if errors is not None else None
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                if error_child is not None:
+                    error_child.inc()
+                raise
+            finally:
+                child.observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+# HTTP 请求
+http_requests_total = Counter(
+    "http_requests_total", "HTTP 请求数", ("method", "route", "status"))
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时（秒）", ("method", "route"))
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress", "正在处理的 HTTP 请求数")
+
+# 数据库（按 UserRepository 方法统计）
+db_query_duration_seconds = Histogram(
+    "db_query_duration_seconds", "数据访问方法耗时（秒）", ("method",))
+db_query_errors_total = Counter(
+    "db_query_errors_total", "数据访问方法抛出异常的次数", ("method",))
+db_pool_acquire_duration_seconds = Histogram(
+    "db_pool_acquire_duration_seconds", "从 PostgreSQL 连接池获取连接的耗时（秒），按 Tortoise 连接名（default、replica）统计",
+    ("connection",), buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+# Redis（按命令统计，pipeline 整体计为 PIPELINE）
+redis_command_duration_seconds = Histogram(
+    "redis_command_duration_seconds", "Redis 命令耗时（秒）", ("command",))
+redis_command_errors_total = Counter(
+    "redis_command_errors_total", "Redis 命令失败次数", ("command",))
+
+# 短信发送
+sms_send_duration_seconds = Histogram(
+    "sms_send_duration_seconds", "单次调用短信服务商的耗时（秒）", ("provider", "result"),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+
+
+def instrument_class(cls, histogram: Histogram, errors: Optional[Counter] = None):
+    """为类中所有公开的异步静态方法计时，标签为方法名"""
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_") or not isinstance(attr, staticmethod):
+            continue
+        if inspect.iscoroutinefunction(attr.__func__):
+            setattr(cls, name, staticmethod(timed(histogram, errors, name)(attr.__func__)))
+    return cls
+
+
+def instrument_redis(client):
+    """为 Redis 客户端的命令与 pipeline 计时（替换实例上的 execute_command 与 pipeline）"""
+    execute_command = client.execute_command
+    create_pipeline = client.pipeline
+
+    async def timed_execute_command(*args, **options):
+        command = str(args[0]).upper() if args else "UNKNOWN"
+        start = time.perf_counter()
+        try:
+            return await execute_command(*args, **options)
+        except Exception:
+            redis_command_errors_total.labels(command).inc()
+            raise
+        finally:
+            redis_command_duration_seconds.labels(command).observe(time.perf_counter() - start)
+
+    def pipeline(*args, **kwargs):
+        pipe = create_pipeline(*args, **kwargs)
+        pipe.execute = timed(redis_command_duration_seconds, redis_command_errors_total, "PIPELINE")(pipe.execute)
+        return pipe
+
+    client.execute_command = timed_execute_command
+    client.pipeline = pipeline
+    return client
+
+
+def _route_template(scope) -> str:
+    """匹配到的路由模板（包含 include_router 的前缀），未匹配时返回 unmatched"""
+    # 新版 FastAPI 中 scope["route"] 是未加前缀的原始路由，完整路径在 effective_route_context 中
+    fastapi_scope = scope.get("fastapi")
+    context = fastapi_scope.get("effective_route_context") if isinstance(fastapi_scope, dict) else None
+    return getattr(context, "path", None) or getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """统计 HTTP 请求数与耗时的 ASGI 中间件
+
+    路由标签使用匹配到的路由模板（例如 /user/profile），未匹配的请求统一记为 unmatched，避免标签数量膨胀。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_progress.dec()
+            route = _route_template(scope)
+            method = scope["method"]
+            http_request_duration_seconds.labels(method, route).observe(time.perf_counter() - start)
+            http_requests_total.labels(method, route, str(status)).inc()
@@ -0,0 +1,184 @@
+"""
+密码哈希服务
+- 使用标准库 hashlib.scrypt（慢哈希，带随机盐），存储格式：scrypt$n$r$p$salt$hash（base64）
+- 哈希计算在有界线程池中执行，不阻塞事件循环；同时等待的请求数有上限，超出时拒绝，避免登录风暴拖垮 worker
+- 批量注册的哈希在单独的小线程池中计算，不与登录/注册请求排队，批量任务只会变慢，不会让登录等待
+- 兼容旧的无盐 md5 十六进制摘要，校验通过后提示调用方重新哈希
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app import app_config
+
+logger = logging.getLogger("app")
+
+SCRYPT_PREFIX = "scrypt"
+LEGACY_MD5_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data.encode("ascii"))
+
+
+class PasswordHasher:
+    """密码哈希服务
+
+    - n / r / p 为 scrypt 代价参数，n 必须是 2 的幂
+    - max_workers 为哈希线程池大小（hashlib.scrypt 计算时会释放 GIL）
+    - max_pending 为允许同时排队和计算的请求数，超出时 hash/verify 抛出 503
+    - bulk_max_workers 为批量哈希（hash_many）线程池大小
+    """
+
+    def __init__(self, n: int = 16384, r: int = 8, p: int = 1, salt_size: int = 16,
+                 max_workers: int = 4, max_pending: int = 64, bulk_max_workers: int = 1):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.salt_size = salt_size
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.bulk_max_workers = bulk_max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._bulk_executor: Optional[ThreadPoolExecutor] = None
+        self._bulk_semaphore: Optional[asyncio.Semaphore] = None
+        self._pending = 0
+        self._bulk_pending = 0
+        self.rejected_count = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    @property
+    def bulk_executor(self) -> ThreadPoolExecutor:
+        if self._bulk_executor is None:
+            self._bulk_executor = ThreadPoolExecutor(max_workers=self.bulk_max_workers,
+                                                     thread_name_prefix="password-hash-bulk")
+        return self._bulk_executor
+
+    def shutdown(self):
+        """关闭哈希线程池"""
+        for name in ("_executor", "_bulk_executor"):
+            executor = getattr(self, name)
+            setattr(self, name, None)
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _maxmem(self, n: int, r: int, p: int) -> int:
+        # scrypt 需要约 128 * n * r * p 字节内存，留出余量
+        return 128 * n * r * (p + 2) + 1024 * 1024
+
+    def hash_sync(self, password: str) -> str:
+        """同步计算密码哈希（在线程池中调用）"""
+        salt = os.urandom(self.salt_size)
+        digest = hashlib.scrypt(password.encode("utf8"), salt=salt, n=self.n, r=self.r, p=self.p,
+                                maxmem=self._maxmem(self.n, self.r, self.p))
+        return f"{SCRYPT_PREFIX}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(digest)}"
+
+    def verify_sync(self, password: str, stored: str) -> Tuple[bool, bool]:
+        """同步校验密码，返回 (是否匹配, 是否需要重新哈希)"""
+        if not stored:
+            return False, False
+        if LEGACY_MD5_PATTERN.match(stored):
+            legacy = hashlib.md5(password.encode("utf8")).hexdigest()
+            matched = hmac.compare_digest(legacy, stored)
+            return matched, matched
+        try:
+            prefix, n, r, p, salt, digest = stored.split("$")
+            n, r, p = int(n), int(r), int(p)
+        except ValueError:
+            logger.error("无法识别的密码哈希格式")
+            return False, False
+        if prefix != SCRYPT_PREFIX:
+            logger.error(f"不受支持的密码哈希算法 {prefix}")
+            return False, False
+        try:
+            expected = _b64decode(digest)
+            actual = hashlib.scrypt(password.encode("utf8"), salt=_b64decode(salt), n=n, r=r, p=p,
+                                    maxmem=self._maxmem(n, r, p), dklen=len(expected))
+        except (ValueError, OverflowError) as e:
+            # 盐或摘要不是合法的 base64、代价参数不合法：按密码不匹配处理
+            logger.error(f"密码哈希已损坏，无法校验: {e}")
+            return False, False
+        matched = hmac.compare_digest(actual, expected)
+        return matched, matched and (n, r, p) != (self.n, self.r, self.p)
+
+    async def _run(self, func, *args):
+        if self._pending >= self.max_pending:
+            self.rejected_count += 1
+            raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试")
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """计算密码哈希"""
+        return await self._run(self.hash_sync, password)
+
+    async def verify(self, password: str, stored: str) -> Tuple[bool, bool]:
+        """校验密码，返回 (是否匹配, 是否需要重新哈希)"""
+        return await self._run(self.verify_sync, password, stored)
+
+    async def _run_bulk(self, password: str) -> str:
+        # 同时提交到线程池的任务数不超过线程数，请求被取消时尚未提交的哈希不会再计算
+        if self._bulk_semaphore is None:
+            self._bulk_semaphore = asyncio.Semaphore(self.bulk_max_workers)
+        self._bulk_pending += 1
+        try:
+            async with self._bulk_semaphore:
+                return await asyncio.get_running_loop().run_in_executor(self.bulk_executor, self.hash_sync, password)
+        finally:
+            self._bulk_pending -= 1
+
+    async def hash_many(self, passwords: Iterable[str]) -> List[str]:
+        """批量计算密码哈希（用于批量注册），在单独的批量线程池中计算，不占用登录使用的线程池与 max_pending 名额"""
+        return await asyncio.gather(*(self._run_bulk(password) for password in passwords))
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "max_workers": self.max_workers,
+            "rejected": self.rejected_count,
+            "bulk_pending": self._bulk_pending,
+            "bulk_max_workers": self.bulk_max_workers,
+        }
+
+
+password_config = app_config["password_hashing"]
+password_hasher = PasswordHasher(
+    n=password_config["scrypt_n"],
+    r=password_config["scrypt_r"],
+    p=password_config["scrypt_p"],
+    max_workers=password_config["max_workers"],
+    max_pending=password_config["max_pending"],
+    bulk_max_workers=password_config["bulk_max_workers"],
+)
+
+
+def _reload_password_config():
+    # 线程池大小需要重启生效；修改 scrypt 参数后，旧参数的哈希在下次登录时重新计算
+    password_hasher.n = password_config["scrypt_n"]
+    password_hasher.r = password_config["scrypt_r"]
+    password_hasher.p = password_config["scrypt_p"]
+    password_hasher.max_pending = password_config["max_pending"]
+
+
+app_config.add_reload_listener(_reload_password_config)
@@ -0,0 +1,84 @@
+"""
+积分流水汇总任务
+后台定期调用 UserRepository.fold_points_ledger，把只追加的积分流水合并写入 User.points。
+多个 worker 同时运行时通过 FOR UPDATE SKIP LOCKED 分摊流水，不会重复汇总。
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from app import app_config
+from app.utils.database_postgres import UserRepository
+
+logger = logging.getLogger("app")
+
+
+class PointsLedgerFolder:
+    """积分流水汇总器
+
+    - interval: 两次汇总之间的间隔（秒）
+    - batch_size: 每条汇总语句处理的流水条数
+    - max_batches: 每次汇总最多执行的批数，避免积压时长时间占用数据库连接
+    """
+
+    def __init__(self, interval: float = 10, batch_size: int = 5000, max_batches: int = 20):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self._task: Optional[asyncio.Task] = None
+        self.folded_users = 0
+
+    async def fold_once(self) -> int:
+        """执行一次汇总，返回更新的用户数"""
+        updated = 0
+        for _ in range(self.max_batches):
+            count = await UserRepository.fold_points_ledger(self.batch_size)
+            if not count:
+                break
+            updated += count
+        self.folded_users += updated
+        return updated
+
+    async def start(self):
+        """启动后台汇总任务"""
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台汇总任务"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                updated = await self.fold_once()
+                if updated:
+                    logger.debug(f"积分流水汇总完成，更新 {updated} 个用户")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"积分流水汇总失败: {e}")
+
+
+points_ledger_config = app_config["points_ledger"]
+points_ledger_folder = PointsLedgerFolder(
+    interval=points_ledger_config["fold_interval"],
+    batch_size=points_ledger_config["fold_batch_size"],
+    max_batches=points_ledger_config["fold_max_batches"],
+)
+
+
+def _reload_points_ledger_config():
+    # fold_interval 需要重启生效（为 0 时不启动汇总任务）
+    points_ledger_folder.batch_size = points_ledger_config["fold_batch_size"]
+    points_ledger_folder.max_batches = points_ledger_config["fold_max_batches"]
+
+
+app_config.add_reload_listener(_reload_points_ledger_config)
@@ -0,0 +1,93 @@
+"""
+用户信息读穿缓存
+- 每个 worker 在进程内 LRU 中缓存序列化后的用户信息，条目带有写入时的版本号
+- 版本号保存在 Redis（每个用户一个键），写操作写入新的随机版本号使所有 worker 的缓存同时失效；
+  版本号不会重复，版本键过期后也不会与仍在本地缓存中的旧条目匹配
+- 读取时只需一次 Redis GET 比较版本号，版本一致时不再查询 PostgreSQL
+"""
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from app import app_config  # app_config 在 app/__init__ 中先于数据库模块创建
+from app.config.constant import REDIS_USER_PROFILE_VERSION
+from app.utils.cache import LRUCache
+from app.utils.database_redis import redis_client
+
+logger = logging.getLogger("app")
+
+
+class ProfileCache:
+    """用户信息缓存，ttl 与 max_size 来自配置文件中的 cache_settings"""
+
+    def __init__(self, max_size: int = 1000, ttl: float = 3600, enabled: bool = True):
+        self.enabled = enabled
+        self.ttl = ttl
+        self._local = LRUCache(max_size=max_size, ttl=ttl)
+
+    @staticmethod
+    def _version_key(user_id: str) -> str:
+        return REDIS_USER_PROFILE_VERSION + str(user_id)
+
+    async def get(self, user_id: str, loader: Callable[[str], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """读取用户信息，缓存未命中或版本过期时调用 loader 从数据库加载"""
+        user_id = str(user_id)
+        if not self.enabled:
+            return await loader(user_id)
+        try:
+            version = await redis_client.get(self._version_key(user_id)) or "0"
+        except Exception as e:
+            logger.warning(f"读取用户信息缓存版本失败，直接查询数据库: {e}")
+            return await loader(user_id)
+
+        entry = self._local.get(user_id)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        payload = await loader(user_id)
+        if payload is not None:
+            # 使用加载前读到的版本号，加载期间发生的写操作会在下次读取时被发现
+            self._local.set(user_id, (version, payload))
+        return payload
+
+    async def invalidate(self, user_id: str):
+        """使用户信息缓存失效（所有 worker）"""
+        await self.invalidate_many([user_id])
+
+    async def invalidate_many(self, user_ids: Iterable[str]):
+        """批量使用户信息缓存失效，所有版本号更新在一个 pipeline 中发送"""
+        user_ids = [str(user_id) for user_id in user_ids]
+        for user_id in user_ids:
+            self._local.pop(user_id)
+        if not self.enabled or not user_ids:
+            return
+        # 随机版本号：INCR 的计数在键过期后会从头开始，可能与本地缓存中旧条目的版本号相同
+        version = uuid.uuid4().hex
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    # 版本键过期后读到 "0"，以 "0" 缓存的条目都早于上一次写入且已超过本地缓存的 ttl
+                    pipe.set(self._version_key(user_id), version, ex=int(self.ttl * 2))
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"使用户信息缓存失效失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return self._local.stats()
+
+
+cache_settings = app_config["cache_settings"]
+profile_cache = ProfileCache(
+    max_size=cache_settings["max_size"],
+    ttl=cache_settings["ttl"],
+    enabled=cache_settings["enabled"],
+)
+
+
+def _reload_cache_settings():
+    # max_size 需要重启生效
+    profile_cache.enabled = cache_settings["enabled"]
+    profile_cache.ttl = profile_cache._local.ttl = cache_settings["ttl"]
+
+
+app_config.add_reload_listener(_reload_cache_settings)
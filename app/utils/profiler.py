@@ -0,0 +1,263 @@
+"""
+采样分析器
+- 后台线程按固定间隔读取事件循环线程的调用栈（sys._current_frames），被分析的代码无需插桩，
+  阻塞事件循环的同步调用同样能被采到；开销只与采样频率有关
+- 结果为折叠栈格式（每行 "栈帧;栈帧;... 次数"，可直接用于 flamegraph.pl / speedscope），也可以输出 SVG 火焰图
+- 慢请求捕获：采样时通过 asyncio.current_task 把调用栈归属到正在执行的请求，
+  请求耗时超过阈值时把该请求的折叠栈写入 data/profiles
+"""
+import asyncio
+import html
+import os
+import sys
+import threading
+import time
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app import app_config
+
+logger = logging.getLogger("app")
+
+# 事件循环空闲时停留的位置，默认不计入结果
+IDLE_FRAMES = {("selectors.py", "select"), ("base_events.py", "_run_once")}
+
+
+class StackSampler:
+    """在后台线程中对指定线程的调用栈采样"""
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._labels: Dict[object, str] = {}
+        self._root = os.path.abspath(os.getcwd()) + os.sep
+
+    def frame_label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            if filename.startswith(self._root):
+                filename = filename[len(self._root):]
+            else:
+                filename = os.path.basename(filename)
+            label = self._labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+        return label
+
+    def sample(self, thread_id: int, include_idle: bool = False) -> Optional[Tuple[str, ...]]:
+        """读取线程当前的调用栈，返回从外到内的栈帧标签；线程空闲时返回 None"""
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            return None
+        if not include_idle and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+            return None
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            stack.append(self.frame_label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+
+class Profile:
+    """一次采样分析的结果"""
+
+    def __init__(self, stacks: Counter, duration: float, interval: float):
+        self.stacks = stacks
+        self.duration = duration
+        self.interval = interval
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """折叠栈格式，按次数从多到少排列"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def flamegraph(self, width: int = 1200, frame_height: int = 16) -> str:
+        """生成简单的 SVG 火焰图（鼠标悬停显示完整栈帧与占比）"""
+        total = self.sample_count
+        if not total:
+            return f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="20"><text x="4" y="14">没有采样数据</text></svg>'
+        # 构建调用树：节点为 (子节点字典, 次数)
+        root: Dict[str, list] = {}
+        depth = 0
+        for stack, count in self.stacks.items():
+            depth = max(depth, len(stack))
+            children = root
+            for label in stack:
+                node = children.setdefault(label, [{}, 0])
+                node[1] += count
+                children = node[0]
+        height = (depth + 1) * frame_height
+        rects: List[str] = []
+
+        def render(children: Dict[str, list], x: float, level: int):
+            for label, (grandchildren, count) in sorted(children.items()):
+                w = count / total * width
+                if w >= 0.5:
+                    y = height - (level + 1) * frame_height
+                    hue = 20 + (hash(label) % 40)
+                    text = html.escape(label)
+                    title = f"{text} ({count} 次采样, {count / total:.2%})"
+                    rects.append(
+                        f'<g><title>{title}</title><rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{frame_height - 1}" '
+                        f'fill="hsl({hue},80%,60%)"/>'
+                        + (f'<text x="{x + 2:.1f}" y="{y + frame_height - 4}" font-size="11" font-family="monospace">'
+                           f'{html.escape(label[:int(w / 7)])}</text>' if w > 28 else "")
+                        + "</g>"
+                    )
+                    render(grandchildren, x, level + 1)
+                x += w
+
+        render(root, 0.0, 0)
+        return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">'
+                f'<rect width="100%" height="100%" fill="#fff"/>{"".join(rects)}</svg>')
+
+
+class SamplingProfiler:
+    """按需采样分析器：对事件循环线程采样 seconds 秒，同一时间只允许一个分析任务"""
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    async def profile(self, seconds: float, interval: float = 0.005, include_idle: bool = False) -> Profile:
+        """在当前事件循环运行期间采样，返回分析结果"""
+        async with self._lock:
+            sampler = StackSampler(interval)
+            thread_id = threading.get_ident()
+            stacks: Counter = Counter()
+            stop = threading.Event()
+
+            def run():
+                while not stop.wait(interval):
+                    stack = sampler.sample(thread_id, include_idle)
+                    if stack:
+                        stacks[stack] += 1
+
+            thread = threading.Thread(target=run, name="sampling-profiler", daemon=True)
+            started = time.perf_counter()
+            thread.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                await asyncio.to_thread(thread.join)
+            return Profile(stacks, time.perf_counter() - started, interval)
+
+
+class SlowRequestProfiler:
+    """慢请求捕获
+
+    - 采样线程常驻，每次采样时读取事件循环当前执行的任务，如果是正在处理的请求，就把调用栈记入该请求
+    - 只统计请求自身在事件循环上执行的时间（等待 I/O 期间不会被采到）
+    - 请求耗时超过 threshold 时写入 output_dir/<时间>_<方法>_<路径>_<耗时ms>.collapsed，最多保留 max_files 个
+    """
+
+    def __init__(self, threshold: float = 1.0, interval: float = 0.01, output_dir: str = "data/profiles",
+                 max_files: int = 100):
+        self.threshold = threshold
+        self.interval = interval
+        self.output_dir = output_dir
+        self.max_files = max_files
+        self._active: Dict[asyncio.Task, List[Tuple[str, ...]]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.captured_count = 0
+
+    def start(self):
+        """在事件循环线程中调用，启动采样线程"""
+        if self._thread is not None:
+            return
+        loop = asyncio.get_running_loop()
+        thread_id = threading.get_ident()
+        sampler = StackSampler(self.interval)
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                if not self._active:
+                    continue
+                task = asyncio.current_task(loop)
+                samples = self._active.get(task)
+                if samples is None:
+                    continue
+                stack = sampler.sample(thread_id)
+                if stack:
+                    samples.append(stack)
+
+        self._thread = threading.Thread(target=run, name="slow-request-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"慢请求捕获已开启（阈值 {self.threshold * 1000:.0f}ms，采样间隔 {self.interval * 1000:.0f}ms）")
+
+    async def stop(self):
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            await asyncio.to_thread(thread.join)
+
+    def begin(self) -> Optional[asyncio.Task]:
+        task = asyncio.current_task()
+        if task is not None and self._thread is not None:
+            self._active[task] = []
+        return task
+
+    async def end(self, task: Optional[asyncio.Task], method: str, path: str, elapsed: float):
+        samples = self._active.pop(task, None) if task is not None else None
+        if not samples or elapsed < self.threshold:
+            return
+        # 采样线程可能仍持有列表的引用，先复制再处理
+        profile = Profile(Counter(list(samples)), elapsed, self.interval)
+        name = "_".join([
+            time.strftime("%Y%m%d-%H%M%S"),
+            method,
+            path.strip("/").replace("/", "-")[:80] or "root",
+            f"{elapsed * 1000:.0f}ms",
+        ])
+        try:
+            await asyncio.to_thread(self._write, name, profile.collapsed())
+            self.captured_count += 1
+            logger.warning(f"慢请求 {method} {path} 耗时 {elapsed * 1000:.0f}ms，调用栈已保存到 {self.output_dir}/{name}.collapsed")
+        except Exception as e:
+            logger.error(f"保存慢请求调用栈失败: {e}")
+
+    def _write(self, name: str, content: str):
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, name + ".collapsed"), "w", encoding="utf-8") as f:
+            f.write(content)
+        files = sorted(f for f in os.listdir(self.output_dir) if f.endswith(".collapsed"))
+        for old in files[:-self.max_files]:
+            os.remove(os.path.join(self.output_dir, old))
+
+
+class SlowRequestProfilerMiddleware:
+    """把每个 HTTP 请求登记到 SlowRequestProfiler 的 ASGI 中间件"""
+
+    def __init__(self, app, profiler: SlowRequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        task = self.profiler.begin()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await self.profiler.end(task, scope["method"], scope["path"], time.perf_counter() - start)
+
+
+sampling_profiler = SamplingProfiler()
+slow_request_profiler = SlowRequestProfiler(
+    threshold=app_config["profiling"]["slow_request_threshold_ms"] / 1000,
+    interval=app_config["profiling"]["slow_request_interval_ms"] / 1000,
+    output_dir=app_config["profiling"]["output_dir"],
+    max_files=app_config["profiling"]["max_files"],
+)
@@ -0,0 +1,166 @@
+"""
+接口限流
+- 令牌桶保存在 Redis 中，一次检查涉及的所有桶（按手机号、IP、全局）由一个 Lua 脚本原子地判断和扣减，
+  任一桶不足时都不扣减，并返回需要等待的时间
+- 桶在被拒绝后的等待时间内只会补充令牌而不会被其他请求消耗，因此进程内记录被拒绝的桶直到可重试时刻，
+  期间的请求直接拒绝，不再访问 Redis
+- 各接口的限额在 data/config.json 的 rate_limit.routes 中配置，每次检查时读取，支持热加载
+"""
+import math
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, Request
+
+from app import app_config
+from app.config.constant import REDIS_RATE_LIMIT
+from app.utils.cache import LRUCache
+from app.utils.database_redis import redis_client
+
+logger = logging.getLogger("app")
+
+RATE_LIMIT_SCOPES = ("phone", "ip", "global")
+
+# KEYS: 各令牌桶；ARGV[1]: 消耗的令牌数，之后每个桶依次为 容量、补满周期（毫秒）
+# 返回 {是否允许, 需等待的毫秒数, 受限的桶序号（从 1 开始）}
+TOKEN_BUCKET_SCRIPT = """
+local now_time = redis.call('TIME')
+local now = tonumber(now_time[1]) * 1000 + math.floor(tonumber(now_time[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+local blocked = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local period = tonumber(ARGV[i * 2 + 1])
+    local rate = capacity / period
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local level = tonumber(state[1])
+    if level == nil then
+        level = capacity
+    else
+        level = math.min(capacity, level + math.max(0, now - tonumber(state[2])) * rate)
+    end
+    levels[i] = level
+    if level < cost then
+        local need = math.ceil((cost - level) / rate)
+        if need > wait then
+            wait = need
+            blocked = i
+        end
+    end
+end
+if blocked > 0 then
+    return {0, wait, blocked}
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, ARGV[i * 2 + 1])
+end
+return {1, 0, 0}
+"""
+
+
+def get_client_ip(request: Request, trust_forwarded_for: bool = False) -> Optional[str]:
+    """获取客户端IP，部署在反向代理之后时可信任 X-Forwarded-For 的第一个地址"""
+    if trust_forwarded_for:
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+
+class RateLimiter:
+    """基于 Redis 令牌桶的限流器
+
+    每条限额为 {"scope": "phone" | "ip" | "global", "limit": 次数, "period": 秒}，
+    即每 period 秒最多 limit 次，允许 limit 次的突发。
+    """
+
+    def __init__(self, local_deny_max_size: int = 10000):
+        self._denied = LRUCache(max_size=local_deny_max_size)
+        self.allowed_count = 0
+        self.denied_count = 0
+        self.local_denied_count = 0
+        self.error_count = 0
+
+    def _buckets(self, route: str, limits: List[Dict[str, Any]], identities: Dict[str, Optional[str]]):
+        buckets = []
+        for limit in limits:
+            scope = limit["scope"]
+            if scope not in RATE_LIMIT_SCOPES:
+                logger.error(f"接口 {route} 的限流配置中有不受支持的范围 {scope}")
+                continue
+            identity = identities.get(scope)
+            if not identity:
+                continue
+            key = f"{REDIS_RATE_LIMIT}{route}:{scope}:{limit['period']}:{identity}"
+            buckets.append((key, int(limit["limit"]), int(float(limit["period"]) * 1000)))
+        return buckets
+
+    @staticmethod
+    def _reject(retry_after: float):
+        raise HTTPException(
+            status_code=429,
+            detail="请求过于频繁，请稍后重试",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    async def check(self, route: str, request: Optional[Request] = None, phone: Optional[str] = None, cost: int = 1):
+        """检查并扣减 route 的限额，超出时抛出 429（带 Retry-After）"""
+        config = app_config["rate_limit"]
+        if not config["enabled"]:
+            return
+        limits = config["routes"].get(route)
+        if not limits:
+            return
+        identities = {
+            "phone": phone,
+            "ip": get_client_ip(request, config["trust_forwarded_for"]) if request is not None else None,
+            "global": "*",
+        }
+        buckets = self._buckets(route, limits, identities)
+        if not buckets:
+            return
+
+        now = time.monotonic()
+        for key, _, _ in buckets:
+            retry_at = self._denied.get(key)
+            if retry_at is not None and retry_at > now:
+                self.local_denied_count += 1
+                self._reject(retry_at - now)
+
+        args = [cost]
+        for _, capacity, period_ms in buckets:
+            args.extend([capacity, period_ms])
+        try:
+            allowed, wait_ms, blocked = await redis_client.eval(
+                TOKEN_BUCKET_SCRIPT, len(buckets), *[key for key, _, _ in buckets], *args)
+        except Exception as e:
+            self.error_count += 1
+            if config["fail_open"]:
+                logger.warning(f"限流检查失败，放行请求: {e}")
+                return
+            logger.error(f"限流检查失败: {e}")
+            raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试")
+
+        if int(allowed):
+            self.allowed_count += 1
+            return
+        self.denied_count += 1
+        retry_after = int(wait_ms) / 1000
+        self._denied.set(buckets[int(blocked) - 1][0], now + retry_after, ttl=retry_after)
+        self._reject(retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "allowed": self.allowed_count,
+            "denied": self.denied_count,
+            "local_denied": self.local_denied_count,
+            "errors": self.error_count,
+            "local_deny_size": len(self._denied),
+        }
+
+
+rate_limiter = RateLimiter(local_deny_max_size=app_config["rate_limit"]["local_deny_max_size"])
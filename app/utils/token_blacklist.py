@@ -0,0 +1,181 @@
+"""
+Token黑名单
+Redis 中以 token 为键保存已失效的 token，本模块在其前面加了一层进程内负缓存：
+记录“已确认未失效”的 token 摘要，命中时跳过 Redis GET。
+各 worker 通过 Redis pub/sub 失效频道广播失效事件，收到后从本地缓存中剔除对应摘要。
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from app import app_config
+from app.config.constant import REDIS_TOKEN_REVOKED_CHANNEL
+from app.utils.cache import LRUCache
+from app.utils.database_redis import redis_client
+
+logger = logging.getLogger("app")
+
+REVOKED_VALUE = 'expired'
+
+
+def token_digest(token: str) -> str:
+    """计算 token 摘要，本地缓存与失效广播中只使用摘要"""
+    return hashlib.sha256(token.encode("utf8")).hexdigest()
+
+
+class TokenBlacklist:
+    """带进程内负缓存的 Token 黑名单
+
+    - 只有在失效频道订阅成功后才使用本地缓存，订阅断开时清空缓存并直接查询 Redis，
+      因此不会因为漏收广播而放行已失效的 token。
+    - 缓存条目带有过期时间，作为广播异常时的兜底。
+    """
+
+    def __init__(self, max_size: int = 100000, ttl: float = 300, enabled: bool = True,
+                 channel: str = REDIS_TOKEN_REVOKED_CHANNEL):
+        self.enabled = enabled
+        self.channel = channel
+        self._not_revoked = LRUCache(max_size=max_size, ttl=ttl)
+        # 每收到一次失效广播递增，用于丢弃与广播并发的 Redis 查询结果
+        self._epoch = 0
+        self._listening = False
+        self._task: Optional[asyncio.Task] = None
+        self._revocation_listeners: List[Callable[[List[str]], Any]] = []
+        self.local_hits = 0
+        self.redis_lookups = 0
+        self.revoked_hits = 0
+
+    async def is_revoked(self, token: str) -> bool:
+        """检查 token 是否已被加入黑名单"""
+        use_cache = self.enabled and self._listening
+        digest = token_digest(token) if use_cache else None
+        if use_cache and self._not_revoked.get(digest):
+            self.local_hits += 1
+            return False
+
+        epoch = self._epoch
+        self.redis_lookups += 1
+        result = await redis_client.get(token)
+        if result == REVOKED_VALUE:
+            self.revoked_hits += 1
+            return True
+        if use_cache and self._listening and epoch == self._epoch:
+            self._not_revoked.set(digest, True)
+        return False
+
+    async def revoke(self, token: str, ex: int):
+        """将 token 加入黑名单并广播失效事件"""
+        digest = token_digest(token)
+        await redis_client.set(token, REVOKED_VALUE, ex=ex)
+        self.discard([digest])
+        await self.publish([digest])
+
+    async def revoke_many(self, tokens: List[str], ex: int):
+        """通过一次 pipeline 将一批 token 加入黑名单，并合并广播失效事件"""
+        if not tokens:
+            return
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for token in tokens:
+                pipe.set(token, REVOKED_VALUE, ex=ex)
+            await pipe.execute()
+        digests = [token_digest(token) for token in tokens]
+        self.discard(digests)
+        await self.publish(digests)
+
+    async def publish(self, digests: Iterable[str]):
+        """广播失效事件，多个摘要以换行分隔合并为一条消息"""
+        message = "\n".join(digests)
+        if message:
+            await redis_client.publish(self.channel, message)
+
+    def add_revocation_listener(self, listener: Callable[[List[str]], Any]):
+        """注册失效回调，本进程或其他 worker 使 token 失效时以摘要列表调用，用于同步清理其他本地缓存"""
+        self._revocation_listeners.append(listener)
+
+    def discard(self, digests: Iterable[str]):
+        """从本地缓存中剔除已失效的 token 摘要"""
+        digests = list(digests)
+        self._epoch += 1
+        for digest in digests:
+            self._not_revoked.pop(digest)
+        for listener in self._revocation_listeners:
+            listener(digests)
+
+    def _reset(self):
+        self._listening = False
+        self._epoch += 1
+        self._not_revoked.clear()
+
+    async def start(self):
+        """启动失效频道监听任务"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """停止监听任务"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._reset()
+
+    async def _listen(self):
+        """订阅失效频道，断线后清空缓存并重连"""
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message["type"] == "subscribe":
+                        self._listening = True
+                    elif message["type"] == "message":
+                        self.discard(message["data"].split("\n"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Token失效频道订阅中断，将在重连前直接查询Redis: {e}")
+                self._reset()
+                await asyncio.sleep(1)
+            finally:
+                self._listening = False
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        """负缓存统计：local_hits 为跳过的 Redis GET 次数"""
+        checks = self.local_hits + self.redis_lookups
+        return {
+            "enabled": self.enabled,
+            "listening": self._listening,
+            "checks": checks,
+            "local_hits": self.local_hits,
+            "redis_lookups": self.redis_lookups,
+            "revoked_hits": self.revoked_hits,
+            "saved_ratio": round(self.local_hits / checks, 4) if checks else 0.0,
+            "cache_size": len(self._not_revoked),
+        }
+
+
+token_cache_config = app_config["token_cache"]
+token_blacklist = TokenBlacklist(
+    max_size=token_cache_config["max_size"],
+    ttl=token_cache_config["ttl"],
+    enabled=token_cache_config["enabled"],
+)
+
+
+def _reload_token_cache_config():
+    # enabled 与 max_size 需要重启生效（决定是否启动失效频道监听）
+    token_blacklist._not_revoked.ttl = token_cache_config["ttl"]
+
+
+app_config.add_reload_listener(_reload_token_cache_config)
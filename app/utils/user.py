@@ -1,4 +1,5 @@
 import hashlib
+import hmac
 import string
 import secrets
 from datetime import datetime, timedelta
@@ -8,19 +9,27 @@ import jwt
 import re
 import time
 import random
+import logging
 
 from app.models import user
 from app import app_config
 from app import logger
 
-from app.config.constant import REDIS_USER_REGISTER_CODE, REDIS_USER_LOGIN_CODE, REDIS_USER_RESET_CODE
+from app.config.constant import REDIS_USER_REGISTER_CODE, REDIS_USER_LOGIN_CODE, REDIS_USER_RESET_CODE, REDIS_USER_CODE
 from app.utils.verification_code_platform import SendSms
+from app.utils.token_blacklist import token_blacklist, token_digest
+from app.utils.cache import LRUCache
 from app import redis_client
 
 jwt_config=app_config.jwt_config
 SECRET_KEY=jwt_config["jwt_secret_key"]
 ALGORITHM = 'HS256'
 
+# 已验证的 JWT 载荷缓存：以 token 摘要为键，最长缓存 max_ttl 秒（token 带 exp 时不超过 exp），收到失效广播时剔除
+jwt_cache_config = app_config["jwt_cache"]
+verified_jwt_cache = LRUCache(max_size=jwt_cache_config["max_size"])
+token_blacklist.add_revocation_listener(lambda digests: [verified_jwt_cache.pop(digest) for digest in digests])
+
 
 #------------------------------
 #         邀请码部分
@@ -49,10 +58,23 @@ def create_jwt(current_user: user):
     return token
 
 def decode_jwt(token: str):
+    cache_enabled = jwt_cache_config["enabled"]
+    if cache_enabled:
+        digest = token_digest(token)
+        payload = verified_jwt_cache.get(digest)
+        if payload is not None:
+            return dict(payload)
     try:
         # 解码 JWT 并验证签名
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 
+        if cache_enabled:
+            # 缓存到 exp 为止；没有 exp 的 token 最多缓存 max_ttl 秒
+            ttl = jwt_cache_config["max_ttl"]
+            if "exp" in payload:
+                ttl = min(ttl, payload["exp"] - time.time())
+            if ttl > 0:
+                verified_jwt_cache.set(digest, dict(payload), ttl=ttl)
         return payload
     except jwt.ExpiredSignatureError:
         logger.error("Token 已过期!")
@@ -65,6 +87,7 @@ def decode_jwt(token: str):
         raise HTTPException(status_code=400, detail="无效的 Token")
 
 
+# 旧版密码存储使用的无盐 md5，新密码请使用 app.utils.password.password_hasher
 def md5(s):
     s = s.encode("utf8")
     m = hashlib.md5()
@@ -94,24 +117,35 @@ def get_token_from_request(request: Request) -> Optional[str]:
     return None
 
 
+def require_admin(request: Request):
+    """管理接口鉴权：请求头 X-Admin-Key 必须与环境变量 ADMIN_API_KEY 一致"""
+    admin_api_key = app_config.admin_config["admin_api_key"]
+    if not admin_api_key:
+        raise HTTPException(status_code=403, detail="管理接口未启用")
+    provided = request.headers.get("X-Admin-Key", "")
+    if not hmac.compare_digest(provided.encode("utf8"), admin_api_key.encode("utf8")):
+        raise HTTPException(status_code=403, detail="无权访问管理接口")
+    return True
+
+
 async def get_current_user_from_request(request: Request):
     """从请求中获取当前用户信息"""
     token = get_token_from_request(request)
     if not token:
         raise HTTPException(status_code=401, detail="未提供认证信息")
     
-    return get_current_user(token)
+    return await get_current_user(token)
 
 
 # 获取当前用户信息
-def get_current_user(token: str):
-    # 检查token是否已被加入黑名单
-    result = redis_client.get(token)
-    if result == 'expired':
+async def get_current_user(token: str):
+    # 检查token是否已被加入黑名单（优先查询进程内负缓存）
+    if await token_blacklist.is_revoked(token):
         raise HTTPException(status_code=401, detail="Token 已失效")
     # 1. 解码JWT并获取数据
     data = decode_jwt(token)
-    logger.debug("data:" + str(data))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("data:" + str(data))
 
     if not data:
         # 如果 token 无效或已过期，返回 401 错误
@@ -129,7 +163,8 @@ def get_user_from_token(token: str):
     """
     # 直接解码JWT并获取数据，不检查Redis黑名单
     data = decode_jwt(token)
-    logger.debug("data:" + str(data))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("data:" + str(data))
 
     if not data:
         # 如果 token 无效或已过期，返回 401 错误
@@ -151,10 +186,79 @@ async def get_user_from_request_without_blacklist(request: Request):
     return get_user_from_token(token)
 
 
+# 验证码短信模板
+SMS_TEMPLATE_CODES = {
+    REDIS_USER_REGISTER_CODE: 'SMS_476785298',  # 注册
+    REDIS_USER_LOGIN_CODE: 'SMS_476855314',  # 登录
+    REDIS_USER_RESET_CODE: 'SMS_476695363',  # 重置密码
+}
+
+
+PHONE_PATTERN = re.compile(r"^1[3-9]\d{9}$")
+
+# 验证码用途：沿用原来的 Redis 前缀常量作为标识，存储在同一个哈希的不同字段中
+CODE_PURPOSES = {
+    REDIS_USER_REGISTER_CODE: "register",
+    REDIS_USER_LOGIN_CODE: "login",
+    REDIS_USER_RESET_CODE: "reset",
+}
+
+CODE_VERIFIED = 1
+CODE_MISSING = 0
+CODE_EXPIRED = -1
+CODE_MISMATCH = -2
+CODE_EXHAUSTED = -3
+CODE_ERRORS = {
+    CODE_MISSING: "验证码不存在或已使用，请重新获取！",
+    CODE_EXPIRED: "验证码已过期！",
+    CODE_MISMATCH: "验证码错误！",
+    CODE_EXHAUSTED: "验证码错误次数过多，请重新获取！",
+}
+
+# KEYS[1]: 手机号的验证码哈希；ARGV: 用途、验证码、有效期（秒）
+# 新验证码覆盖同用途的旧验证码并清零失败次数；过期时刻按 Redis 服务器时间计算，与校验脚本一致。
+# 各用途的有效期相同，刷新整个哈希的过期时间即可
+ISSUE_CODE_SCRIPT = """
+local purpose = ARGV[1]
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+redis.call('HSET', KEYS[1], purpose, ARGV[2], purpose .. ':exp', tostring(now_ms + tonumber(ARGV[3]) * 1000))
+redis.call('HDEL', KEYS[1], purpose .. ':fails')
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# KEYS[1]: 手机号的验证码哈希；ARGV: 用途、待校验的验证码、最多失败次数
+VERIFY_CODE_SCRIPT = """
+local purpose = ARGV[1]
+local exp_field = purpose .. ':exp'
+local fails_field = purpose .. ':fails'
+local state = redis.call('HMGET', KEYS[1], purpose, exp_field)
+if not state[1] then
+    return 0
+end
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+if tonumber(state[2] or '0') <= now_ms then
+    redis.call('HDEL', KEYS[1], purpose, exp_field, fails_field)
+    return -1
+end
+if state[1] == ARGV[2] then
+    redis.call('HDEL', KEYS[1], purpose, exp_field, fails_field)
+    return 1
+end
+local fails = redis.call('HINCRBY', KEYS[1], fails_field, 1)
+if fails >= tonumber(ARGV[3]) then
+    redis.call('HDEL', KEYS[1], purpose, exp_field, fails_field)
+    return -3
+end
+return -2
+"""
+
+
 async def get_code(phone: str, REDIS_PATH: str):
     # 验证手机号格式
-    phone_regex = re.compile(r"^1[3-9]\d{9}$")
-    if not phone_regex.match(phone):
+    if not PHONE_PATTERN.match(phone):
         logger.error(f"手机号格式不正确！")
         raise HTTPException(status_code=400, detail="手机号格式不正确！")
 
@@ -164,37 +268,27 @@ async def get_code(phone: str, REDIS_PATH: str):
     seed = timestamp + random.randint(0, 9999)
     # 生成随机验证码
     code = (seed % 900000) + 100000
-    # 注册
-    # SMS_476785298
-    # 登录
-    # SMS_476855314
-    # 重置密码
-    # SMS_476695363
-    if REDIS_PATH == REDIS_USER_REGISTER_CODE:
-        await SendSms.exec(phone, 'SMS_476785298', str(code))
-    elif REDIS_PATH == REDIS_USER_LOGIN_CODE:
-        await SendSms.exec(phone, 'SMS_476855314', str(code))
-    elif REDIS_PATH == REDIS_USER_RESET_CODE:
-        await SendSms.exec(phone, 'SMS_476695363', str(code))
-
-    # 存储验证码到Redis中
-    result = redis_client.set(REDIS_PATH + phone, str(code), ex=300)  # 过期时间五分钟
-    # todo 发送验证码到手机
+    # 先存储验证码到Redis中，再提交到短信后台发送队列，接口不等待短信服务商响应
+    purpose = CODE_PURPOSES[REDIS_PATH]
+    expire_seconds = app_config["verification_code"]["expire_seconds"]
+    await redis_client.eval(ISSUE_CODE_SCRIPT, 1, REDIS_USER_CODE + phone, purpose, str(code), expire_seconds)
+    template_code = SMS_TEMPLATE_CODES.get(REDIS_PATH)
+    if template_code and not await SendSms.exec(phone, template_code, str(code)):
+        raise HTTPException(status_code=503, detail="短信发送繁忙，请稍后重试")
     logger.info(f"验证码发送到手机号 {phone}: {code}")
     return str(code)
 
 
-# 验证码校验
+# 验证码校验：比较、删除、失败计数在一个脚本中完成，校验成功后验证码立即失效，不能重复使用
 async def check_code(code: str, phone: str, REDIS_PATH: str):
-    redis_code = redis_client.get(REDIS_PATH + phone)
-    logger.info(f"检查代码中ing")
-    # 验证码校验
-    if code != redis_code:
-        raise HTTPException(status_code=400, detail="验证码错误！")
-    ttl = redis_client.ttl(REDIS_PATH + phone)
-    if ttl <= 0:
-        raise HTTPException(status_code=400, detail="验证码已过期！")
-    return True
+    max_attempts = app_config["verification_code"]["max_attempts"]
+    result = await redis_client.eval(
+        VERIFY_CODE_SCRIPT, 1, REDIS_USER_CODE + phone, CODE_PURPOSES[REDIS_PATH], str(code or ""), max_attempts
+    )
+    result = int(result)
+    if result == CODE_VERIFIED:
+        return True
+    raise HTTPException(status_code=400, detail=CODE_ERRORS[result])
 
 def generate_account():
     """基于时间戳和随机数生成唯一的7位账号"""
@@ -0,0 +1,496 @@
+"""
+用户数据批量导入
+- 流式读取 NDJSON / JSON 数组 / CSV 备份文件，内存占用只与批大小有关
+- 每批数据通过 asyncpg COPY 写入会话级临时表，再用 INSERT ... ON CONFLICT 合并到
+  users、user_profiles、user_vip、user_identities，一批一个事务
+- 每批提交后写入断点文件，中断后重新执行会跳过已导入的记录
+
+记录格式（NDJSON 每行一个对象）：
+    {"user_id": "...", "phone": "...", "account": "...", "username": "...", "password": "...",
+     "profile": {"nickname": "...", ...}, "vip_info": {"vip_level": 1, ...},
+     "identities": [{"identity_type": "...", "identity_value": "...", "is_verified": true}]}
+CSV 中档案与会员字段使用 profile.nickname、vip_info.vip_level 形式的列名，identities 列为 JSON 字符串。
+"""
+import csv
+import json
+import os
+import re
+import time
+import uuid
+import logging
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from tortoise import connections
+
+logger = logging.getLogger("app")
+
+# 各表导入的列：(列名, 临时表列类型, 缺失时的默认值表达式)
+USER_COLUMNS = [
+    ("user_id", "uuid", None),
+    ("phone", "varchar(20)", None),
+    ("account", "varchar(100)", None),
+    ("username", "varchar(100)", None),
+    ("password", "varchar(255)", None),
+    ("points", "int", "0"),
+    ("invitation_code", "varchar(20)", None),
+    ("created_at", "timestamptz", "now()"),
+    ("updated_at", "timestamptz", "now()"),
+    ("last_login", "timestamptz", None),
+    ("is_active", "boolean", "TRUE"),
+    ("is_verified", "boolean", "FALSE"),
+]
+PROFILE_COLUMNS = [
+    ("user_id", "uuid", None),
+    ("nickname", "varchar(100)", None),
+    ("email", "varchar(254)", None),
+    ("avatar", "text", None),
+    ("signature", "text", None),
+    ("gender", "varchar(10)", None),
+    ("age", "int", None),
+    ("birthday", "date", None),
+    ("address", "jsonb", None),
+    ("created_at", "timestamptz", "now()"),
+    ("updated_at", "timestamptz", "now()"),
+]
+VIP_COLUMNS = [
+    ("user_id", "uuid", None),
+    ("vip_level", "int", "0"),
+    ("vip_type", "varchar(50)", None),
+    ("vip_start_time", "timestamptz", None),
+    ("vip_end_time", "timestamptz", None),
+    ("created_at", "timestamptz", "now()"),
+    ("updated_at", "timestamptz", "now()"),
+]
+IDENTITY_COLUMNS = [
+    ("user_id", "uuid", None),
+    ("identity_type", "varchar(50)", None),
+    ("identity_value", "varchar(255)", None),
+    ("is_verified", "boolean", "FALSE"),
+    ("created_at", "timestamptz", "now()"),
+    ("updated_at", "timestamptz", "now()"),
+]
+
+# (目标表, 临时表, 列定义, 冲突键)，按外键依赖顺序合并
+IMPORT_TABLES = [
+    ("users", "import_users", USER_COLUMNS, ("user_id",)),
+    ("user_profiles", "import_user_profiles", PROFILE_COLUMNS, ("user_id",)),
+    ("user_vip", "import_user_vip", VIP_COLUMNS, ("user_id",)),
+    ("user_identities", "import_user_identities", IDENTITY_COLUMNS, ("identity_type", "identity_value")),
+]
+
+IMPORT_MODES = ("skip", "update")
+CHECKPOINT_VERSION = 1
+JSON_SEPARATOR = re.compile(r"[\s,]*")
+
+
+def _staging_sql(staging: str, columns) -> str:
+    """会话级临时表，事务提交时自动清空，每批复用"""
+    column_defs = ", ".join(f"{name} {column_type}" for name, column_type, _ in columns)
+    return f"CREATE TEMP TABLE IF NOT EXISTS {staging} ({column_defs}) ON COMMIT DELETE ROWS"
+
+
+def _merge_sql(table: str, staging: str, columns, conflict: Tuple[str, ...], mode: str) -> str:
+    """生成从临时表合并到目标表的语句，返回 (user_id, 是否新插入)
+
+    - 同一批内冲突键重复时只保留最后一条（DISTINCT ON 按 ctid 倒序）
+    - skip 模式下与已有数据冲突（包括手机号、账户名等唯一约束）的记录被跳过
+    - update 模式下按冲突键覆盖已有数据；子表只导入目标库中存在的用户
+    """
+    names = [name for name, _, _ in columns]
+    select_exprs = [f"COALESCE(s.{name}, {default})" if default else f"s.{name}" for name, _, default in columns]
+    join = "" if table == "users" else " JOIN users u ON u.user_id = s.user_id"
+    key = ", ".join(f"s.{name}" for name in conflict)
+    sql = (
+        f"INSERT INTO {table} ({', '.join(names)}) "
+        f"SELECT DISTINCT ON ({key}) {', '.join(select_exprs)} FROM {staging} s{join} "
+        f"ORDER BY {key}, s.ctid DESC "
+    )
+    if mode == "update":
+        updates = ", ".join(f"{name} = EXCLUDED.{name}" for name in names
+                            if name not in conflict and name != "created_at")
+        sql += f"ON CONFLICT ({', '.join(conflict)}) DO UPDATE SET {updates} "
+    else:
+        sql += "ON CONFLICT DO NOTHING "
+    # xmax = 0 表示本次插入的新行，否则为被更新的已有行
+    return sql + "RETURNING user_id, (xmax = 0) AS inserted"
+
+
+def _to_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        result = value
+    elif isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    else:
+        result = datetime.fromisoformat(str(value))
+    # 不带时区的时间按 UTC 处理
+    return result if result.tzinfo else result.replace(tzinfo=timezone.utc)
+
+
+def _to_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "t", "yes", "y")
+    return bool(value)
+
+
+def _to_json(value) -> str:
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+CONVERTERS = {
+    "uuid": lambda value: value if isinstance(value, uuid.UUID) else uuid.UUID(str(value)),
+    "int": int,
+    "boolean": _to_bool,
+    "timestamptz": _to_datetime,
+    "date": _to_date,
+    "jsonb": _to_json,
+}
+
+
+def _convert_row(data: Dict[str, Any], columns, user_id: uuid.UUID) -> tuple:
+    row = [user_id]
+    for name, column_type, _ in columns[1:]:
+        value = data.get(name)
+        converter = CONVERTERS.get(column_type)
+        if value is None or (value == "" and converter is not None):
+            row.append(None)
+        else:
+            row.append(converter(value) if converter else str(value))
+    return tuple(row)
+
+
+def convert_record(record: Dict[str, Any]) -> Tuple[tuple, Optional[tuple], Optional[tuple], List[tuple]]:
+    """把一条用户记录转换为各临时表的行，数据不合法时抛出 ValueError"""
+    if not isinstance(record, dict):
+        raise ValueError("记录不是 JSON 对象")
+    for field in ("account", "username", "password"):
+        if not record.get(field):
+            raise ValueError(f"缺少字段 {field}")
+    user_id = record.get("user_id")
+    user_id = CONVERTERS["uuid"](user_id) if user_id else uuid.uuid4()
+    try:
+        user_row = _convert_row(record, USER_COLUMNS, user_id)
+        profile = record.get("profile")
+        if profile and not isinstance(profile, dict):
+            raise ValueError("profile 必须是 JSON 对象")
+        profile_row = _convert_row(profile, PROFILE_COLUMNS, user_id) if profile else None
+        vip = record.get("vip_info")
+        if vip and not isinstance(vip, dict):
+            raise ValueError("vip_info 必须是 JSON 对象")
+        vip_row = _convert_row(vip, VIP_COLUMNS, user_id) if vip else None
+        identities = record.get("identities") or []
+        if isinstance(identities, str):
+            identities = json.loads(identities)
+        if not isinstance(identities, list):
+            raise ValueError("identities 必须是 JSON 数组")
+        identity_rows = []
+        for identity in identities:
+            if not isinstance(identity, dict):
+                raise ValueError("identities 中的每一项必须是 JSON 对象")
+            if not identity.get("identity_type") or not identity.get("identity_value"):
+                raise ValueError("身份信息缺少 identity_type 或 identity_value")
+            identity_rows.append(_convert_row(identity, IDENTITY_COLUMNS, user_id))
+    except (TypeError, AttributeError) as e:
+        raise ValueError(str(e)) from e
+    return user_row, profile_row, vip_row, identity_rows
+
+
+def detect_format(path: str) -> str:
+    """根据扩展名与文件首字符判断输入格式：ndjson、json（顶层数组）或 csv"""
+    if path.lower().endswith(".csv"):
+        return "csv"
+    with open(path, "rb") as f:
+        while True:
+            char = f.read(1)
+            if not char or not char.isspace():
+                break
+    return "json" if char == b"[" else "ndjson"
+
+
+def _iter_ndjson(path: str, skip: int) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if skip:
+                # 跳过已导入的记录时不解析 JSON
+                skip -= 1
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # 原样交给调用方，作为无效记录处理
+                yield line.rstrip("\n")
+
+
+def _iter_json_array(path: str, skip: int, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """逐个解析顶层 JSON 数组中的对象，缓冲区只保存尚未解析完的部分"""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size)
+        while buffer.isspace():
+            buffer = f.read(chunk_size) or ""
+        buffer = buffer.lstrip()
+        if not buffer.startswith("["):
+            raise ValueError("JSON 文件的顶层必须是数组")
+        pos = 1
+        eof = False
+        while True:
+            pos = JSON_SEPARATOR.match(buffer, pos).end()
+            if buffer.startswith("]", pos):
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+                # 数字等没有结束符的值可能在缓冲区末尾被截断，读入更多数据后重新解析
+                if end == len(buffer) and not eof:
+                    raise json.JSONDecodeError("缓冲区末尾的值可能不完整", buffer, end)
+            except json.JSONDecodeError:
+                if eof:
+                    if buffer[pos:].strip():
+                        raise
+                    raise ValueError("JSON 数组没有结束（缺少 ]），文件可能不完整")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            pos = end
+            if skip:
+                skip -= 1
+                continue
+            yield record
+
+
+def _iter_csv(path: str, skip: int) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            if skip:
+                skip -= 1
+                continue
+            record: Dict[str, Any] = {}
+            for column, value in row.items():
+                if column is None:
+                    continue
+                value = value if value != "" else None
+                if "." in column:
+                    group, name = column.split(".", 1)
+                    if value is not None:
+                        record.setdefault(group, {})[name] = value
+                else:
+                    record[column] = value
+            yield record
+
+
+def iter_records(path: str, fmt: str, skip: int = 0) -> Iterator[Dict[str, Any]]:
+    """流式读取用户记录，跳过前 skip 条"""
+    if fmt == "csv":
+        return _iter_csv(path, skip)
+    if fmt == "json":
+        return _iter_json_array(path, skip)
+    return _iter_ndjson(path, skip)
+
+
+class ImportCheckpoint:
+    """导入断点文件，记录已提交的记录数与累计结果"""
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.state: Dict[str, Any] = self._initial_state()
+
+    def _initial_state(self) -> Dict[str, Any]:
+        stat = os.stat(self.source)
+        return {
+            "version": CHECKPOINT_VERSION,
+            "source": self.source,
+            "source_size": stat.st_size,
+            "source_mtime": int(stat.st_mtime),
+            "records": 0,
+            "inserted": 0,
+            "updated": 0,
+            "skipped": 0,
+            "invalid": 0,
+            "completed": False,
+        }
+
+    def load(self) -> bool:
+        """读取断点，源文件发生变化时拒绝续传"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        current = self._initial_state()
+        for key in ("source", "source_size", "source_mtime"):
+            if state.get(key) != current[key]:
+                raise ValueError(f"断点文件 {self.path} 与源文件不匹配（{key}），请使用 --restart 重新导入")
+        self.state.update(state)
+        return True
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class UserImporter:
+    """用户数据导入器
+
+    - batch_size: 每个事务导入的记录数
+    - mode: skip 跳过已存在的数据；update 按主键/唯一键覆盖已存在的数据
+    - reject_path: 无法解析的记录写入该文件（JSON Lines），为空时只计数
+    """
+
+    def __init__(self, batch_size: int = 5000, mode: str = "skip", reject_path: Optional[str] = None,
+                 progress_interval: float = 5.0, connection_name: str = "default"):
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"不受支持的导入模式 {mode}，支持：{', '.join(IMPORT_MODES)}")
+        self.batch_size = batch_size
+        self.mode = mode
+        self.reject_path = reject_path
+        self.progress_interval = progress_interval
+        self.connection_name = connection_name
+        self._merge_sqls = [(staging, _merge_sql(table, staging, columns, conflict, mode))
+                            for table, staging, columns, conflict in IMPORT_TABLES]
+
+    async def run(self, source: str, checkpoint_path: Optional[str] = None, restart: bool = False) -> Dict[str, Any]:
+        """导入 source 中的用户数据，返回累计结果"""
+        checkpoint = ImportCheckpoint(checkpoint_path or source + ".checkpoint", source)
+        if restart:
+            checkpoint.remove()
+        elif checkpoint.load():
+            if checkpoint.state["completed"]:
+                logger.info(f"{source} 已导入完成，如需重新导入请使用 --restart")
+                return checkpoint.state
+            logger.info(f"从断点继续导入，跳过已提交的 {checkpoint.state['records']} 条记录")
+
+        state = checkpoint.state
+        fmt = detect_format(source)
+        records = iter_records(source, fmt, skip=state["records"])
+        reject_file = open(self.reject_path, "a", encoding="utf-8") if self.reject_path else None
+        started = time.monotonic()
+        last_report = started
+        imported_before = state["records"]
+        try:
+            async with connections.get(self.connection_name).acquire_connection() as connection:
+                for _, staging, columns, _ in IMPORT_TABLES:
+                    await connection.execute(_staging_sql(staging, columns))
+                try:
+                    while True:
+                        batch, consumed, invalid = self._read_batch(records, state["records"], reject_file)
+                        if not consumed:
+                            break
+                        result = await self._import_batch(connection, batch) if batch[0] else (0, 0, [])
+                        inserted, updated, touched_ids = result
+                        state["records"] += consumed
+                        state["inserted"] += inserted
+                        state["updated"] += updated
+                        state["skipped"] += len(batch[0]) - inserted - updated
+                        state["invalid"] += invalid
+                        if reject_file is not None:
+                            reject_file.flush()
+                        checkpoint.save()
+                        if touched_ids:
+                            await self._invalidate_profiles(touched_ids)
+                        now = time.monotonic()
+                        if now - last_report >= self.progress_interval:
+                            last_report = now
+                            self._report(state, imported_before, now - started)
+                finally:
+                    for _, staging, _, _ in IMPORT_TABLES:
+                        await connection.execute(f"DROP TABLE IF EXISTS {staging}")
+        finally:
+            if reject_file is not None:
+                reject_file.close()
+
+        state["completed"] = True
+        checkpoint.save()
+        self._report(state, imported_before, time.monotonic() - started)
+        await self._reset_statistics()
+        return state
+
+    def _read_batch(self, records: Iterator[Dict[str, Any]], offset: int, reject_file):
+        """读取一批记录并转换为各临时表的行，返回 (各表行, 消耗的记录数, 无效记录数)"""
+        users, profiles, vips, identities = [], [], [], []
+        consumed = invalid = 0
+        for record in records:
+            consumed += 1
+            try:
+                user_row, profile_row, vip_row, identity_rows = convert_record(record)
+            except ValueError as e:
+                invalid += 1
+                logger.warning(f"第 {offset + consumed} 条记录无效: {e}")
+                if reject_file is not None:
+                    reject_file.write(json.dumps({"index": offset + consumed, "error": str(e), "record": record},
+                                                 ensure_ascii=False, default=str) + "\n")
+            else:
+                users.append(user_row)
+                if profile_row:
+                    profiles.append(profile_row)
+                if vip_row:
+                    vips.append(vip_row)
+                identities.extend(identity_rows)
+            if consumed >= self.batch_size:
+                break
+        return (users, profiles, vips, identities), consumed, invalid
+
+    async def _import_batch(self, connection, batch) -> Tuple[int, int, List[str]]:
+        """在一个事务中 COPY 一批数据到临时表并合并，返回 (新增用户数, 更新用户数, 数据有变化的已有用户ID)"""
+        inserted = updated = 0
+        new_ids, touched_ids = set(), []
+        async with connection.transaction():
+            for (table, staging, columns, _), rows in zip(IMPORT_TABLES, batch):
+                if rows:
+                    await connection.copy_records_to_table(
+                        staging, records=rows, columns=[name for name, _, _ in columns])
+            for (staging, sql), rows in zip(self._merge_sqls, batch):
+                if not rows:
+                    continue
+                result = await connection.fetch(sql)
+                if staging == "import_users":
+                    for row in result:
+                        if row["inserted"]:
+                            inserted += 1
+                            new_ids.add(row["user_id"])
+                        else:
+                            updated += 1
+                            touched_ids.append(row["user_id"])
+                else:
+                    # 已有用户的档案、会员或身份信息发生变化，需要使其缓存失效
+                    touched_ids.extend(row["user_id"] for row in result if row["user_id"] not in new_ids)
+        return inserted, updated, [str(user_id) for user_id in dict.fromkeys(touched_ids)]
+
+    async def _invalidate_profiles(self, user_ids: List[str]):
+        from app.utils.database_replica import read_router
+        from app.utils.profile_cache import profile_cache
+        await read_router.mark_written(user_ids)
+        await profile_cache.invalidate_many(user_ids)
+
+    async def _reset_statistics(self):
+        """导入绕过了 UserRepository，删除 Redis 中的统计计数器，下次读取时从数据库重建"""
+        from app.config.constant import REDIS_USER_STATISTICS
+        from app.utils.database_redis import redis_client
+        try:
+            await redis_client.delete(REDIS_USER_STATISTICS)
+        except Exception as e:
+            logger.warning(f"重置用户统计计数器失败: {e}")
+
+    @staticmethod
+    def _report(state: Dict[str, Any], imported_before: int, elapsed: float):
+        processed = state["records"] - imported_before
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        logger.info(
+            f"已处理 {state['records']} 条记录（新增 {state['inserted']}，更新 {state['updated']}，"
+            f"跳过 {state['skipped']}，无效 {state['invalid']}），{rate:.0f} 条/秒"
+        )
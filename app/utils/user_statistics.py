@@ -0,0 +1,70 @@
+"""
+用户统计计数器
+在 Redis 哈希中维护用户统计数据，由 UserRepository 的写操作增量更新，读取代价为一次 HGETALL。
+哈希不存在时由调用方用一次聚合查询重建；哈希带有过期时间，定期从数据库重建以消除累积误差。
+"""
+import logging
+from typing import Dict, Optional
+
+from app.config.constant import REDIS_USER_STATISTICS
+from app.utils.database_redis import redis_client
+
+logger = logging.getLogger("app")
+
+STATISTICS_FIELDS = ("total_users", "active_users", "verified_users", "vip_users")
+
+# 仅在计数器已存在时增量更新，避免在重建前写入不完整的计数
+INCREMENT_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 1, #ARGV, 2 do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+return 1
+"""
+
+# 仅在计数器不存在时写入重建结果，避免覆盖其他 worker 已经重建并增量更新过的计数
+SEED_IF_MISSING_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+class UserStatisticsCounters:
+    """Redis 中的用户统计计数器"""
+
+    def __init__(self, key: str = REDIS_USER_STATISTICS, ttl: int = 86400):
+        self.key = key
+        self.ttl = ttl
+
+    async def get(self) -> Optional[Dict[str, int]]:
+        """读取计数器，不存在时返回 None"""
+        data = await redis_client.hgetall(self.key)
+        if not data or any(field not in data for field in STATISTICS_FIELDS):
+            return None
+        return {field: int(data[field]) for field in STATISTICS_FIELDS}
+
+    async def seed(self, statistics: Dict[str, int]):
+        """用数据库聚合结果初始化计数器"""
+        args = [self.ttl]
+        for field in STATISTICS_FIELDS:
+            args.extend([field, int(statistics[field])])
+        await redis_client.eval(SEED_IF_MISSING_SCRIPT, 1, self.key, *args)
+
+    async def increment(self, **deltas: int):
+        """增量更新计数器，失败时只记录日志（计数器会在过期后从数据库重建）"""
+        args = []
+        for field, delta in deltas.items():
+            if delta:
+                args.extend([field, int(delta)])
+        if not args:
+            return
+        try:
+            await redis_client.eval(INCREMENT_IF_EXISTS_SCRIPT, 1, self.key, *args)
+        except Exception as e:
+            logger.error(f"更新用户统计计数器失败: {e}")
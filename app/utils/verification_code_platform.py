@@ -1,57 +1,314 @@
-
+"""
+短信发送平台
+- SmsProvider 为短信服务商接口，AliyunSmsProvider 复用同一个阿里云客户端，StubSmsProvider 用于本地测试与压测
+- SmsDispatcher 为后台异步发送队列：并发数有限，失败按指数退避重试，重试耗尽后写入死信日志
+"""
+import abc
+import asyncio
 import json
-from alibabacloud_dysmsapi20170525.client import Client as Dysmsapi20170525Client
-from alibabacloud_tea_openapi import models as open_api_models
-from alibabacloud_dysmsapi20170525 import models as dysmsapi_20170525_models
-from alibabacloud_tea_util import models as util_models
-from alibabacloud_tea_util.client import Client as UtilClient
-
+import os
+import random
+import time
+import logging
+from collections import deque
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
 from app import app_config
-verification_code_config=app_config.verification_code_config
+from app.utils.metrics import CallbackMetric, sms_send_duration_seconds
 
-class SendSms:
-    def __init__(self):
-        pass
+if TYPE_CHECKING:
+    from alibabacloud_dysmsapi20170525.client import Client as Dysmsapi20170525Client
 
-    @staticmethod
-    def create_client() -> Dysmsapi20170525Client:
+logger = logging.getLogger("app")
+
+
+class SmsSendError(Exception):
+    """短信发送失败"""
+
+
+class SmsProvider(abc.ABC):
+    """短信服务商接口，子类必须实现 send"""
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def send(self, phone_numbers: str, template_code: str, template_param: Dict[str, Any]) -> None:
+        """发送一条短信，失败时抛出异常"""
+
+    async def close(self):
+        """释放服务商客户端持有的资源"""
+
+    async def check(self):
+        """检查服务商客户端是否可用（不发送短信），不可用时抛出异常"""
+
+
+class AliyunSmsProvider(SmsProvider):
+    """阿里云短信服务，客户端在首次发送时创建并在进程内复用
+
+    阿里云 SDK 导入较慢，在首次创建客户端时才导入（放到线程中执行，不阻塞事件循环）
+    """
+
+    name = "aliyun"
+
+    def __init__(self, verification_code_config):
+        self.verification_code_config = verification_code_config
+        self._client: Optional["Dysmsapi20170525Client"] = None
+
+    def create_client(self) -> "Dysmsapi20170525Client":
         """
         使用AK&SK初始化账号Client
         @return: Client
         @throws Exception
         """
-        
+        from alibabacloud_dysmsapi20170525.client import Client as Dysmsapi20170525Client
+        from alibabacloud_tea_openapi import models as open_api_models
+
         # 工程代码泄露可能会导致 AccessKey 泄露，并威胁账号下所有资源的安全性。以下代码示例仅供参考。
         # 建议使用更安全的 STS 方式，更多鉴权访问方式请参见：https://help.aliyun.com/document_detail/378659.html。
         config = open_api_models.Config(
             # 必填，请确保代码运行环境设置了环境变量 ALIBABA_CLOUD_ACCESS_KEY_ID。,
-            access_key_id=verification_code_config["alibaba_cloud_accesskey_id"],
+            access_key_id=self.verification_code_config["alibaba_cloud_accesskey_id"],
             # 必填，请确保代码运行环境设置了环境变量 ALIBABA_CLOUD_ACCESS_KEY_SECRET。,
-            access_key_secret=verification_code_config["alibaba_cloud_accesskey_secret"]
+            access_key_secret=self.verification_code_config["alibaba_cloud_accesskey_secret"]
         )
         # Endpoint 请参考 https://api.aliyun.com/product/Dysmsapi
         config.endpoint = f'dysmsapi.aliyuncs.com'
         return Dysmsapi20170525Client(config)
 
-    @staticmethod
-    async def exec(phone_numbers : str, template_code : str, code : str) -> None:
-        client = SendSms.create_client()
+    async def get_client(self) -> "Dysmsapi20170525Client":
+        if self._client is None:
+            self._client = await asyncio.to_thread(self.create_client)
+        return self._client
+
+    async def check(self):
+        if not (self.verification_code_config["alibaba_cloud_accesskey_id"]
+                and self.verification_code_config["alibaba_cloud_accesskey_secret"]):
+            raise SmsSendError("未配置阿里云 AccessKey")
+        await self.get_client()
+
+    async def send(self, phone_numbers: str, template_code: str, template_param: Dict[str, Any]) -> None:
+        client = await self.get_client()
+        from alibabacloud_dysmsapi20170525 import models as dysmsapi_20170525_models
+        from alibabacloud_tea_util import models as util_models
+
         send_sms_request = dysmsapi_20170525_models.SendSmsRequest(
-            sign_name = verification_code_config["sign_name"],
+            sign_name = self.verification_code_config["sign_name"],
             phone_numbers = phone_numbers,
             template_code = str(template_code),
-            template_param=json.dumps({"code": code}),
+            template_param=json.dumps(template_param),
             sms_up_extend_code=''
         )
         runtime = util_models.RuntimeOptions()
+        if hasattr(client, "send_sms_with_options_async"):
+            response = await client.send_sms_with_options_async(send_sms_request, runtime)
+        else:
+            # 旧版本SDK没有异步接口，放到线程中执行，避免阻塞事件循环
+            response = await asyncio.to_thread(client.send_sms_with_options, send_sms_request, runtime)
+        body = getattr(response, "body", None)
+        if body is not None and getattr(body, "code", "OK") != "OK":
+            raise SmsSendError(f"{body.code}: {body.message}")
+
+
+class StubSmsProvider(SmsProvider):
+    """本地桩实现：不发送短信，只记录最近的发送请求，可模拟延迟"""
+
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0, max_records: int = 1000):
+        self.latency = latency
+        self.sent = deque(maxlen=max_records)
+
+    async def send(self, phone_numbers: str, template_code: str, template_param: Dict[str, Any]) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent.append((phone_numbers, template_code, dict(template_param)))
+        logger.debug(f"[StubSms] {phone_numbers} {template_code} {template_param}")
+
+
+def create_sms_provider(verification_code_config=None) -> SmsProvider:
+    """根据配置创建短信服务商"""
+    verification_code_config = verification_code_config or app_config.verification_code_config
+    provider = verification_code_config["provider"]
+    if provider == "stub":
+        return StubSmsProvider()
+    if provider == "aliyun":
+        return AliyunSmsProvider(verification_code_config)
+    raise ValueError(f"不受支持的短信服务商 {provider}，支持的服务商有：aliyun, stub")
+
+
+class SmsDispatcher:
+    """短信后台发送队列
+
+    - submit() 只负责入队并立即返回，接口无需等待短信服务商响应
+    - concurrency 个后台任务并发消费队列，单条短信失败后按指数退避（带抖动）重试 max_retries 次
+    - 重试耗尽的短信写入死信日志（JSON Lines，不记录模板参数中的验证码）
+    """
+
+    def __init__(
+        self,
+        provider: SmsProvider,
+        concurrency: int = 4,
+        queue_size: int = 1000,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 10.0,
+        dead_letter_path: str = "data/sms_dead_letter.log",
+    ):
+        self.provider = provider
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dead_letter_path = dead_letter_path
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self.sent_count = 0
+        self.failed_count = 0
+        self.retry_count = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers) and not all(worker.done() for worker in self._workers)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        """启动后台发送任务"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info(f"短信发送队列已启动（服务商: {self.provider.name}，并发数: {self.concurrency}）")
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """停止后台发送任务，先在 drain_timeout 秒内尽量发送完队列中的短信"""
+        if not self._workers:
+            return
         try:
-            # 复制代码运行请自行打印 API 的返回值
-            client.send_sms_with_options(send_sms_request, runtime)
-        except Exception as error:
-            # 此处仅做打印展示，请谨慎对待异常处理，在工程项目中切勿直接忽略异常。
-            # 错误 message
-            print(error.message)
-            # 诊断地址
-            print(error.data.get("Recommend"))
-            UtilClient.assert_as_string(error.message)
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"短信发送队列关闭时仍有 {self.queue_depth} 条短信未发送")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.provider.close()
+
+    def submit(self, phone_numbers: str, template_code: str, template_param: Dict[str, Any]) -> bool:
+        """提交一条短信到发送队列，队列已满或未启动时返回 False"""
+        if self._queue is None:
+            logger.error("短信发送队列未启动")
+            return False
+        try:
+            self._queue.put_nowait((phone_numbers, template_code, template_param))
+            return True
+        except asyncio.QueueFull:
+            logger.warning("短信发送队列已满")
+            return False
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._deliver(*item)
+            except Exception as e:
+                logger.error(f"短信发送任务异常: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, phone_numbers: str, template_code: str, template_param: Dict[str, Any]):
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                await self.provider.send(phone_numbers, template_code, template_param)
+                sms_send_duration_seconds.labels(self.provider.name, "ok").observe(time.perf_counter() - start)
+                self.sent_count += 1
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                sms_send_duration_seconds.labels(self.provider.name, "error").observe(time.perf_counter() - start)
+                attempt += 1
+                if attempt > self.max_retries:
+                    self.failed_count += 1
+                    logger.error(f"短信发送失败，已重试 {self.max_retries} 次: {phone_numbers} {e}")
+                    await self._dead_letter(phone_numbers, template_code, attempt, e)
+                    return
+                self.retry_count += 1
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+                delay *= random.uniform(0.5, 1.0)
+                logger.warning(f"短信发送失败，{delay:.2f} 秒后第 {attempt} 次重试: {e}")
+                await asyncio.sleep(delay)
+
+    async def _dead_letter(self, phone_numbers: str, template_code: str, attempts: int, error: Exception):
+        record = json.dumps({
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "provider": self.provider.name,
+            "phone_numbers": phone_numbers,
+            "template_code": template_code,
+            "attempts": attempts,
+            "error": str(error),
+        }, ensure_ascii=False)
+        try:
+            await asyncio.to_thread(self._append_line, self.dead_letter_path, record)
+        except Exception as e:
+            logger.error(f"写入短信死信日志失败: {e} {record}")
+
+    @staticmethod
+    def _append_line(path: str, line: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider.name,
+            "queue_depth": self.queue_depth,
+            "queue_size": self.queue_size,
+            "sent": self.sent_count,
+            "retries": self.retry_count,
+            "failed": self.failed_count,
+        }
+
+
+sms_dispatch_config = app_config["sms_dispatch"]
+sms_dispatcher = SmsDispatcher(
+    create_sms_provider(),
+    concurrency=sms_dispatch_config["concurrency"],
+    queue_size=sms_dispatch_config["queue_size"],
+    max_retries=sms_dispatch_config["max_retries"],
+    backoff_base=sms_dispatch_config["backoff_base"],
+    backoff_max=sms_dispatch_config["backoff_max"],
+    dead_letter_path=sms_dispatch_config["dead_letter_path"],
+)
+
+
+def _reload_sms_dispatch_config():
+    # concurrency、queue_size 与 dead_letter_path 需要重启生效
+    sms_dispatcher.max_retries = sms_dispatch_config["max_retries"]
+    sms_dispatcher.backoff_base = sms_dispatch_config["backoff_base"]
+    sms_dispatcher.backoff_max = sms_dispatch_config["backoff_max"]
+
+
+app_config.add_reload_listener(_reload_sms_dispatch_config)
+
+CallbackMetric("sms_queue_depth", "短信发送队列中等待发送的短信数",
+               lambda: [((), sms_dispatcher.queue_depth)])
+CallbackMetric("sms_messages_total", "短信发送结果（sent / failed / retried）",
+               lambda: [(("sent",), sms_dispatcher.sent_count), (("failed",), sms_dispatcher.failed_count),
+                        (("retried",), sms_dispatcher.retry_count)],
+               labelnames=("result",), metric_type="counter")
+
+
+class SendSms:
+    """兼容旧接口：将短信提交到后台发送队列"""
+
+    @staticmethod
+    async def exec(phone_numbers : str, template_code : str, code : str) -> bool:
+        return sms_dispatcher.submit(phone_numbers, template_code, {"code": code})
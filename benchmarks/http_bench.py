@@ -0,0 +1,369 @@
+"""
+HTTP 压测：注册、登录、个人信息等热点接口
+- asgi 模式在进程内通过 httpx.ASGITransport 直接调用 main:app，不经过网络与 HTTP 解析，衡量应用自身的开销
+- uvicorn 模式在子进程中启动 uvicorn（python -m benchmarks.http_bench serve），通过本地 TCP 压测
+- 使用 .env 中配置的 PostgreSQL；Redis 默认使用进程内的 fakeredis（--redis local 使用 .env 中的 Redis）
+- 短信服务商替换为 StubSmsProvider，接口限流默认关闭（--rate-limit 保留）
+- 每个接口先预热再按固定时长、固定并发（闭环）压测，输出吞吐量与 p50/p95/p99 延迟，
+  并与 benchmarks/baseline.json 中同一模式的基线比较，超出容差时以退出码 1 结束；
+  没有该模式的基线时以退出码 2 结束（--no-compare 只输出结果）
+- 压测用户的手机号使用数据库中没有用户使用的前缀，压测结束后删除本次注册的所有压测用户
+
+用法：
+    python -m benchmarks.http_bench run --mode asgi --concurrency 32 --duration 10
+    python -m benchmarks.http_bench run --mode uvicorn --save-baseline
+    python -m benchmarks.http_bench run --no-compare
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import httpx
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+SCENARIOS = ("register_password", "login_password", "profile", "sms_code")
+PASSWORD = "bench-password"
+
+
+def prepare_app(redis: str, rate_limit: bool):
+    """导入 main:app 并替换压测用的依赖，必须在 lifespan 启动之前调用"""
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    os.chdir(ROOT_DIR)
+    from app import app_config
+    from app.utils import database_redis
+    from app.utils.verification_code_platform import sms_dispatcher, StubSmsProvider
+
+    if redis == "fake":
+        try:
+            from fakeredis import aioredis as fake_aioredis
+        except ImportError:
+            sys.exit("--redis fake 需要安装 fakeredis：pip install fakeredis[lua]")
+        # RedisManager 通过 create_redis_client 创建客户端，替换后 lifespan 中的 init_redis 会使用 fakeredis
+        database_redis.create_redis_client = lambda: fake_aioredis.FakeRedis(decode_responses=True)
+    sms_dispatcher.provider = StubSmsProvider()
+    if not rate_limit:
+        app_config["rate_limit"]["enabled"] = False
+
+    from main import app
+    return app
+
+
+class PhoneSequence:
+    """生成本次压测专用的手机号：prefix（19 + 4 位运行标识）+ 5 位序号"""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.next = 0
+
+    def __call__(self) -> str:
+        self.next += 1
+        if self.next >= 100000:
+            raise RuntimeError("本次压测的手机号已用完")
+        return f"{self.prefix}{self.next:05d}"
+
+
+async def claim_phone_prefix() -> str:
+    """随机选择一个数据库中没有用户使用的运行标识，返回手机号前缀"""
+    from app.models.user import User
+    for _ in range(100):
+        prefix = f"19{secrets.randbelow(10000):04d}"
+        if not await User.filter(phone__startswith=prefix).exists():
+            return prefix
+    raise RuntimeError("没有可用的压测手机号前缀，请清理以 19 开头的测试用户")
+
+
+@contextlib.asynccontextmanager
+async def bench_users(connect: bool = False):
+    """选择本次压测的手机号前缀，结束后删除使用该前缀注册的用户（档案、流水等随用户级联删除）
+
+    connect 为 True 时在当前进程中单独连接数据库（uvicorn 模式下应用在子进程中运行）
+    """
+    from tortoise import Tortoise
+    if connect:
+        from app import app_config
+        from app.config.app_config import thaw
+        await Tortoise.init(config=thaw(app_config.postgres_config))
+    try:
+        prefix = await claim_phone_prefix()
+        try:
+            yield PhoneSequence(prefix)
+        finally:
+            from app.models.user import User
+            deleted = await User.filter(phone__startswith=prefix).delete()
+            print(f"已删除 {deleted} 个压测用户（手机号前缀 {prefix}）")
+    finally:
+        if connect:
+            await Tortoise.close_connections()
+
+
+class Target:
+    """压测目标：通过 httpx 传输层直接发送请求，不经过 AsyncClient（不保存 cookie）"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, base_url: str):
+        self.transport = transport
+        self.base_url = base_url
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        request = httpx.Request(method, self.base_url + path, **kwargs)
+        response = await self.transport.handle_async_request(request)
+        await response.aread()
+        return response
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def run_load(call: Callable[[int], Any], concurrency: int, duration: float, warmup: float) -> Dict[str, Any]:
+    """闭环压测：concurrency 个任务不断发送请求，只统计预热结束后 duration 秒内完成的请求"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+    counter = 0
+
+    async def worker():
+        nonlocal counter
+        while True:
+            begin = time.perf_counter()
+            if begin >= stop_at:
+                return
+            counter += 1
+            try:
+                status = str((await call(counter)).status_code)
+            except Exception as e:
+                status = type(e).__name__
+            end = time.perf_counter()
+            if begin >= measure_from:
+                latencies.append(end - begin)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "rps": round(len(latencies) / duration, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def setup_users(target: Target, phones: PhoneSequence, count: int, concurrency: int) -> List[Tuple[str, str]]:
+    """注册压测用户，返回 [(手机号, token)]"""
+    users: List[Tuple[str, str]] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def register(phone: str):
+        async with semaphore:
+            response = await target.request("POST", "/user/register/password-way",
+                                            json={"phone": phone, "password": PASSWORD})
+        if response.status_code != 200:
+            raise RuntimeError(f"注册压测用户失败: {response.status_code} {response.text[:200]}")
+        users.append((phone, response.json()["data"]["token"]))
+
+    await asyncio.gather(*(register(phones()) for _ in range(count)))
+    return users
+
+
+async def run_scenarios(target: Target, phones: PhoneSequence, scenarios: List[str], users_count: int,
+                        concurrency: int, duration: float, warmup: float) -> Dict[str, Dict[str, Any]]:
+    users = await setup_users(target, phones, users_count, concurrency)
+    calls = {
+        "register_password": lambda i: target.request(
+            "POST", "/user/register/password-way", json={"phone": phones(), "password": PASSWORD}),
+        "login_password": lambda i: target.request(
+            "POST", "/user/login/password-way", json={"phone": users[i % len(users)][0], "password": PASSWORD}),
+        "profile": lambda i: target.request(
+            "GET", "/user/profile", headers={"Authorization": f"Bearer {users[i % len(users)][1]}"}),
+        "sms_code": lambda i: target.request(
+            "GET", "/user/login/verification-code/send", params={"phone": users[i % len(users)][0]}),
+    }
+    results = {}
+    for name in scenarios:
+        result = await run_load(calls[name], concurrency, duration, warmup)
+        results[name] = result
+        print(f"{name:<18} {result['rps']:>9.1f} req/s  p50 {result['p50_ms']:>8.2f}ms  "
+              f"p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  errors {result['errors']}")
+    return results
+
+
+async def bench_asgi(args) -> Dict[str, Dict[str, Any]]:
+    app = prepare_app(args.redis, args.rate_limit)
+    async with app.router.lifespan_context(app):
+        async with bench_users() as phones:
+            target = Target(httpx.ASGITransport(app=app), "http://bench")
+            return await run_scenarios(target, phones, args.scenarios, args.users, args.concurrency,
+                                       args.duration, args.warmup)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_live(base_url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn 进程已退出（退出码 {process.returncode}）")
+            try:
+                if (await client.get("/system/health/live")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("等待 uvicorn 启动超时")
+
+
+async def bench_uvicorn(args) -> Dict[str, Dict[str, Any]]:
+    port = _free_port()
+    command = [sys.executable, "-m", "benchmarks.http_bench", "serve", "--port", str(port), "--redis", args.redis]
+    if args.rate_limit:
+        command.append("--rate-limit")
+    process = subprocess.Popen(command, cwd=ROOT_DIR)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await _wait_until_live(base_url, process)
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency))
+        async with transport, bench_users(connect=True) as phones:
+            return await run_scenarios(Target(transport, base_url), phones, args.scenarios, args.users,
+                                       args.concurrency, args.duration, args.warmup)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """与基线比较，返回退化项：p95/p99 延迟上升或吞吐量下降超过 tolerance"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] and result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name} {key}: {base[key]} -> {result[key]}")
+        if base["rps"] and result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name} rps: {base['rps']} -> {result['rps']}")
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{name} errors: {base['errors']} -> {result['errors']}")
+    return regressions
+
+
+def command_run(args):
+    if args.mode == "uvicorn":
+        # 本进程也需要导入 app 来选择压测手机号前缀与清理压测用户
+        if ROOT_DIR not in sys.path:
+            sys.path.insert(0, ROOT_DIR)
+        os.chdir(ROOT_DIR)
+    results = asyncio.run(bench_asgi(args) if args.mode == "asgi" else bench_uvicorn(args))
+    report = {
+        "mode": args.mode,
+        "redis": args.redis,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "python": sys.version.split()[0],
+        "endpoints": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baselines = json.load(f)
+    if args.save_baseline:
+        baselines[args.mode] = report
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"基线已保存到 {args.baseline}（{args.mode}）")
+        return 0
+
+    if args.no_compare:
+        return 0
+    baseline = baselines.get(args.mode)
+    if baseline is None:
+        print(f"{args.baseline} 中没有 {args.mode} 模式的基线，无法检查性能退化；"
+              f"先在压测机器上用 --save-baseline 生成基线，或使用 --no-compare 只输出结果")
+        return 2
+    if baseline["concurrency"] != args.concurrency:
+        print(f"注意：基线并发数为 {baseline['concurrency']}，本次为 {args.concurrency}")
+    regressions = compare(results, baseline["endpoints"], args.tolerance)
+    if regressions:
+        print(f"性能退化（容差 {args.tolerance:.0%}）：")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"与基线相比没有超出 {args.tolerance:.0%} 的退化")
+    return 0
+
+
+def command_serve(args):
+    import uvicorn
+    app = prepare_app(args.redis, args.rate_limit)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP 接口压测")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="执行压测并与基线比较")
+    run.add_argument("--mode", choices=("asgi", "uvicorn"), default="asgi")
+    run.add_argument("--redis", choices=("fake", "local"), default="fake")
+    run.add_argument("--rate-limit", action="store_true", help="保留接口限流（默认关闭）")
+    run.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    run.add_argument("--concurrency", type=int, default=32)
+    run.add_argument("--duration", type=float, default=10, help="每个接口的统计时长（秒）")
+    run.add_argument("--warmup", type=float, default=2, help="每个接口的预热时长（秒）")
+    run.add_argument("--users", type=int, default=200, help="预先注册的用户数")
+    run.add_argument("--baseline", default=DEFAULT_BASELINE)
+    run.add_argument("--save-baseline", action="store_true", help="把本次结果保存为该模式的基线")
+    run.add_argument("--no-compare", action="store_true", help="只输出结果，不与基线比较")
+    run.add_argument("--tolerance", type=float, default=0.2, help="允许的退化比例")
+    run.add_argument("--output", help="把本次结果写入 JSON 文件")
+    run.set_defaults(func=command_run)
+
+    serve = subparsers.add_parser("serve", help="启动压测用的 uvicorn 服务（uvicorn 模式内部使用）")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--redis", choices=("fake", "local"), default="fake")
+    serve.add_argument("--rate-limit", action="store_true")
+    serve.set_defaults(func=command_serve)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
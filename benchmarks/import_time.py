@@ -0,0 +1,123 @@
+"""
+导入耗时报告
+- 在子进程中执行 python -X importtime -c "import main"，解析每个模块的自身耗时与累计耗时（微秒）
+- 重复 --runs 次，每个模块取最小值，减少磁盘缓存与系统负载带来的波动
+- 输出总耗时、累计耗时最多的模块与项目自身（app、main）的模块；
+  与 benchmarks/import_baseline.json 比较，总耗时增加超过容差时以退出码 1 结束
+
+用法：
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --module app --top 30
+    python -m benchmarks.import_time --save-baseline
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "import_baseline.json")
+PROJECT_PACKAGES = ("app", "main", "migration")
+
+LINE_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def measure_once(module: str) -> Dict[str, Tuple[int, int, int]]:
+    """返回 {模块名: (自身耗时, 累计耗时, 嵌套层级)}，耗时单位为微秒"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"导入 {module} 失败：\n{result.stderr[-2000:]}")
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            timings[name] = (int(own), int(cumulative), len(indent) // 2)
+    return timings
+
+
+def measure(module: str, runs: int) -> Dict[str, Tuple[int, int, int]]:
+    merged: Dict[str, Tuple[int, int, int]] = {}
+    for _ in range(runs):
+        for name, (own, cumulative, depth) in measure_once(module).items():
+            previous = merged.get(name)
+            if previous is None or cumulative < previous[1]:
+                merged[name] = (own, cumulative, depth)
+    return merged
+
+
+def is_project_module(name: str) -> bool:
+    return name.split(".")[0] in PROJECT_PACKAGES
+
+
+def print_table(title: str, rows: List[Tuple[str, Tuple[int, int, int]]]):
+    print(f"\n{title}")
+    print(f"{'累计(ms)':>10} {'自身(ms)':>10}  模块")
+    for name, (own, cumulative, _) in rows:
+        print(f"{cumulative / 1000:>10.1f} {own / 1000:>10.1f}  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导入耗时报告")
+    parser.add_argument("--module", default="main", help="要导入的模块")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的总耗时增加比例")
+    parser.add_argument("--output", help="把本次结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    timings = measure(args.module, args.runs)
+    if args.module not in timings:
+        sys.exit(f"没有 {args.module} 的导入记录（模块可能已被预先导入）")
+    total = timings[args.module][1]
+    by_cumulative = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)
+    print(f"导入 {args.module} 总耗时 {total / 1000:.1f}ms（{len(timings)} 个模块，{args.runs} 次取最小值）")
+    print_table(f"累计耗时最多的 {args.top} 个模块", by_cumulative[:args.top])
+    print_table("项目模块", [item for item in by_cumulative if is_project_module(item[0])][:args.top])
+
+    report = {
+        "module": args.module,
+        "python": sys.version.split()[0],
+        "total_us": total,
+        "modules": {name: {"self_us": own, "cumulative_us": cumulative}
+                    for name, (own, cumulative, _) in by_cumulative[:100]},
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\n基线已保存到 {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\n没有基线文件 {args.baseline}，跳过比较")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline["module"] != args.module:
+        print(f"\n基线是 {baseline['module']} 的导入耗时，跳过比较")
+        return 0
+    print(f"\n基线总耗时 {baseline['total_us'] / 1000:.1f}ms，本次 {total / 1000:.1f}ms")
+    new_modules = [name for name, _ in by_cumulative[:args.top] if name not in baseline["modules"]]
+    if new_modules:
+        print(f"新增的耗时模块：{', '.join(new_modules)}")
+    if total > baseline["total_us"] * (1 + args.tolerance):
+        print(f"导入耗时增加超过 {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,11 +4,29 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from tortoise.contrib.fastapi import register_tortoise
+from contextlib import asynccontextmanager
+import argparse
+import importlib.util
 import os
 
 from app import logger, app_config
+from app.config.app_config import thaw
+from app.config.default import POOL_WORKERS_ENV, get_postgres_config, get_redis_config
+from app.config.config_watcher import ConfigWatcher
+from app.config.env_loader import env_loader
 from app.api.user import api_user
 from app.api.system import api_system
+from app.utils.database import init_redis, close_redis
+from app.utils.token_blacklist import token_blacklist
+from app.utils.verification_code_platform import sms_dispatcher
+from app.utils.password import password_hasher
+from app.utils.points_ledger import points_ledger_folder
+from app.utils.metrics import MetricsMiddleware
+from app.utils.profiler import SlowRequestProfilerMiddleware, slow_request_profiler
+from app.utils.health import health_checker
+from app.utils.database_pool import validate_pool_options
+from app.utils.database_postgres import DatabaseManager
+from app.utils.database_replica import read_router
 
 #from wordease.api.user import api_user
 
@@ -22,6 +40,40 @@ logo_tmpl=r"""
 def check_env():
     os.makedirs("data/", exist_ok=True)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建连接池，关闭时释放"""
+    config_watcher = ConfigWatcher(
+        app_config,
+        [app_config.config_path, env_loader.env_file],
+        interval=app_config["config_reload"]["watch_interval"],
+    )
+    await config_watcher.start()
+    # register_tortoise 的生命周期在外层，此时数据库连接已经初始化
+    if app_config.server_config["generate_schemas"]:
+        await DatabaseManager.generate_schemas()
+    await init_redis()
+    await read_router.start()
+    await token_blacklist.start()
+    await sms_dispatcher.start()
+    await points_ledger_folder.start()
+    if app_config["profiling"]["slow_request_threshold_ms"] > 0:
+        slow_request_profiler.start()
+    health_checker.mark_ready()
+    try:
+        yield
+    finally:
+        health_checker.mark_stopping()
+        await slow_request_profiler.stop()
+        await points_ledger_folder.stop()
+        await sms_dispatcher.stop()
+        password_hasher.shutdown()
+        await token_blacklist.stop()
+        await read_router.stop()
+        await close_redis()
+        await config_watcher.stop()
+
+
 def create_app():
     """创建FastAPI应用并配置数据库"""
     app = FastAPI(
@@ -31,18 +83,24 @@ def create_app():
         openapi_url="/openapi.json",
         docs_url="/docs",
         redoc_url="/redoc",
+        lifespan=lifespan,
     )
     
     # 获取PostgreSQL配置并打印调试信息
-    postgres_config = app_config.postgres_config
-    credentials = postgres_config['connections']['default']['credentials']
-    logger.info(f"数据库配置: {credentials['host']}:{credentials['port']}/{credentials['database']}")
+    # Tortoise 会深拷贝连接配置，因此传入可修改的副本
+    postgres_config = thaw(app_config.postgres_config)
+    for name, connection in postgres_config['connections'].items():
+        credentials = connection['credentials']
+        logger.info(f"数据库配置（{name}）: {credentials['host']}:{credentials['port']}/{credentials['database']}")
+        validate_pool_options(credentials)
     
     # 初始化 Tortoise ORM
     register_tortoise(
         app,
         config=postgres_config,
-        generate_schemas=True,  # 开发环境可以生成表结构，生产环境建议关闭
+        # 默认不在启动时执行 DDL（多个 worker 同时启动时会并发建表），表结构由 python migration.py init 创建；
+        # DB_GENERATE_SCHEMAS 开启时在 lifespan 中只对主库建表（Tortoise 会对包括只读副本在内的所有连接执行 DDL）
+        generate_schemas=False,
         add_exception_handlers=True,  # 显示错误信息
     )
     
@@ -60,6 +118,14 @@ def create_app():
         allow_headers=["*"],  # 允许所有头
     )
     
+    # 慢请求调用栈捕获
+    if app_config["profiling"]["slow_request_threshold_ms"] > 0:
+        app.add_middleware(SlowRequestProfilerMiddleware, profiler=slow_request_profiler)
+    
+    # 请求数与耗时指标（最外层，包含其他中间件的耗时）
+    if app_config["metrics"]["enabled"]:
+        app.add_middleware(MetricsMiddleware)
+    
     # 注册路由
     app.include_router(api_user, prefix="/user", tags=["用户相关接口"])
     app.include_router(api_system, prefix="/system", tags=["系统相关接口"])
@@ -75,7 +141,46 @@ check_env()
 app = create_app()
 
 
+def run_production():
+    """生产模式：多 worker、关闭自动重载，安装了 uvloop / httptools 时使用
+
+    - worker 数为 APP_WORKERS，PostgreSQL / Redis 连接池上限在各 worker 中按 worker 数平分
+    - 收到 SIGTERM 后停止接受新连接，等待进行中的请求最多 APP_GRACEFUL_TIMEOUT 秒后退出
+    - APP_LIMIT_MAX_REQUESTS 大于 0 时，worker 处理该数量的请求后退出并由主进程重新拉起
+    """
+    server_config = app_config.server_config
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    # worker 进程继承环境变量，导入配置时按 worker 数平分连接池上限
+    os.environ[POOL_WORKERS_ENV] = str(server_config["workers"])
+    credentials = get_postgres_config()["connections"]["default"]["credentials"]
+    logger.info(
+        f"生产模式启动：{server_config['workers']} 个 worker（{loop} + {http}），"
+        f"每个 worker PostgreSQL 连接池 {credentials['minsize']}-{credentials['maxsize']}，"
+        f"Redis 连接池 {get_redis_config()['max_connections']}"
+    )
+    uvicorn.run(
+        "main:app",
+        host=server_config["host"],
+        port=server_config["port"],
+        workers=server_config["workers"],
+        loop=loop,
+        http=http,
+        limit_max_requests=server_config["limit_max_requests"] or None,
+        limit_max_requests_jitter=server_config["limit_max_requests_jitter"],
+        timeout_graceful_shutdown=server_config["graceful_timeout"],
+        timeout_keep_alive=server_config["keep_alive"],
+        access_log=False,
+    )
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="启动应用")
+    parser.add_argument("--prod", action="store_true", help="以生产模式运行（多 worker，不自动重载）")
+    args = parser.parse_args()
     logger.info(logo_tmpl)
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    if args.prod:
+        run_production()
+    else:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
     
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""
+数据库迁移工具
+
+    python migration.py init                      # 创建数据库表结构
+    python migration.py check                     # 检查 PostgreSQL / Redis 连接
+    python migration.py stats                     # 查看各表数据量
+    python migration.py sample                    # 创建示例用户
+    python migration.py migrate backup.json       # 导入用户数据（NDJSON / JSON 数组 / CSV）
+
+migrate 的可选参数：
+    --batch-size N        每个事务导入的记录数（默认 5000）
+    --mode skip|update    已存在的数据跳过或覆盖（默认 skip）
+    --checkpoint PATH     断点文件（默认 <输入文件>.checkpoint），中断后重新执行同一命令即可续传
+    --restart             忽略断点，从头导入
+    --reject-file PATH    无效记录输出文件（默认 <输入文件>.rejected.jsonl）
+"""
+import argparse
+import asyncio
+import sys
+import uuid
+
+from app import logger
+from app.utils.database import init_database, close_database, check_database_health, close_redis, redis_client
+from app.utils.database_postgres import UserRepository, DatabaseUtils
+from app.utils.user_import import UserImporter, IMPORT_MODES
+
+STATS_TABLES = ("users", "user_profiles", "user_vip", "user_identities", "points_ledger")
+
+SAMPLE_USERS = [
+    {"account": "sample_alice", "username": "Alice", "phone": "13800000001", "password": "alice123456"},
+    {"account": "sample_bob", "username": "Bob", "phone": "13800000002", "password": "bob123456"},
+    {"account": "sample_carol", "username": "Carol", "phone": "13800000003", "password": "carol123456"},
+]
+
+
+async def check():
+    """检查数据库与 Redis 连接"""
+    ok = await check_database_health()
+    print(f"PostgreSQL: {'✓ 连接正常' if ok else '✗ 连接失败'}")
+    try:
+        await redis_client.ping()
+        print("Redis: ✓ 连接正常")
+    except Exception as e:
+        ok = False
+        print(f"Redis: ✗ 连接失败 {e}")
+    return ok
+
+
+async def stats():
+    """显示各表的数据量"""
+    for table in STATS_TABLES:
+        rows = await DatabaseUtils.execute_raw_sql(f"SELECT count(*) AS count FROM {table}")
+        print(f"{table}: {rows[0]['count'] if rows else '查询失败'}")
+    statistics = await UserRepository.get_user_statistics()
+    print(f"用户统计: {statistics}")
+    return True
+
+
+async def sample():
+    """创建示例用户，已存在的用户会被跳过"""
+    from app.utils.password import password_hasher
+    for data in SAMPLE_USERS:
+        if await UserRepository.get_user_by_account(data["account"], fields=("user_id",), relations=()):
+            print(f"示例用户 {data['account']} 已存在，跳过")
+            continue
+        user = await UserRepository.create_user({
+            **data,
+            "password": await password_hasher.hash(data["password"]),
+            "invitation_code": str(uuid.uuid4())[:8],
+        })
+        await UserRepository.update_user_profile(str(user.user_id), {"nickname": data["username"]})
+        print(f"已创建示例用户 {data['account']}（密码 {data['password']}）")
+    password_hasher.shutdown()
+    return True
+
+
+async def migrate(args):
+    """流式导入用户数据"""
+    importer = UserImporter(
+        batch_size=args.batch_size,
+        mode=args.mode,
+        reject_path=args.reject_file or args.source + ".rejected.jsonl",
+    )
+    try:
+        result = await importer.run(args.source, checkpoint_path=args.checkpoint, restart=args.restart)
+    except Exception as e:
+        logger.error(f"导入中断: {e}，已提交的批次记录在断点文件中，修复后重新执行同一命令即可续传")
+        return False
+    print(f"导入完成：共 {result['records']} 条记录，新增 {result['inserted']}，更新 {result['updated']}，"
+          f"跳过 {result['skipped']}，无效 {result['invalid']}")
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="数据库迁移工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("init", help="创建数据库表结构")
+    subparsers.add_parser("check", help="检查数据库连接")
+    subparsers.add_parser("stats", help="查看数据库统计")
+    subparsers.add_parser("sample", help="创建示例数据")
+    migrate_parser = subparsers.add_parser("migrate", help="从备份文件导入用户数据")
+    migrate_parser.add_argument("source", help="备份文件路径（.json / .jsonl / .ndjson / .csv）")
+    migrate_parser.add_argument("--batch-size", type=int, default=5000)
+    migrate_parser.add_argument("--mode", choices=IMPORT_MODES, default="skip")
+    migrate_parser.add_argument("--checkpoint")
+    migrate_parser.add_argument("--restart", action="store_true")
+    migrate_parser.add_argument("--reject-file")
+    return parser.parse_args()
+
+
+async def main(args):
+    # 只有 init 会创建表结构，其他命令只连接数据库
+    await init_database(generate_schemas=args.command == "init")
+    try:
+        if args.command == "init":
+            print("数据库表结构已创建")
+            return True
+        if args.command == "check":
+            return await check()
+        if args.command == "stats":
+            return await stats()
+        if args.command == "sample":
+            return await sample()
+        return await migrate(args)
+    finally:
+        await close_database()
+        await close_redis()
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main(parse_args())):
+        sys.exit(1)
@@ -0,0 +1,23 @@
+"""
+测试公共夹具
+- 使用 fakeredis 在进程内模拟 Redis（需要 fakeredis[lua] 执行 Lua 脚本），不需要真实的 Redis 服务
+- 异步测试使用 anyio 的 pytest 插件（anyio 随 FastAPI 安装），标记 pytest.mark.anyio
+"""
+import pytest
+from fakeredis.aioredis import FakeRedis
+
+from app.utils.database_redis import RedisManager
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def redis():
+    """每个测试使用一个空的 FakeRedis，通过 RedisManager 注入，模块级 redis_client 指向它"""
+    client = FakeRedis(decode_responses=True)
+    await RedisManager.init_redis(client)
+    yield RedisManager.get_client()
+    await RedisManager.close_redis()
@@ -0,0 +1,112 @@
+"""连接池参数：按 worker 平分连接数（per_worker）与启动时的校验（validate_pool_options）"""
+import asyncio
+from types import SimpleNamespace
+
+import asyncpg
+import pytest
+
+from app.config.default import POOL_WORKERS_ENV, get_postgres_config, get_redis_config, per_worker
+from app.utils.database_pool import pool_stats, timed_pool_class, validate_pool_options
+
+VALID_OPTIONS = {
+    "minsize": 1,
+    "maxsize": 10,
+    "max_queries": 50000,
+    "max_inactive_connection_lifetime": 300.0,
+    "statement_cache_size": 100,
+    "max_cached_statement_lifetime": 300,
+    "command_timeout": None,
+    "timeout": 60.0,
+    "server_settings": {"application_name": "user-service"},
+}
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for key in (POOL_WORKERS_ENV, "POSTGRES_MIN_CONNECTIONS", "POSTGRES_MAX_CONNECTIONS",
+                "POSTGRES_REPLICA_HOST", "REDIS_MAX_CONNECTIONS"):
+        monkeypatch.delenv(key, raising=False)
+
+
+def test_per_worker_uses_full_limit_outside_production_launcher():
+    assert per_worker(20) == 20
+
+
+def test_per_worker_divides_between_workers(monkeypatch):
+    monkeypatch.setenv(POOL_WORKERS_ENV, "4")
+    assert per_worker(20) == 5
+    assert per_worker(3) == 1
+    assert per_worker(3, minimum=2) == 2
+
+
+def test_pool_sizes_divided_between_workers(monkeypatch):
+    monkeypatch.setenv(POOL_WORKERS_ENV, "8")
+    monkeypatch.setenv("POSTGRES_MAX_CONNECTIONS", "40")
+    monkeypatch.setenv("POSTGRES_MIN_CONNECTIONS", "4")
+    monkeypatch.setenv("REDIS_MAX_CONNECTIONS", "8")
+    credentials = get_postgres_config()["connections"]["default"]["credentials"]
+    assert (credentials["minsize"], credentials["maxsize"]) == (1, 5)
+    validate_pool_options(credentials)
+    # pub/sub 订阅占用一个连接，每个 worker 至少 2 个
+    assert get_redis_config()["max_connections"] == 2
+
+
+def test_min_connections_zero_is_kept(monkeypatch):
+    monkeypatch.setenv(POOL_WORKERS_ENV, "4")
+    monkeypatch.setenv("POSTGRES_MIN_CONNECTIONS", "0")
+    credentials = get_postgres_config()["connections"]["default"]["credentials"]
+    assert credentials["minsize"] == 0
+    validate_pool_options(credentials)
+
+
+@pytest.mark.parametrize("command_timeout", [None, 0, 30.0])
+def test_valid_options_pass(command_timeout):
+    validate_pool_options({**VALID_OPTIONS, "command_timeout": command_timeout})
+
+
+@pytest.mark.parametrize("overrides, message", [
+    ({"maxsize": 0}, "最大连接数必须大于 0"),
+    ({"minsize": 11}, "最小连接数必须在 0 到最大连接数之间"),
+    ({"minsize": -1}, "最小连接数必须在 0 到最大连接数之间"),
+    ({"max_queries": 0}, "POSTGRES_MAX_QUERIES"),
+    ({"statement_cache_size": -1}, "POSTGRES_STATEMENT_CACHE_SIZE"),
+    ({"command_timeout": -1}, "POSTGRES_COMMAND_TIMEOUT"),
+    ({"timeout": 0}, "POSTGRES_CONNECT_TIMEOUT"),
+    ({"server_settings": {"statement_timeout": ""}}, "POSTGRES_SERVER_SETTINGS"),
+])
+def test_invalid_options_rejected(overrides, message):
+    with pytest.raises(ValueError, match=message):
+        validate_pool_options({**VALID_OPTIONS, **overrides})
+
+
+def test_all_problems_listed():
+    with pytest.raises(ValueError) as exc_info:
+        validate_pool_options({**VALID_OPTIONS, "max_queries": 0, "timeout": 0})
+    assert "POSTGRES_MAX_QUERIES" in str(exc_info.value)
+    assert "POSTGRES_CONNECT_TIMEOUT" in str(exc_info.value)
+
+
+def test_timed_pool_class_per_connection():
+    default_class = timed_pool_class("default")
+    assert timed_pool_class("default") is default_class
+    assert timed_pool_class("replica") is not default_class
+    assert issubclass(default_class, asyncpg.Pool)
+    # 不增加字段，才能替换 asyncpg.Pool 实例的类
+    assert default_class.__slots__ == ()
+
+
+def test_pool_stats_counts_waiters():
+    loop = asyncio.new_event_loop()
+    try:
+        pending, done = loop.create_future(), loop.create_future()
+        done.set_result(None)
+        pool = SimpleNamespace(
+            get_size=lambda: 5, get_idle_size=lambda: 0, get_min_size=lambda: 1, get_max_size=lambda: 5,
+            _queue=SimpleNamespace(_getters=[pending, done]),
+        )
+        stats = pool_stats(pool, "test_pool_stats")
+    finally:
+        loop.close()
+    assert stats == {"in_use": 5, "idle": 0, "size": 5, "min": 1, "max": 5, "waiters": 1,
+                     "acquire_count": 0, "acquire_avg_ms": 0.0}
+    assert pool_stats(None, "test_pool_stats") is None
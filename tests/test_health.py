@@ -0,0 +1,97 @@
+"""就绪检查：PostgreSQL 连接池已满与数据库不可达的区分，degraded 不影响就绪"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import database_postgres, health
+from app.utils.health import HealthChecker, check_postgres, pool_saturated
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeQueue:
+    def __init__(self, waiters: int):
+        loop = asyncio.get_running_loop()
+        self._getters = [loop.create_future() for _ in range(waiters)]
+
+
+class FakePool:
+    """模拟 asyncpg 连接池：acquire 在超时后抛出 asyncio.TimeoutError"""
+
+    def __init__(self, size: int, max_size: int, idle: int, waiters: int):
+        self.size, self.max_size, self.idle = size, max_size, idle
+        self._queue = FakeQueue(waiters)
+
+    def get_size(self):
+        return self.size
+
+    def get_idle_size(self):
+        return self.idle
+
+    def get_min_size(self):
+        return 1
+
+    def get_max_size(self):
+        return self.max_size
+
+    async def acquire(self, timeout):
+        await asyncio.sleep(timeout)
+        raise asyncio.TimeoutError
+
+
+class FakeClient:
+    def __init__(self, pool):
+        self._pool = pool
+
+
+@pytest.fixture
+def use_pool(monkeypatch):
+    monkeypatch.setattr(health.health_checker, "timeout", 0.1)
+
+    def install(pool):
+        fake_connections = SimpleNamespace(get=lambda name: FakeClient(pool))
+        monkeypatch.setattr(health, "connections", fake_connections)
+        monkeypatch.setattr(database_postgres, "connections", fake_connections)
+    return install
+
+
+def test_pool_saturated():
+    stats = {"size": 5, "max": 5, "idle": 0, "waiters": 3}
+    assert pool_saturated(stats)
+    assert not pool_saturated({**stats, "waiters": 0})
+    assert not pool_saturated({**stats, "idle": 1})
+    assert not pool_saturated({**stats, "size": 4})
+    assert not pool_saturated(None)
+
+
+async def test_saturated_pool_is_degraded(use_pool):
+    use_pool(FakePool(size=5, max_size=5, idle=0, waiters=3))
+    result = await check_postgres()
+    assert result["status"] == "degraded"
+    assert result["pool"]["waiters"] == 3
+
+
+async def test_stuck_connect_is_error(use_pool):
+    # 连接池有空位，acquire 超时只能是新建连接卡住
+    use_pool(FakePool(size=1, max_size=5, idle=0, waiters=0))
+    with pytest.raises(RuntimeError):
+        await check_postgres()
+
+
+async def test_degraded_check_keeps_instance_ready():
+    async def degraded():
+        return {"status": "degraded"}
+
+    async def failing():
+        raise RuntimeError("down")
+
+    checker = HealthChecker({"postgres": (degraded, True), "sms": (failing, False)}, timeout=1)
+    result = await checker._check_all()
+    assert result["healthy"] is True
+    assert result["status"] == "degraded"
+
+    checker = HealthChecker({"postgres": (failing, True)}, timeout=1)
+    result = await checker._check_all()
+    assert result["healthy"] is False
+    assert result["status"] == "error"
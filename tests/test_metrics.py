@@ -0,0 +1,94 @@
+"""Prometheus 指标的文本格式（MetricsRegistry.render）"""
+import pytest
+
+from app.utils.metrics import CallbackMetric, Counter, Gauge, Histogram, MetricsRegistry, timed
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def sample_lines(registry):
+    return [line for line in registry.render().splitlines() if not line.startswith("#")]
+
+
+def test_counter_and_gauge_format(registry):
+    requests = Counter("requests_total", "请求数", ("method", "route"), registry=registry)
+    requests.labels("GET", "/user/profile").inc()
+    requests.labels("GET", "/user/profile").inc(2)
+    in_progress = Gauge("in_progress", "处理中", registry=registry)
+    in_progress.inc()
+    in_progress.dec()
+    in_progress.inc()
+    assert registry.render() == (
+        "# HELP requests_total 请求数\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{method="GET",route="/user/profile"} 3\n'
+        "# HELP in_progress 处理中\n"
+        "# TYPE in_progress gauge\n"
+        "in_progress 1\n"
+    )
+
+
+def test_label_values_are_escaped(registry):
+    counter = Counter("escaped_total", "转义\n说明", ("value",), registry=registry)
+    counter.labels('a"b\\c\nd').inc()
+    text = registry.render()
+    assert "# HELP escaped_total 转义\\n说明\n" in text
+    assert 'escaped_total{value="a\\"b\\\\c\\nd"} 1\n' in text
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = Histogram("latency_seconds", "耗时", ("route",), buckets=(0.5, 0.1), registry=registry)
+    child = histogram.labels("/a")
+    for value in (0.05, 0.1, 0.3, 2.0):
+        child.observe(value)
+    assert sample_lines(registry) == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="0.5"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 2.45',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_callback_metric_reads_at_scrape_time(registry):
+    depth = {"sms": 3}
+    CallbackMetric("queue_depth", "队列深度", lambda: [((name,), value) for name, value in depth.items()],
+                   ("queue",), registry=registry)
+    assert sample_lines(registry) == ['queue_depth{queue="sms"} 3']
+    depth["sms"] = 5
+    assert sample_lines(registry) == ['queue_depth{queue="sms"} 5']
+
+
+def test_failing_callback_is_skipped(registry):
+    def callback():
+        raise RuntimeError("连接池尚未创建")
+
+    CallbackMetric("pool_size", "连接池大小", callback, registry=registry)
+    assert registry.render() == "# HELP pool_size 连接池大小\n# TYPE pool_size gauge\n"
+
+
+def test_duplicate_name_and_wrong_labels_rejected(registry):
+    counter = Counter("dup_total", "重复", ("method",), registry=registry)
+    with pytest.raises(ValueError):
+        Counter("dup_total", "重复", registry=registry)
+    with pytest.raises(ValueError):
+        counter.labels("GET", "extra")
+
+
+async def test_timed_counts_errors(registry):
+    histogram = Histogram("call_seconds", "耗时", ("method",), registry=registry)
+    errors = Counter("call_errors_total", "失败次数", ("method",), registry=registry)
+
+    @timed(histogram, errors)
+    async def fail():
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        await fail()
+    assert 'call_errors_total{method="fail"} 1' in sample_lines(registry)
+    assert 'call_seconds_count{method="fail"} 1' in sample_lines(registry)
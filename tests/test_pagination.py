@@ -0,0 +1,45 @@
+"""用户列表的游标分页（UserRepository.encode_cursor / decode_cursor）"""
+import base64
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import database_postgres
+from app.utils.database_postgres import UserRepository
+
+pytestmark = pytest.mark.anyio
+
+
+def make_cursor(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode("utf8")).decode("ascii")
+
+
+def test_cursor_round_trip():
+    user = SimpleNamespace(created_at=datetime(2024, 5, 1, 8, 30, 15, 123456, tzinfo=timezone.utc),
+                           user_id=uuid.uuid4())
+    created_at, user_id = UserRepository.decode_cursor(UserRepository.encode_cursor(user))
+    assert (created_at, user_id) == (user.created_at, user.user_id)
+
+
+@pytest.mark.parametrize("cursor", [
+    "!!!",
+    "中文",
+    make_cursor("2024-05-01T08:30:15+00:00"),
+    make_cursor(f"not-a-date|{uuid.uuid4()}"),
+    make_cursor("2024-05-01T08:30:15+00:00|not-a-uuid"),
+])
+def test_decode_cursor_rejects_invalid(cursor):
+    with pytest.raises(ValueError, match="无效的分页游标"):
+        UserRepository.decode_cursor(cursor)
+
+
+async def test_invalid_cursor_raises_before_query(monkeypatch):
+    async def read_connection():
+        raise AssertionError("无效游标不应访问数据库")
+
+    monkeypatch.setattr(database_postgres.read_router, "read_connection", read_connection)
+    # 无效游标抛出 ValueError（调用方返回 400），不会被当作查询失败吞掉返回空页
+    with pytest.raises(ValueError):
+        await UserRepository.get_users_by_filters(pagination="cursor", cursor="bad")
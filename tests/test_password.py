@@ -0,0 +1,59 @@
+"""密码哈希：scrypt 校验、md5 迁移与重新哈希标记"""
+import hashlib
+
+import pytest
+
+from app.utils.password import PasswordHasher
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def hasher():
+    # 测试中使用较小的代价参数
+    hasher = PasswordHasher(n=1024, r=8, p=1, max_workers=2)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_scrypt_round_trip(hasher):
+    stored = hasher.hash_sync("secret")
+    assert stored.startswith("scrypt$1024$8$1$")
+    assert hasher.verify_sync("secret", stored) == (True, False)
+    assert hasher.verify_sync("wrong", stored) == (False, False)
+
+
+def test_salt_is_random(hasher):
+    assert hasher.hash_sync("secret") != hasher.hash_sync("secret")
+
+
+def test_legacy_md5_matches_and_needs_rehash(hasher):
+    stored = hashlib.md5(b"secret").hexdigest()
+    assert hasher.verify_sync("secret", stored) == (True, True)
+    assert hasher.verify_sync("wrong", stored) == (False, False)
+
+
+def test_changed_cost_parameters_need_rehash(hasher):
+    stored = PasswordHasher(n=2048, r=8, p=1).hash_sync("secret")
+    assert hasher.verify_sync("secret", stored) == (True, True)
+    assert hasher.verify_sync("wrong", stored) == (False, False)
+
+
+@pytest.mark.parametrize("stored", [
+    "",
+    "plain-text",
+    "bcrypt$1024$8$1$c2FsdA==$ZGlnZXN0",
+    "scrypt$1024$8$1$not-base64!$ZGlnZXN0",
+    "scrypt$1024$8$1$c2FsdA==$not-base64!",
+    "scrypt$1000$8$1$c2FsdA==$ZGlnZXN0",  # n 不是 2 的幂
+    "scrypt$1024$8$1$c2FsdA==$",
+])
+def test_corrupted_hash_does_not_match(hasher, stored):
+    assert hasher.verify_sync("secret", stored) == (False, False)
+
+
+async def test_async_hash_and_verify(hasher):
+    stored = await hasher.hash("secret")
+    assert await hasher.verify("secret", stored) == (True, False)
+    hashed = await hasher.hash_many(["a", "b"])
+    assert [hasher.verify_sync(password, stored)[0] for password, stored in zip("ab", hashed)] == [True, True]
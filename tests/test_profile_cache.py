@@ -0,0 +1,90 @@
+"""用户信息缓存的版本号"""
+import pytest
+
+from app.config.constant import REDIS_USER_PROFILE_VERSION
+from app.utils.profile_cache import ProfileCache
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+VERSION_KEY = REDIS_USER_PROFILE_VERSION + USER_ID
+
+
+class Loader:
+    """模拟数据库，记录加载次数"""
+
+    def __init__(self):
+        self.calls = 0
+        self.name = "v1"
+
+    async def __call__(self, user_id):
+        self.calls += 1
+        return {"user_id": user_id, "name": self.name}
+
+
+async def test_cached_until_invalidated(redis):
+    cache = ProfileCache()
+    loader = Loader()
+    assert (await cache.get(USER_ID, loader))["name"] == "v1"
+    assert (await cache.get(USER_ID, loader))["name"] == "v1"
+    assert loader.calls == 1
+
+    loader.name = "v2"
+    await cache.invalidate(USER_ID)
+    assert (await cache.get(USER_ID, loader))["name"] == "v2"
+    assert loader.calls == 2
+
+
+async def test_invalidation_from_other_worker(redis):
+    worker, other = ProfileCache(), ProfileCache()
+    loader = Loader()
+    await worker.get(USER_ID, loader)
+    loader.name = "v2"
+    await other.invalidate(USER_ID)
+    assert (await worker.get(USER_ID, loader))["name"] == "v2"
+
+
+async def test_versions_never_repeat(redis):
+    cache = ProfileCache()
+    versions = set()
+    for _ in range(20):
+        await cache.invalidate_many([USER_ID])
+        versions.add(await redis.get(VERSION_KEY))
+    assert len(versions) == 20
+
+
+async def test_version_key_expiry_does_not_revive_stale_entry(redis):
+    worker, other = ProfileCache(ttl=60), ProfileCache(ttl=60)
+    loader = Loader()
+    await other.invalidate(USER_ID)
+    await worker.get(USER_ID, loader)  # 以当前版本号缓存 v1
+
+    loader.name = "v2"
+    await other.invalidate(USER_ID)
+    assert 0 < await redis.ttl(VERSION_KEY) <= 120
+    # 版本键过期后读到的 "0" 与本地缓存的版本号不同，仍会重新加载
+    await redis.delete(VERSION_KEY)
+    assert (await worker.get(USER_ID, loader))["name"] == "v2"
+
+
+async def test_loader_returning_none_is_not_cached(redis):
+    cache = ProfileCache()
+    calls = []
+
+    async def missing(user_id):
+        calls.append(user_id)
+        return None
+
+    assert await cache.get(USER_ID, missing) is None
+    assert await cache.get(USER_ID, missing) is None
+    assert len(calls) == 2
+
+
+async def test_disabled_cache_always_loads(redis):
+    cache = ProfileCache(enabled=False)
+    loader = Loader()
+    await cache.get(USER_ID, loader)
+    await cache.get(USER_ID, loader)
+    assert loader.calls == 2
+    await cache.invalidate(USER_ID)
+    assert await redis.get(VERSION_KEY) is None
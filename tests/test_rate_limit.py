@@ -0,0 +1,69 @@
+"""限流令牌桶脚本（TOKEN_BUCKET_SCRIPT）与 RateLimiter"""
+import pytest
+from fastapi import HTTPException
+
+from app import app_config
+from app.utils.rate_limit import TOKEN_BUCKET_SCRIPT, RateLimiter
+
+pytestmark = pytest.mark.anyio
+
+
+async def take(redis, buckets, cost=1):
+    """buckets 为 [(键, 容量, 补满周期毫秒)]，返回 (是否允许, 等待毫秒数, 受限的桶序号)"""
+    args = [cost]
+    for _, capacity, period_ms in buckets:
+        args.extend([capacity, period_ms])
+    result = await redis.eval(TOKEN_BUCKET_SCRIPT, len(buckets), *[key for key, _, _ in buckets], *args)
+    return tuple(int(value) for value in result)
+
+
+async def test_bucket_allows_burst_then_denies(redis):
+    bucket = [("rl:a", 3, 60000)]
+    for _ in range(3):
+        assert (await take(redis, bucket))[0] == 1
+    allowed, wait_ms, blocked = await take(redis, bucket)
+    assert (allowed, blocked) == (0, 1)
+    # 每 20 秒补充 1 个令牌
+    assert 0 < wait_ms <= 20000
+
+
+async def test_denied_request_consumes_no_bucket(redis):
+    buckets = [("rl:phone", 5, 60000), ("rl:ip", 1, 60000)]
+    assert (await take(redis, buckets))[0] == 1
+    allowed, _, blocked = await take(redis, buckets)
+    assert (allowed, blocked) == (0, 2)
+    # 被 ip 桶拒绝的请求没有扣减 phone 桶
+    assert float(await redis.hget("rl:phone", "tokens")) == pytest.approx(4, abs=0.01)
+
+
+async def test_bucket_refills(redis):
+    bucket = [("rl:b", 2, 60000)]
+    await take(redis, bucket, cost=2)
+    assert (await take(redis, bucket))[0] == 0
+    # 把上次扣减的时间往前拨 30 秒，应补充 1 个令牌
+    ts = int(await redis.hget("rl:b", "ts"))
+    await redis.hset("rl:b", "ts", str(ts - 30000))
+    assert (await take(redis, bucket))[0] == 1
+
+
+async def test_bucket_key_expires_after_period(redis):
+    await take(redis, [("rl:c", 1, 60000)])
+    assert 0 < await redis.pttl("rl:c") <= 60000
+
+
+async def test_rate_limiter_rejects_with_retry_after(redis, monkeypatch):
+    monkeypatch.setitem(app_config["rate_limit"], "enabled", True)
+    monkeypatch.setitem(app_config["rate_limit"]["routes"], "test_route",
+                        [{"scope": "phone", "limit": 1, "period": 60}])
+    limiter = RateLimiter()
+    await limiter.check("test_route", phone="13800000000")
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter.check("test_route", phone="13800000000")
+    assert exc_info.value.status_code == 429
+    assert 1 <= int(exc_info.value.headers["Retry-After"]) <= 60
+    # 其他手机号不受影响
+    await limiter.check("test_route", phone="13800000001")
+    # 被拒绝的桶在进程内记录，重试时不再访问 Redis
+    with pytest.raises(HTTPException):
+        await limiter.check("test_route", phone="13800000000")
+    assert limiter.stats()["local_denied"] == 1
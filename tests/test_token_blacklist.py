@@ -0,0 +1,81 @@
+"""Token 黑名单与进程内负缓存"""
+import asyncio
+
+import pytest
+
+from app.utils.token_blacklist import REVOKED_VALUE, TokenBlacklist, token_digest
+
+pytestmark = pytest.mark.anyio
+
+
+async def wait_until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "等待超时"
+        await asyncio.sleep(0.01)
+
+
+async def test_revoke(redis):
+    blacklist = TokenBlacklist()
+    assert await blacklist.is_revoked("token-a") is False
+    await blacklist.revoke("token-a", ex=60)
+    assert await blacklist.is_revoked("token-a") is True
+    assert await redis.get("token-a") == REVOKED_VALUE
+    assert 0 < await redis.ttl("token-a") <= 60
+
+
+async def test_revoke_many(redis):
+    blacklist = TokenBlacklist()
+    await blacklist.revoke_many(["token-a", "token-b"], ex=60)
+    assert await blacklist.is_revoked("token-a") is True
+    assert await blacklist.is_revoked("token-b") is True
+    assert await blacklist.is_revoked("token-c") is False
+
+
+async def test_no_local_cache_without_subscription(redis):
+    blacklist = TokenBlacklist()
+    assert await blacklist.is_revoked("token-a") is False
+    # 未订阅失效频道时每次都查询 Redis，其他 worker 写入的失效记录立即可见
+    await redis.set("token-a", REVOKED_VALUE)
+    assert await blacklist.is_revoked("token-a") is True
+    assert blacklist.stats()["local_hits"] == 0
+
+
+async def test_broadcast_evicts_other_workers_cache(redis):
+    worker = TokenBlacklist()
+    other = TokenBlacklist()
+    await worker.start()
+    try:
+        await wait_until(lambda: worker._listening)
+        assert await worker.is_revoked("token-a") is False
+        assert await worker.is_revoked("token-a") is False
+        assert worker.stats()["local_hits"] == 1
+
+        evicted = []
+        worker.add_revocation_listener(evicted.extend)
+        await other.revoke("token-a", ex=60)
+        await wait_until(lambda: evicted)
+        assert evicted == [token_digest("token-a")]
+        assert await worker.is_revoked("token-a") is True
+    finally:
+        await worker.stop()
+    assert worker.stats()["cache_size"] == 0
+
+
+async def test_lookup_racing_with_broadcast_is_not_cached(redis):
+    blacklist = TokenBlacklist()
+    blacklist._listening = True
+    original_get = redis.get
+
+    async def get_then_broadcast(key):
+        # 查询期间收到失效广播：查询结果可能早于失效写入，不能写入负缓存
+        value = await original_get(key)
+        blacklist.discard([token_digest(key)])
+        return value
+
+    redis.get = get_then_broadcast
+    try:
+        assert await blacklist.is_revoked("token-a") is False
+    finally:
+        del redis.get
+    assert blacklist.stats()["cache_size"] == 0
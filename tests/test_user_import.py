@@ -0,0 +1,127 @@
+"""用户导入：记录转换与 JSON 数组的流式解析"""
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.utils.user_import import _iter_json_array, convert_record, iter_records
+
+RECORD = {
+    "user_id": "00000000-0000-0000-0000-000000000001",
+    "phone": "13800000000",
+    "account": "13800000000",
+    "username": "用户",
+    "password": "scrypt$16384$8$1$c2FsdA==$ZGlnZXN0",
+    "points": "12",
+    "created_at": "2024-01-02T03:04:05",
+    "is_verified": "true",
+    "profile": {"nickname": "昵称", "birthday": "2000-01-02T00:00:00", "address": {"city": "北京"}},
+    "vip_info": {"vip_level": 2},
+    "identities": [{"identity_type": "wechat", "identity_value": "openid", "is_verified": True}],
+}
+
+
+def test_convert_record():
+    user_row, profile_row, vip_row, identity_rows = convert_record(RECORD)
+    user_id = uuid.UUID(RECORD["user_id"])
+    assert user_row[0] == user_id
+    assert user_row[5] == 12
+    assert user_row[7] == datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert user_row[11] is True
+    assert profile_row[0] == user_id and profile_row[1] == "昵称"
+    assert json.loads(profile_row[8]) == {"city": "北京"}
+    assert vip_row[:2] == (user_id, 2)
+    assert len(identity_rows) == 1 and identity_rows[0][0] == user_id
+
+
+def test_convert_record_generates_user_id_and_skips_empty_parts():
+    record = {key: RECORD[key] for key in ("account", "username", "password")}
+    user_row, profile_row, vip_row, identity_rows = convert_record(record)
+    assert isinstance(user_row[0], uuid.UUID)
+    assert (profile_row, vip_row, identity_rows) == (None, None, [])
+
+
+def test_identities_from_csv_json_string():
+    record = {**RECORD, "identities": json.dumps(RECORD["identities"])}
+    assert len(convert_record(record)[3]) == 1
+
+
+@pytest.mark.parametrize("changes, message", [
+    ({"account": ""}, "缺少字段 account"),
+    ({"identities": {"a": 1}}, "identities 必须是 JSON 数组"),
+    ({"identities": 5}, "identities 必须是 JSON 数组"),
+    ({"identities": '{"a": 1}'}, "identities 必须是 JSON 数组"),
+    ({"identities": ["wechat"]}, "identities 中的每一项必须是 JSON 对象"),
+    ({"identities": [{"identity_type": "wechat"}]}, "身份信息缺少 identity_type 或 identity_value"),
+    ({"profile": ["昵称"]}, "profile 必须是 JSON 对象"),
+    ({"vip_info": 3}, "vip_info 必须是 JSON 对象"),
+])
+def test_invalid_record(changes, message):
+    with pytest.raises(ValueError, match=message):
+        convert_record({**RECORD, **changes})
+
+
+@pytest.mark.parametrize("value", ["[", "[1", "not json"])
+def test_invalid_json_identities(value):
+    with pytest.raises(ValueError):
+        convert_record({**RECORD, "identities": value})
+
+
+def test_invalid_values():
+    with pytest.raises(ValueError):
+        convert_record({**RECORD, "points": "many"})
+    with pytest.raises(ValueError):
+        convert_record({**RECORD, "user_id": "not-a-uuid"})
+    with pytest.raises(ValueError):
+        convert_record("not an object")
+
+
+RECORDS = [
+    {"account": f"a{i}", "username": "名字 ] [ , \" {", "nested": {"list": [1, 2, {"x": "}"}]}, "n": i * 1000}
+    for i in range(20)
+] + [12345, "text", None]
+
+
+@pytest.fixture
+def array_file(tmp_path):
+    path = tmp_path / "users.json"
+    path.write_text("  \n[\n" + ",\n  ".join(json.dumps(record, ensure_ascii=False) for record in RECORDS) + "\n]\n",
+                    encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 16, 64, 1 << 20])
+def test_json_array_chunk_boundaries(array_file, chunk_size):
+    assert list(_iter_json_array(array_file, 0, chunk_size=chunk_size)) == RECORDS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 20])
+def test_json_array_skip(array_file, chunk_size):
+    assert list(_iter_json_array(array_file, 5, chunk_size=chunk_size)) == RECORDS[5:]
+
+
+def test_json_array_empty_and_invalid(tmp_path):
+    empty = tmp_path / "empty.json"
+    empty.write_text("[ ]", encoding="utf-8")
+    assert list(iter_records(str(empty), "json")) == []
+
+    not_array = tmp_path / "object.json"
+    not_array.write_text('{"account": "a"}', encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(_iter_json_array(str(not_array), 0))
+
+    truncated = tmp_path / "truncated.json"
+    truncated.write_text('[{"account": "a"}, {"account": ', encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(_iter_json_array(str(truncated), 0, chunk_size=4))
+
+
+def test_json_array_without_closing_bracket(tmp_path):
+    path = tmp_path / "unterminated.json"
+    path.write_text('[{"account": "a"}, {"account": "b"}', encoding="utf-8")
+    records = _iter_json_array(str(path), 0, chunk_size=8)
+    assert next(records) == {"account": "a"}
+    assert next(records) == {"account": "b"}
+    with pytest.raises(ValueError):
+        next(records)
@@ -0,0 +1,75 @@
+"""验证码签发与校验脚本（ISSUE_CODE_SCRIPT / VERIFY_CODE_SCRIPT）"""
+import pytest
+from fastapi import HTTPException
+
+from app.config.constant import REDIS_USER_CODE, REDIS_USER_LOGIN_CODE, REDIS_USER_REGISTER_CODE
+from app.utils.user import (
+    CODE_ERRORS, CODE_EXHAUSTED, CODE_EXPIRED, CODE_MISMATCH, CODE_MISSING, ISSUE_CODE_SCRIPT, check_code,
+)
+
+pytestmark = pytest.mark.anyio
+
+PHONE = "13800000000"
+KEY = REDIS_USER_CODE + PHONE
+
+
+async def issue(redis, code="123456", purpose="register", expire_seconds=300):
+    await redis.eval(ISSUE_CODE_SCRIPT, 1, KEY, purpose, code, expire_seconds)
+
+
+async def check_error(code, redis_path=REDIS_USER_REGISTER_CODE) -> str:
+    with pytest.raises(HTTPException) as exc_info:
+        await check_code(code, PHONE, redis_path)
+    assert exc_info.value.status_code == 400
+    return exc_info.value.detail
+
+
+async def test_code_verifies_once(redis):
+    await issue(redis)
+    assert await check_code("123456", PHONE, REDIS_USER_REGISTER_CODE) is True
+    assert await check_error("123456") == CODE_ERRORS[CODE_MISSING]
+
+
+async def test_missing_code(redis):
+    assert await check_error("123456") == CODE_ERRORS[CODE_MISSING]
+
+
+async def test_purposes_are_separate(redis):
+    await issue(redis, code="111111", purpose="register")
+    await issue(redis, code="222222", purpose="login")
+    assert await check_error("111111", REDIS_USER_LOGIN_CODE) == CODE_ERRORS[CODE_MISMATCH]
+    assert await check_code("111111", PHONE, REDIS_USER_REGISTER_CODE) is True
+    assert await check_code("222222", PHONE, REDIS_USER_LOGIN_CODE) is True
+
+
+async def test_expired_code_is_removed(redis):
+    await issue(redis)
+    await redis.hset(KEY, "register:exp", "1")
+    assert await check_error("123456") == CODE_ERRORS[CODE_EXPIRED]
+    assert await redis.hget(KEY, "register") is None
+
+
+async def test_too_many_failures(redis, monkeypatch):
+    from app import app_config
+    monkeypatch.setitem(app_config["verification_code"], "max_attempts", 3)
+    await issue(redis)
+    assert await check_error("000000") == CODE_ERRORS[CODE_MISMATCH]
+    assert await check_error("000000") == CODE_ERRORS[CODE_MISMATCH]
+    assert await check_error("000000") == CODE_ERRORS[CODE_EXHAUSTED]
+    # 次数用尽后验证码作废，正确的验证码也不能再使用
+    assert await check_error("123456") == CODE_ERRORS[CODE_MISSING]
+
+
+async def test_reissue_resets_failures(redis, monkeypatch):
+    from app import app_config
+    monkeypatch.setitem(app_config["verification_code"], "max_attempts", 2)
+    await issue(redis, code="123456")
+    assert await check_error("000000") == CODE_ERRORS[CODE_MISMATCH]
+    await issue(redis, code="654321")
+    assert await check_error("000000") == CODE_ERRORS[CODE_MISMATCH]
+    assert await check_code("654321", PHONE, REDIS_USER_REGISTER_CODE) is True
+
+
+async def test_issue_sets_key_expiry(redis):
+    await issue(redis, expire_seconds=120)
+    assert 0 < await redis.ttl(KEY) <= 120